@@ -0,0 +1,144 @@
+"""
+Compare cache codecs and compression on AniList payloads
+
+Reports encoded size and encode/decode time for every codec and
+compression pair, using payloads captured from AniList into
+benchmarks/payloads/. Without captures it falls back to synthetic
+payloads shaped like AniList responses.
+
+Usage:
+    python -m benchmarks.codec_benchmark --capture   # fetch payloads once
+    python -m benchmarks.codec_benchmark [--rounds N]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import string
+import time
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict
+
+from src.config.settings import settings
+from src.services.anilist.client import AniListClient
+from src.services.anilist.operations import Projection
+from src.services.cache.codecs import CODECS, COMPRESSORS, Serializer
+
+PAYLOAD_DIR = Path(__file__).parent / "payloads"
+
+GENRES = ["Action", "Drama", "Comedy", "Fantasy", "Romance", "Sci-Fi"]
+
+
+async def capture():
+    """Fetch representative responses from AniList and save them"""
+    client = AniListClient()
+    await client.connect()
+    try:
+        queries = {
+            "search_detail": client.search_media(
+                {"search": "gundam", "page": 1, "perPage": 25, "type": "ANIME"}
+            ),
+            "trending_card": client.search_media(
+                {"page": 1, "perPage": 50, "sort": "TRENDING_DESC", "type": "ANIME"},
+                projection=Projection.CARD,
+            ),
+            "media_detail": client.get_media(1),
+            "character": client.get_character(1),
+            "recommendations": client.get_recommendations(1),
+        }
+        PAYLOAD_DIR.mkdir(exist_ok=True)
+        for name, query in queries.items():
+            path = PAYLOAD_DIR / f"{name}.json"
+            path.write_text(json.dumps(await query), encoding="utf-8")
+            print(f"Wrote {path}")
+    finally:
+        await client.close()
+
+
+def _words(rng: random.Random, count: int) -> str:
+    return " ".join(
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(count)
+    )
+
+
+def synthetic_payloads() -> Dict[str, Any]:
+    """Build payloads shaped like AniList media pages"""
+    rng = random.Random(0)
+
+    def media(media_id: int) -> Dict[str, Any]:
+        return {
+            "id": media_id,
+            "title": {"romaji": _words(rng, 3), "english": _words(rng, 3), "native": None},
+            "description": _words(rng, rng.randint(40, 160)),
+            "coverImage": {"large": f"https://s4.anilist.co/file/anilistcdn/{media_id}.jpg"},
+            "genres": rng.sample(GENRES, 3),
+            "episodes": rng.randint(1, 50),
+            "averageScore": rng.randint(40, 95),
+            "status": "FINISHED",
+            "tags": [{"name": _words(rng, 1), "rank": rng.randint(1, 100)} for _ in range(8)],
+        }
+
+    return {
+        "search_detail": {"Page": {"media": [media(i) for i in range(25)], "pageInfo": {}}},
+        "trending_card": {"Page": {"media": [media(i) for i in range(50)], "pageInfo": {}}},
+        "media_detail": {"Media": media(1)},
+    }
+
+
+def load_payloads() -> Dict[str, Any]:
+    """Load captured payloads, or synthetic ones if none were captured"""
+    paths = sorted(PAYLOAD_DIR.glob("*.json"))
+    if not paths:
+        print("No captured payloads; using synthetic ones (run with --capture)")
+        return synthetic_payloads()
+    return {path.stem: json.loads(path.read_text(encoding="utf-8")) for path in paths}
+
+
+def _time(fn, rounds: int) -> float:
+    """Mean microseconds per call"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def _row(payload: str, codec: str, compression: str, size: Any, encode: Any, decode: Any):
+    print(f"{payload:<18}{codec:<9}{compression:<13}{size:>9}{encode:>10}{decode:>10}")
+
+
+def run(rounds: int):
+    """Print size and timings for each payload and codec/compression pair"""
+    payloads = load_payloads()
+    _row("payload", "codec", "compression", "bytes", "enc us", "dec us")
+
+    for name, value in payloads.items():
+        text = json.dumps(value)
+        encode = _time(partial(json.dumps, value), rounds)
+        decode = _time(partial(json.loads, text), rounds)
+        _row(name, "stdlib", "none", len(text.encode()), f"{encode:.1f}", f"{decode:.1f}")
+
+        for codec in CODECS.values():
+            for compressor in COMPRESSORS.values():
+                serializer = Serializer(
+                    codec=codec.name,
+                    compression=compressor.name,
+                    threshold=settings.CACHE_COMPRESSION_THRESHOLD,
+                )
+                data = serializer.dumps(value)
+                encode = _time(partial(serializer.dumps, value), rounds)
+                decode = _time(partial(serializer.loads, data), rounds)
+                _row(name, codec.name, compressor.name, len(data), f"{encode:.1f}", f"{decode:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--capture", action="store_true", help="fetch payloads from AniList")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.capture:
+        asyncio.run(capture())
+    else:
+        run(args.rounds)
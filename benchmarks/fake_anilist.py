@@ -0,0 +1,368 @@
+"""
+Local stand-in for the AniList GraphQL API
+
+Answers every operation with data shaped by the query's own selection
+set, or with a recorded fixture from benchmarks/fixtures/ when one exists
+for the operation. Responses are seeded by the request, so the same call
+always gets the same answer. Latency and 429 responses can be injected,
+and every request is counted per operation (GET /stats).
+
+Usage:
+    python -m benchmarks.fake_anilist [--port 8765] [--latency 0.05] [--error-rate 0.01]
+    python -m benchmarks.fake_anilist --record   # proxy to AniList, saving fixtures
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import string
+import time
+import zlib
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import aiohttp
+from aiohttp import web
+from graphql import (
+    DocumentNode,
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    InlineFragmentNode,
+    OperationDefinitionNode,
+    SelectionSetNode,
+    parse,
+    value_from_ast_untyped,
+)
+from graphql.pyutils import Undefined
+
+ANILIST_URL = "https://graphql.anilist.co"
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures"
+
+# Without a schema, list fields are recognised by name. Every field of a
+# Page other than pageInfo is a list too, sized by perPage or id_in.
+LIST_SIZES = {
+    "nodes": 5,
+    "edges": 5,
+    "genres": 3,
+    "tags": 8,
+    "voiceActors": 1,
+    "alternative": 2,
+    "lists": 3,
+    "entries": 20,
+}
+
+ENUMS = {
+    "status": ["FINISHED", "RELEASING", "NOT_YET_RELEASED"],
+    "format": ["TV", "MOVIE", "OVA", "ONA"],
+    "season": ["WINTER", "SPRING", "SUMMER", "FALL"],
+    "type": ["ANIME"],
+    "source": ["ORIGINAL", "MANGA", "LIGHT_NOVEL"],
+    "characterRole": ["MAIN", "SUPPORTING"],
+    "gender": ["Female", "Male"],
+    "site": ["youtube"],
+}
+
+INT_FIELDS = {
+    "episodes", "episode", "seasonYear", "averageScore", "popularity", "duration",
+    "trending", "year", "month", "day", "airingAt", "timeUntilAiring", "rank",
+    "rating", "userRating", "favourites", "score", "progress", "repeat", "total",
+    "currentPage", "lastPage", "perPage", "updatedAt",
+}  # fmt: skip
+
+BOOL_FIELDS = {"hasNextPage", "isAdult"}
+
+
+@lru_cache(maxsize=256)
+def _parse(query: str) -> DocumentNode:
+    return parse(query)
+
+
+def _words(rng: random.Random, count: int) -> str:
+    return " ".join(
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(count)
+    )
+
+
+class ResponseBuilder:
+    """Builds response data for an operation by walking its selection set"""
+
+    def __init__(self, document: DocumentNode, variables: Dict[str, Any], rng: random.Random):
+        self.variables = variables
+        self.rng = rng
+        self.fragments = {
+            node.name.value: node
+            for node in document.definitions
+            if isinstance(node, FragmentDefinitionNode)
+        }
+        self.operation = next(
+            node for node in document.definitions if isinstance(node, OperationDefinitionNode)
+        )
+
+    def build(self) -> Dict[str, Any]:
+        """Data for every root field of the operation"""
+        return self._object(self.operation.selection_set, object_id=None, page_size=None)
+
+    def _fields(self, selection_set: SelectionSetNode) -> Iterator[FieldNode]:
+        """Fields selected directly or through fragments"""
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield selection
+            elif isinstance(selection, FragmentSpreadNode):
+                yield from self._fields(self.fragments[selection.name.value].selection_set)
+            elif isinstance(selection, InlineFragmentNode):
+                yield from self._fields(selection.selection_set)
+
+    def _argument(self, field: FieldNode, name: str) -> Any:
+        for argument in field.arguments or ():
+            if argument.name.value == name:
+                value = value_from_ast_untyped(argument.value, self.variables)
+                return None if value is Undefined else value
+        return None
+
+    def _object(
+        self, selection_set: SelectionSetNode, object_id: Optional[int], page_size: Optional[int]
+    ) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        for field in self._fields(selection_set):
+            key = field.alias.value if field.alias else field.name.value
+            result[key] = self._field(field, object_id, page_size)
+        return result
+
+    def _field(self, field: FieldNode, object_id: Optional[int], page_size: Optional[int]) -> Any:
+        name = field.name.value
+        if field.selection_set is None:
+            return self._leaf(name, object_id)
+
+        if name == "Page":
+            size = self._argument(field, "perPage") or 50
+            return self._object(field.selection_set, object_id=None, page_size=size)
+
+        if page_size is not None and name != "pageInfo":
+            ids = self._argument(field, "id_in")
+            if ids is None:
+                ids = [self.rng.randint(1, 20000) for _ in range(page_size)]
+            return [self._object(field.selection_set, item_id, None) for item_id in ids]
+
+        if name in LIST_SIZES:
+            return [
+                self._object(field.selection_set, self.rng.randint(1, 20000), None)
+                for _ in range(LIST_SIZES[name])
+            ]
+
+        nested_id = self._argument(field, "id") or self.rng.randint(1, 20000)
+        return self._object(field.selection_set, nested_id, None)
+
+    def _leaf(self, name: str, object_id: Optional[int]) -> Any:
+        rng = self.rng
+        if name == "id":
+            return object_id if object_id is not None else rng.randint(1, 20000)
+        if name in LIST_SIZES:
+            return [_words(rng, 1).title() for _ in range(LIST_SIZES[name])]
+        if name in INT_FIELDS:
+            return rng.randint(1, 100)
+        if name in BOOL_FIELDS:
+            return rng.random() < 0.5
+        if name in ENUMS:
+            return rng.choice(ENUMS[name])
+        if name == "description":
+            return _words(rng, rng.randint(40, 160))
+        if name in ("large", "medium", "bannerImage"):
+            return f"https://s4.anilist.co/file/anilistcdn/{rng.randint(1, 20000)}.jpg"
+        return _words(rng, 2).title()
+
+
+def _readdress(data: Any, ids: List[int]) -> Any:
+    """Point a recorded Page at the requested IDs, reusing its items in turn"""
+    page = data.get("Page") if isinstance(data, dict) else None
+    if not page:
+        return data
+
+    for field, items in page.items():
+        if isinstance(items, list) and items:
+            page[field] = [
+                {**items[i % len(items)], "id": item_id} for i, item_id in enumerate(ids)
+            ]
+    return data
+
+
+class FakeAniList:
+    """In-process AniList stand-in serving over HTTP"""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        retry_after: int = 1,
+        rate_limit: int = 6000,
+        record: bool = False,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.rate_limit = rate_limit
+        self.record = record
+        self.seed = seed
+        self.requests: Counter = Counter()
+        self.rate_limited = 0
+        self._rng = random.Random(seed)
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._runner: Optional[web.AppRunner] = None
+        self._upstream: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Requests served per operation"""
+        return {
+            "requests": self.total_requests,
+            "rate_limited": self.rate_limited,
+            "by_operation": dict(self.requests),
+        }
+
+    def reset(self):
+        """Forget request counts"""
+        self.requests.clear()
+        self.rate_limited = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving; returns the endpoint URL"""
+        app = web.Application()
+        app.router.add_post("/", self._handle)
+        app.router.add_get("/stats", self._handle_stats)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        if self.record:
+            self._upstream = aiohttp.ClientSession()
+
+        bound_host, bound_port = self._runner.addresses[0][:2]
+        return f"http://{bound_host}:{bound_port}/"
+
+    async def stop(self):
+        """Stop serving"""
+        if self._upstream is not None:
+            await self._upstream.close()
+            self._upstream = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _remaining(self) -> int:
+        """Requests left in the current one-minute window"""
+        now = time.monotonic()
+        if now - self._window_start >= 60:
+            self._window_start = now
+            self._window_count = 0
+        self._window_count += 1
+        return max(0, self.rate_limit - self._window_count)
+
+    async def _handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        query = body.get("query", "")
+        variables = body.get("variables") or {}
+        operation = body.get("operationName") or "anonymous"
+        self.requests[operation] += 1
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self._rng.uniform(0, self.jitter))
+
+        remaining = self._remaining()
+        if remaining == 0 or self._rng.random() < self.error_rate:
+            self.rate_limited += 1
+            return web.json_response(
+                {"data": None, "errors": [{"message": "Too Many Requests.", "status": 429}]},
+                status=429,
+                headers={
+                    "Retry-After": str(self.retry_after),
+                    "X-RateLimit-Limit": str(self.rate_limit),
+                    "X-RateLimit-Remaining": "0",
+                },
+            )
+
+        headers = {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(remaining),
+        }
+        if self._upstream is not None:
+            return await self._proxy(body, operation, headers)
+        return web.json_response({"data": self._data(operation, query, variables)}, headers=headers)
+
+    def _data(self, operation: str, query: str, variables: Dict[str, Any]) -> Any:
+        """Recorded data for the operation, or data built from the query"""
+        fixture = FIXTURE_DIR / f"{operation}.json"
+        if fixture.exists():
+            data = json.loads(fixture.read_text(encoding="utf-8"))["data"]
+            ids = variables.get("ids")
+            return _readdress(data, ids) if ids else data
+
+        seed = zlib.crc32(
+            f"{self.seed}:{operation}:{json.dumps(variables, sort_keys=True)}".encode()
+        )
+        return ResponseBuilder(_parse(query), variables, random.Random(seed)).build()
+
+    async def _proxy(self, body: Dict, operation: str, headers: Dict[str, str]) -> web.Response:
+        """Forward a request to AniList and save a successful answer as a fixture"""
+        async with self._upstream.post(ANILIST_URL, json=body) as response:
+            payload = await response.json()
+        if response.status == 200 and not payload.get("errors"):
+            FIXTURE_DIR.mkdir(exist_ok=True)
+            path = FIXTURE_DIR / f"{operation}.json"
+            path.write_text(json.dumps(payload), encoding="utf-8")
+            print(f"Recorded {path}")
+        return web.json_response(payload, status=response.status, headers=headers)
+
+
+async def serve(args: argparse.Namespace):
+    """Serve until interrupted"""
+    fake = FakeAniList(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        rate_limit=args.rate_limit,
+        record=args.record,
+        seed=args.seed,
+    )
+    url = await fake.start(args.host, args.port)
+    print(f"Fake AniList listening on {url} (set ANILIST_API_URL to use it)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await fake.stop()
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Options shaping the fake server's behaviour"""
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added per request")
+    parser.add_argument("--jitter", type=float, default=0.02, help="random extra seconds, 0..N")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction answered 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After on 429s")
+    parser.add_argument("--rate-limit", type=int, default=6000, help="requests per minute")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--record", action="store_true", help="proxy to AniList, saving fixtures")
+    add_arguments(parser)
+
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,329 @@
+"""
+Load test the MCP server against a local AniList stand-in
+
+Drives MCPServer.handle_request directly, or the FastAPI app over
+in-process HTTP, with a fixed mix of tool calls at the given concurrency,
+and reports latency percentiles, requests/sec, upstream AniList calls
+per tool call and memory. The workload and the fake AniList's answers
+are seeded, so runs from different commits are comparable: write the
+result with --output and check a later run against it with --baseline.
+
+Redis is an in-memory fakeredis unless --redis-url is given, in which
+case that database is flushed first; point it at a scratch database.
+
+Usage:
+    python -m benchmarks.load_test [--target mcp|http] [--requests 2000] [--concurrency 50]
+    python -m benchmarks.load_test --output baseline.json
+    python -m benchmarks.load_test --baseline baseline.json [--threshold 0.1]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import redis.asyncio as redis
+
+from benchmarks.fake_anilist import FakeAniList, add_arguments
+from src.config.settings import settings
+from src.mcp.server import MCPServer
+from src.services.anilist.client import close_anilist_client, get_anilist_client
+from src.services.anilist.rate_limiter import RateLimiter
+from src.services.cache import redis_client
+from src.services.cache.cache_service import get_cache_service
+
+QUERIES = [
+    "naruto", "one piece", "bleach", "gundam", "evangelion", "cowboy bebop", "frieren",
+    "spy family", "haikyuu", "monogatari", "mushishi", "k-on", "steins gate", "akira",
+    "berserk", "vinland saga", "made in abyss", "clannad", "toradora", "lain",
+]  # fmt: skip
+
+SEASONS = ["WINTER", "SPRING", "SUMMER", "FALL"]
+
+# Metrics checked against a baseline, and whether higher values are better
+CHECKS = [
+    ("latency_ms.p50", False),
+    ("latency_ms.p95", False),
+    ("latency_ms.p99", False),
+    ("requests_per_second", True),
+    ("upstream.calls_per_tool_call", False),
+    ("memory.peak_rss_mb", False),
+]
+
+Call = Tuple[str, Dict[str, Any]]
+
+
+def workload(count: int, seed: int) -> List[Call]:
+    """A fixed mix of tool calls; repeats give the caches something to hit"""
+    rng = random.Random(seed)
+    tools: List[Tuple[int, Callable[[], Call]]] = [
+        (40, lambda: ("search_anime", {"query": rng.choice(QUERIES), "per_page": 10})),
+        (20, lambda: ("get_trending_anime", {"page": rng.randint(1, 3)})),
+        (
+            15,
+            lambda: (
+                "get_seasonal_anime",
+                {"season": rng.choice(SEASONS), "year": rng.randint(2020, 2025)},
+            ),
+        ),
+        (10, lambda: ("get_character_info", {"character_id": rng.randint(1, 200)})),
+        (10, lambda: ("get_anime_recommendations", {"reference_anime_id": rng.randint(1, 100)})),
+        (5, lambda: ("get_user_list", {"user_name": f"user{rng.randint(1, 20)}"})),
+    ]
+    weights = [weight for weight, _ in tools]
+    return [rng.choices(tools, weights)[0][1]() for _ in range(count)]
+
+
+def percentile(values: List[float], pct: int) -> float:
+    """Percentile of values, interpolated"""
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def git_commit() -> str:
+    """Short hash of the checked out commit, if any"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+async def connect_redis(url: Optional[str]) -> redis.ConnectionPool:
+    """Pool for the process-wide Redis client, emptied before the run"""
+    if url:
+        pool = redis.BlockingConnectionPool.from_url(url, max_connections=100)
+    else:
+        import fakeredis
+        from fakeredis.aioredis import FakeConnection
+
+        pool = redis.BlockingConnectionPool(
+            connection_class=FakeConnection, server=fakeredis.FakeServer(), max_connections=100
+        )
+    await redis.Redis(connection_pool=pool).flushdb()
+    redis_client._pool = pool
+    return pool
+
+
+def mcp_sender(server: MCPServer) -> Callable[[Dict], Awaitable[Dict]]:
+    """Send requests straight to the MCP server"""
+
+    async def send(request: Dict) -> Dict:
+        return await server.handle_request("bench", request)
+
+    return send
+
+
+def http_sender(client: httpx.AsyncClient) -> Callable[[Dict], Awaitable[Dict]]:
+    """Send requests through the FastAPI app"""
+
+    async def send(request: Dict) -> Dict:
+        response = await client.post("/mcp", json=request, headers={"Mcp-Session-Id": "bench"})
+        return response.json()
+
+    return send
+
+
+async def drive(
+    send: Callable[[Dict], Awaitable[Dict]], calls: List[Call], concurrency: int
+) -> Tuple[List[float], int, float]:
+    """Run calls with at most concurrency in flight; returns latencies, errors and duration"""
+    latencies: List[float] = []
+    errors = 0
+    pending = iter(enumerate(calls))
+
+    async def worker():
+        nonlocal errors
+        for request_id, (name, arguments) in pending:
+            request = {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "method": "tools/call",
+                "params": {"name": name, "arguments": arguments},
+            }
+            start = time.perf_counter()
+            response = await send(request)
+            latencies.append(time.perf_counter() - start)
+            if "error" in response or response.get("result", {}).get("isError"):
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run the load test and summarize it"""
+    fake = FakeAniList(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        rate_limit=args.rate_limit,
+        seed=args.seed,
+    )
+    settings.ANILIST_API_URL = await fake.start()
+    pool = await connect_redis(args.redis_url)
+
+    anilist = get_anilist_client()
+    anilist.rate_limiter = RateLimiter(requests=args.rate_limit, window=60)
+    await anilist.connect()
+    cache = get_cache_service()
+    await cache.start()
+    server = MCPServer()
+    calls = workload(args.requests, args.seed)
+
+    try:
+        if args.target == "http":
+            from src.main import app
+
+            # The app's lifespan also needs Postgres; set up only what /mcp uses
+            app.state.mcp_server = server
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                latencies, errors, duration = await drive(
+                    http_sender(client), calls, args.concurrency
+                )
+        else:
+            latencies, errors, duration = await drive(mcp_sender(server), calls, args.concurrency)
+    finally:
+        await cache.stop()
+        await close_anilist_client()
+        await fake.stop()
+        await pool.disconnect()
+
+    upstream = fake.stats()
+    millis = [latency * 1000 for latency in latencies]
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "target": args.target,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+            "rate_limit": args.rate_limit,
+            "seed": args.seed,
+            "redis": "external" if args.redis_url else "fakeredis",
+        },
+        "results": {
+            "requests": len(latencies),
+            "errors": errors,
+            "duration_s": round(duration, 3),
+            "requests_per_second": round(len(latencies) / duration, 1),
+            "latency_ms": {
+                "p50": round(percentile(millis, 50), 2),
+                "p95": round(percentile(millis, 95), 2),
+                "p99": round(percentile(millis, 99), 2),
+                "mean": round(statistics.fmean(millis), 2),
+                "max": round(max(millis), 2),
+            },
+            "upstream": {
+                "calls": upstream["requests"],
+                "calls_per_tool_call": round(upstream["requests"] / len(latencies), 3),
+                "rate_limited": upstream["rate_limited"],
+                "by_operation": upstream["by_operation"],
+            },
+            "memory": {
+                "peak_rss_mb": round(peak_rss_mb(), 1),
+                "l1_entries": len(cache.local),
+                "l1_bytes": cache.local.size_bytes,
+            },
+        },
+    }
+
+
+def _lookup(results: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = results
+    for part in path.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Describe every metric that regressed by more than threshold"""
+    if current["config"] != baseline["config"]:
+        print("Warning: baseline was run with a different configuration")
+
+    regressions = []
+    for path, higher_is_better in CHECKS:
+        now = _lookup(current["results"], path)
+        before = _lookup(baseline["results"], path)
+        if not now or not before:
+            continue
+        change = (now - before) / before
+        worse = -change if higher_is_better else change
+        if worse > threshold:
+            regressions.append(f"{path}: {before} -> {now} ({change:+.1%})")
+    return regressions
+
+
+def report(result: Dict[str, Any]):
+    """Print a short summary"""
+    results = result["results"]
+    latency = results["latency_ms"]
+    upstream = results["upstream"]
+    config = result["config"]
+    print(
+        f"{config['target']}: {results['requests']} calls, {config['concurrency']} concurrent, "
+        f"{results['errors']} errors"
+    )
+    print(
+        f"  latency ms   p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}"
+        f"  max {latency['max']}"
+    )
+    print(f"  throughput   {results['requests_per_second']} req/s")
+    print(
+        f"  upstream     {upstream['calls']} calls,"
+        f" {upstream['calls_per_tool_call']} per tool call,"
+        f" {upstream['rate_limited']} rate limited"
+    )
+    print(f"  memory       peak RSS {results['memory']['peak_rss_mb']} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--target", choices=["mcp", "http"], default="mcp")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--redis-url", help="use this Redis database instead of fakeredis")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--baseline", type=Path, help="fail if results regress from this run")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed regression ratio")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    report(result)
+    if args.output:
+        args.output.write_text(json.dumps(result, indent=2) + "\n", encoding="utf-8")
+        print(f"Wrote {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(result, baseline, args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {baseline.get('commit')}")
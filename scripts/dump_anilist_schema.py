@@ -0,0 +1,33 @@
+"""
+Fetch the AniList GraphQL schema and bundle it as SDL
+
+Usage: python -m scripts.dump_anilist_schema [output_path]
+"""
+
+import asyncio
+import sys
+
+from gql import Client
+from gql.transport.aiohttp import AIOHTTPTransport
+from graphql import print_schema
+
+from src.config.settings import settings
+from src.services.anilist.client import BUNDLED_SCHEMA_PATH
+
+
+async def main(output_path: str):
+    """Introspect AniList and write the schema to disk"""
+    transport = AIOHTTPTransport(url=settings.ANILIST_API_URL)
+    client = Client(transport=transport, fetch_schema_from_transport=True)
+
+    async with client:
+        pass
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(print_schema(client.schema))
+
+    print(f"Wrote AniList schema to {output_path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else str(BUNDLED_SCHEMA_PATH)))
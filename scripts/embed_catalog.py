@@ -0,0 +1,24 @@
+"""
+Embed anime in the CachedAnime table that are new or changed since last run
+
+Run after scripts.sync_catalog. On SQLite, running servers pick the new
+embeddings up within CATALOG_RELOAD_INTERVAL; on Postgres, at once.
+
+Usage: python -m scripts.embed_catalog
+"""
+
+import asyncio
+
+from src.models.database import init_db
+from src.services.embeddings import get_embedding_store
+
+
+async def main():
+    """Embed the catalog mirror once"""
+    await init_db()
+    embedded = await get_embedding_store().embed_pending()
+    print(f"Embedded {embedded} anime from the catalog mirror")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,30 @@
+"""
+Copy the AniList anime catalog into the CachedAnime table
+
+The first run copies everything; later runs fetch only anime updated
+since the last one, unless --full is given. Running servers pick the new
+copy up within CATALOG_RELOAD_INTERVAL.
+
+Usage: python -m scripts.sync_catalog [--full]
+"""
+
+import asyncio
+import sys
+
+from src.models.database import init_db
+from src.services.anilist.client import close_anilist_client
+from src.services.catalog import get_catalog
+
+
+async def main(full: bool):
+    """Sync the catalog mirror once"""
+    await init_db()
+    try:
+        synced = await get_catalog().sync(full=full)
+    finally:
+        await close_anilist_client()
+    print(f"Synced {synced} anime into the catalog mirror")
+
+
+if __name__ == "__main__":
+    asyncio.run(main("--full" in sys.argv[1:]))
@@ -2,6 +2,6 @@
 API routes package
 """
 
-from . import health, auth, webhooks
+from . import health, auth, mcp, webhooks, widgets
 
-__all__ = ["health", "auth", "webhooks"]
+__all__ = ["health", "auth", "mcp", "webhooks", "widgets"]
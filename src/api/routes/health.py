@@ -7,7 +7,9 @@ from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.models.database import get_db
+from src.services.cache.cache_service import get_cache_service
 from src.services.cache.redis_client import RedisClient
+from src.services.catalog import get_catalog
 
 router = APIRouter()
 
@@ -33,10 +35,8 @@ async def health_redis():
     """Redis health check"""
     try:
         redis = RedisClient()
-        await redis.connect()
         await redis.set("health_check", "ok", ttl=10)
         value = await redis.get("health_check")
-        await redis.disconnect()
 
         if value == "ok":
             return {"status": "healthy", "redis": "connected"}
@@ -46,6 +46,21 @@ async def health_redis():
         return {"status": "unhealthy", "redis": str(e)}
 
 
+@router.get("/cache")
+async def health_cache():
+    """Cache hit/miss counters per tier"""
+    return {"status": "healthy", "cache": get_cache_service().get_stats()}
+
+
+@router.get("/catalog")
+async def health_catalog():
+    """Catalog mirror sync progress and what this worker has loaded"""
+    try:
+        return {"status": "healthy", "catalog": await get_catalog().progress()}
+    except Exception as e:
+        return {"status": "unhealthy", "catalog": str(e)}
+
+
 @router.get("/ready")
 async def readiness_check():
     """Readiness probe for Kubernetes"""
@@ -0,0 +1,45 @@
+"""
+MCP streamable HTTP transport routes
+"""
+
+import uuid
+
+import orjson
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import StreamingResponse
+
+from src.config.settings import settings
+from src.mcp.transport import sse_stream
+
+router = APIRouter()
+
+SESSION_HEADER = "Mcp-Session-Id"
+
+
+@router.post("")
+async def mcp_endpoint(request: Request):
+    """Handle JSON-RPC messages, streaming results when the client accepts SSE"""
+    try:
+        message = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        error = {"jsonrpc": "2.0", "error": {"code": -32700, "message": "Parse error"}, "id": None}
+        return Response(orjson.dumps(error), status_code=400, media_type="application/json")
+
+    server = request.app.state.mcp_server
+    session_id = request.headers.get(SESSION_HEADER) or uuid.uuid4().hex
+    headers = {SESSION_HEADER: session_id}
+
+    if "text/event-stream" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            sse_stream(
+                server.stream_request(session_id, message), settings.MCP_STREAM_PING_INTERVAL
+            ),
+            media_type="text/event-stream",
+            headers={**headers, "Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    response = await server.handle_request(session_id, message)
+    if response == []:
+        # The batch held only notifications
+        return Response(status_code=202, headers=headers)
+    return Response(orjson.dumps(response), media_type="application/json", headers=headers)
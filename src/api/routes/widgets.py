@@ -0,0 +1,24 @@
+"""
+Widget asset routes
+"""
+
+from fastapi import APIRouter, Response
+
+from src.widgets import STYLESHEET, STYLESHEET_VERSION
+
+router = APIRouter()
+
+
+@router.get("/styles.{version}.css")
+async def widget_stylesheet(version: str):
+    """Serve the widget stylesheet; versioned URLs never change, so cache them for good"""
+    if version == STYLESHEET_VERSION:
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        # Stale pages still get the current styles, just not cached
+        cache_control = "no-cache"
+    return Response(
+        STYLESHEET,
+        media_type="text/css",
+        headers={"Cache-Control": cache_control, "Access-Control-Allow-Origin": "*"},
+    )
@@ -9,27 +9,47 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from src.config.settings import settings
-from src.api.routes import health, auth, webhooks
+from src.api.routes import health, auth, mcp, webhooks, widgets
 from src.mcp.server import MCPServer
-from src.services.cache.redis_client import RedisClient
+from src.services.anilist.client import close_anilist_client, get_anilist_client
+from src.services.cache.cache_service import get_cache_service
+from src.services.cache.redis_client import RedisClient, close_redis_pool, get_redis_pool
+from src.services.catalog import get_catalog
+from src.services.embeddings import get_embedder
 from src.models.database import init_db
+from src.observability.metrics import metrics_app
+from src.observability.tracing import setup_tracing, shutdown_tracing
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     # Startup
+    setup_tracing()
     await init_db()
-    app.state.redis = RedisClient()
+    app.state.redis = RedisClient(pool=get_redis_pool())
     await app.state.redis.connect()
+    app.state.cache = get_cache_service()
+    await app.state.cache.start()
+    app.state.anilist = get_anilist_client()
+    await app.state.anilist.connect()
+    # Loading a sentence-transformers model takes seconds; do it now, off the event loop
+    app.state.embedder = await asyncio.to_thread(get_embedder)
+    app.state.catalog = get_catalog()
+    await app.state.catalog.start()
     app.state.mcp_server = MCPServer()
     await app.state.mcp_server.start()
 
     yield
 
     # Shutdown
+    await app.state.catalog.stop()
+    await app.state.cache.stop()
     await app.state.redis.disconnect()
+    await close_redis_pool()
+    await close_anilist_client()
     await app.state.mcp_server.stop()
+    shutdown_tracing()
 
 
 app = FastAPI(
@@ -52,6 +72,11 @@ app.add_middleware(
 app.include_router(health.router, prefix="/health", tags=["health"])
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(webhooks.router, prefix="/webhooks", tags=["webhooks"])
+app.include_router(mcp.router, prefix="/mcp", tags=["mcp"])
+app.include_router(widgets.router, prefix="/widgets", tags=["widgets"])
+
+# Prometheus metrics
+app.mount("/metrics", metrics_app())
 
 
 @app.get("/")
@@ -2,13 +2,113 @@
 MCP Server implementation for ChatGPT integration
 """
 
-import json
 import asyncio
-from typing import Dict, Any
+import time
+from typing import Dict, Any, AsyncGenerator, FrozenSet, List, Optional, Union
 from datetime import datetime
 
-from src.tools.registry import registry
+import orjson
+from opentelemetry import trace
+from opentelemetry.trace import StatusCode
+
+from src.config.settings import settings
+from src.observability.tracing import tracer
+from src.tools.formats import (
+    FORMAT_FIELDS,
+    OUTPUT_FORMATS,
+    STRUCTURED,
+    SUMMARY,
+    WIDGET,
+    output_formats,
+)
+from src.tools.registry import registry, merge_chunk
 from src.services.cache.redis_client import RedisClient
+from src.services.cache.single_flight import make_flight_key
+
+
+def format_result(result: Any) -> str:
+    """Render a tool result as indented JSON text"""
+    return orjson.dumps(result, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+
+
+def invalid_request(message: str) -> Dict:
+    """JSON-RPC error response for a malformed request"""
+    return {"jsonrpc": "2.0", "error": {"code": -32600, "message": message}, "id": None}
+
+
+def request_params(request: Dict) -> Optional[Dict]:
+    """A request's params, {} when absent, or None when they aren't an object"""
+    params = request.get("params", {})
+    return params if isinstance(params, dict) else None
+
+
+WIDGET_URI = "ui://anilist/widget.html"
+
+
+def requested_formats(params: Dict) -> Optional[FrozenSet[str]]:
+    """Output formats a tools/call asked for in _meta.outputFormats, if it asked"""
+    meta = params.get("_meta")
+    formats = meta.get("outputFormats") if isinstance(meta, dict) else None
+    if formats is None:
+        return None
+    if isinstance(formats, str):
+        formats = [formats]
+    unknown = set(formats) - OUTPUT_FORMATS
+    if unknown:
+        raise ValueError(f"Unknown output format: {', '.join(sorted(unknown))}")
+    return frozenset(formats)
+
+
+def negotiated_result(result: Dict, formats: FrozenSet[str]) -> Dict:
+    """Tool result holding just the requested formats
+
+    The structured result goes in structuredContent, the summary in a text
+    block and the widget in an HTML resource.
+    """
+    rendered = set(FORMAT_FIELDS.values())
+    content = []
+    summary = result.get(FORMAT_FIELDS[SUMMARY])
+    if SUMMARY in formats and summary is not None:
+        content.append({"type": "text", "text": summary})
+    widget = result.get(FORMAT_FIELDS[WIDGET])
+    if WIDGET in formats and widget is not None:
+        content.append(
+            {
+                "type": "resource",
+                "resource": {"uri": WIDGET_URI, "mimeType": "text/html", "text": widget},
+            }
+        )
+
+    body: Dict[str, Any] = {"content": content}
+    # Tools that can't render what was asked for still answer with their data
+    if STRUCTURED in formats or not content:
+        body["structuredContent"] = {
+            field: value for field, value in result.items() if field not in rendered
+        }
+    return body
+
+
+def tool_result(result: Any, request_id: Any, formats: Optional[FrozenSet[str]] = None) -> Dict:
+    """JSON-RPC response carrying a tool result
+
+    Unless the call negotiated output formats, the whole result is sent
+    as JSON text.
+    """
+    if formats is None or not isinstance(result, dict):
+        body = {"content": [{"type": "text", "text": format_result(result)}]}
+    else:
+        body = negotiated_result(result, formats)
+    return {"jsonrpc": "2.0", "result": body, "id": request_id}
+
+
+def invalid_params(message: str, request_id: Any) -> Dict:
+    """JSON-RPC error response for a call with bad parameters"""
+    return {"jsonrpc": "2.0", "error": {"code": -32602, "message": message}, "id": request_id}
+
+
+def tool_error(message: str, request_id: Any) -> Dict:
+    """JSON-RPC error response for a failed tool call"""
+    return {"jsonrpc": "2.0", "error": {"code": -32603, "message": message}, "id": request_id}
 
 
 class MCPServer:
@@ -27,11 +127,18 @@ class MCPServer:
         """Cleanup MCP server"""
         print(f"[{datetime.now()}] MCP Server stopped")
 
-    async def handle_request(self, session_id: str, request: Dict) -> Dict:
-        """Handle incoming MCP request"""
+    async def handle_request(
+        self, session_id: str, request: Union[Dict, List]
+    ) -> Union[Dict, List[Dict]]:
+        """Handle incoming MCP request or JSON-RPC batch"""
+        if isinstance(request, list):
+            return await self._handle_batch(session_id, request)
+
         method = request.get("method")
-        params = request.get("params", {})
+        params = request_params(request)
         request_id = request.get("id")
+        if params is None:
+            return invalid_params("params must be an object", request_id)
 
         if method == "initialize":
             return await self._handle_initialize(session_id, params, request_id)
@@ -48,6 +155,54 @@ class MCPServer:
                 "id": request_id,
             }
 
+    async def _handle_batch(self, session_id: str, requests: List) -> List[Dict]:
+        """Handle a JSON-RPC batch, running entries concurrently
+
+        Responses come back in request order. Identical tool calls share
+        one execution, and at most MCP_BATCH_CONCURRENCY entries run at a
+        time. Notifications (entries without an id) get no response.
+        """
+        if not requests:
+            return [invalid_request("Empty batch")]
+
+        semaphore = asyncio.Semaphore(settings.MCP_BATCH_CONCURRENCY)
+        calls: Dict[str, asyncio.Task] = {}
+
+        async def run(request: Any) -> Dict:
+            if not isinstance(request, dict):
+                return invalid_request("Batch entries must be objects")
+            async with semaphore:
+                return await self.handle_request(session_id, request)
+
+        def schedule(request: Any) -> asyncio.Future:
+            if not isinstance(request, dict) or request.get("method") != "tools/call":
+                return asyncio.ensure_future(run(request))
+
+            params = request_params(request)
+            if params is None:
+                # Answered with its own error; the rest of the batch still runs
+                return asyncio.ensure_future(run(request))
+            key = make_flight_key(
+                params.get("name"),
+                {
+                    "arguments": params.get("arguments", {}),
+                    "formats": (params.get("_meta") or {}).get("outputFormats"),
+                },
+            )
+            if key not in calls:
+                calls[key] = asyncio.ensure_future(run(request))
+            return calls[key]
+
+        futures = [schedule(request) for request in requests]
+        responses = await asyncio.gather(*futures)
+
+        return [
+            {**response, "id": request.get("id")} if isinstance(request, dict) else response
+            # gather returns one response per scheduled request, in order
+            for request, response in zip(requests, responses, strict=True)
+            if not isinstance(request, dict) or "id" in request
+        ]
+
     async def _handle_initialize(
         self, session_id: str, params: Dict, request_id: Any
     ) -> Dict:
@@ -82,27 +237,115 @@ class MCPServer:
 
         tool = self.tool_registry.get_tool(tool_name)
         if not tool:
-            return {
-                "jsonrpc": "2.0",
-                "error": {"code": -32602, "message": f"Tool not found: {tool_name}"},
-                "id": request_id,
-            }
+            return invalid_params(f"Tool not found: {tool_name}", request_id)
+        try:
+            formats = requested_formats(params)
+        except ValueError as e:
+            return invalid_params(str(e), request_id)
+
+        with tracer.start_as_current_span(
+            "mcp tools/call", attributes={"mcp.tool.name": tool_name}
+        ) as span:
+            try:
+                with output_formats(formats or OUTPUT_FORMATS):
+                    result = await asyncio.wait_for(
+                        tool.handler(**arguments), timeout=settings.MCP_TOOL_TIMEOUT
+                    )
+                return tool_result(result, request_id, formats)
+            except asyncio.TimeoutError:
+                span.set_status(StatusCode.ERROR, "timeout")
+                return tool_error(
+                    f"Tool execution timed out after {settings.MCP_TOOL_TIMEOUT}s", request_id
+                )
+            except Exception as e:
+                span.record_exception(e)
+                span.set_status(StatusCode.ERROR, str(e))
+                return tool_error(f"Tool execution error: {str(e)}", request_id)
+
+    async def stream_request(
+        self, session_id: str, request: Union[Dict, List]
+    ) -> AsyncGenerator[Union[Dict, List[Dict]], None]:
+        """Handle a request, yielding progress notifications before the response
+
+        Calls to tools with a stream yield a notifications/progress message
+        per partial result, each carrying that chunk as content, and then
+        the usual response with the full result. Anything else yields just
+        its response.
+        """
+        params = request_params(request) if isinstance(request, dict) else None
+        if params is not None and request.get("method") == "tools/call":
+            tool = self.tool_registry.get_tool(params.get("name"))
+            if tool and tool.stream:
+                async for message in self._stream_call_tool(tool, params, request.get("id")):
+                    yield message
+                return
+
+        yield await self.handle_request(session_id, request)
 
+    async def _stream_call_tool(
+        self, tool: Any, params: Dict, request_id: Any
+    ) -> AsyncGenerator[Dict, None]:
+        """Execute a tool call, yielding each partial result as it is produced"""
         try:
-            result = await tool.handler(**arguments)
-            return {
-                "jsonrpc": "2.0",
-                "result": {
-                    "content": [{"type": "text", "text": json.dumps(result, indent=2)}]
-                },
-                "id": request_id,
-            }
+            formats = requested_formats(params)
+        except ValueError as e:
+            yield invalid_params(str(e), request_id)
+            return
+
+        chunks = None
+        result: Dict[str, Any] = {}
+        # Only time spent producing counts; waiting on a slow client doesn't
+        remaining = settings.MCP_TOOL_TIMEOUT
+        progress = 0
+        # Made current only while producing, as the consumer may switch tasks
+        span = tracer.start_span(
+            "mcp tools/call", attributes={"mcp.tool.name": tool.name, "mcp.stream": True}
+        )
+
+        try:
+            progress_token = (params.get("_meta") or {}).get("progressToken", request_id)
+            chunks = tool.stream(**params.get("arguments", {}))
+            while True:
+                started = time.monotonic()
+                try:
+                    with (
+                        trace.use_span(span, end_on_exit=False),
+                        output_formats(formats or OUTPUT_FORMATS),
+                    ):
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=remaining)
+                except StopAsyncIteration:
+                    break
+                remaining -= time.monotonic() - started
+
+                merge_chunk(result, chunk)
+                progress += 1
+                yield {
+                    "jsonrpc": "2.0",
+                    "method": "notifications/progress",
+                    "params": {
+                        "progressToken": progress_token,
+                        "progress": progress,
+                        "content": [{"type": "text", "text": format_result(chunk)}],
+                    },
+                }
+        except asyncio.TimeoutError:
+            span.set_status(StatusCode.ERROR, "timeout")
+            yield tool_error(
+                f"Tool execution timed out after {settings.MCP_TOOL_TIMEOUT}s", request_id
+            )
+            return
         except Exception as e:
-            return {
-                "jsonrpc": "2.0",
-                "error": {"code": -32603, "message": f"Tool execution error: {str(e)}"},
-                "id": request_id,
-            }
+            span.record_exception(e)
+            span.set_status(StatusCode.ERROR, str(e))
+            yield tool_error(f"Tool execution error: {str(e)}", request_id)
+            return
+        finally:
+            if chunks is not None:
+                await chunks.aclose()
+            span.set_attribute("mcp.progress", progress)
+            span.end()
+
+        yield tool_result(result, request_id, formats)
 
     async def _handle_list_resources(self, request_id: Any) -> Dict:
         """List available resources"""
@@ -0,0 +1,48 @@
+"""
+Server-sent events framing for the streamable HTTP transport
+"""
+
+import asyncio
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Union
+
+import orjson
+
+PING = b": ping\n\n"
+
+
+def sse_event(message: Any) -> bytes:
+    """Encode a JSON-RPC message as an SSE event"""
+    return b"event: message\ndata: " + orjson.dumps(message) + b"\n\n"
+
+
+async def sse_stream(
+    messages: AsyncGenerator[Union[Dict, List[Dict]], None], ping_interval: float
+) -> AsyncIterator[bytes]:
+    """Frame messages as SSE events, sending pings while none are ready
+
+    Messages are pulled one at a time, only once the previous event has
+    been handed to the server, so a slow client slows the tool down
+    instead of letting output pile up in memory. If the client goes away
+    the response is cancelled and the pending message is abandoned.
+    """
+    pending = None
+    try:
+        while True:
+            pending = asyncio.ensure_future(messages.__anext__())
+            while True:
+                done, _ = await asyncio.wait({pending}, timeout=ping_interval)
+                if done:
+                    break
+                yield PING
+
+            try:
+                message = pending.result()
+            except StopAsyncIteration:
+                return
+            pending = None
+            yield sse_event(message)
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        await messages.aclose()
@@ -4,6 +4,7 @@ Models package initialization
 
 from .database import Base, User, UserAnimeInteraction, CachedAnime, init_db, get_db
 from .schemas import AnimeSearchParams, CharacterQuery, UserListParams
+from .records import Media, MediaListEntry, MediaListColumns, Character
 
 __all__ = [
     "Base",
@@ -15,4 +16,8 @@ __all__ = [
     "AnimeSearchParams",
     "CharacterQuery",
     "UserListParams",
+    "Media",
+    "MediaListEntry",
+    "MediaListColumns",
+    "Character",
 ]
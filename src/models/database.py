@@ -10,8 +10,11 @@ from sqlalchemy import (
     DateTime,
     Boolean,
     ForeignKey,
+    Index,
     Text,
+    text,
 )
+from pgvector.sqlalchemy import Vector
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
@@ -63,6 +66,8 @@ class CachedAnime(Base):
     anilist_id = Column(Integer, primary_key=True)
     title_english = Column(String(500))
     title_romaji = Column(String(500))
+    title_native = Column(String(500))
+    synonyms = Column(Text)  # JSON string
     description = Column(Text)
     genres = Column(Text)  # JSON string
     tags = Column(Text)  # JSON string
@@ -70,14 +75,50 @@ class CachedAnime(Base):
     episodes = Column(Integer)
     duration = Column(Integer)
     status = Column(String(50))
+    format = Column(String(20))
+    source = Column(String(30))
     season = Column(String(20))
     season_year = Column(Integer)
+    start_date = Column(Integer)  # YYYYMMDD, unknown parts zero
     average_score = Column(Integer)
     popularity = Column(Integer)
+    trending = Column(Integer)
     cover_image_url = Column(Text)
+    cover_image_medium_url = Column(Text)
     banner_image_url = Column(Text)
+    trailer = Column(Text)  # JSON string
+    anilist_updated_at = Column(Integer)  # AniList's updatedAt, a Unix timestamp
     cached_at = Column(DateTime, default=datetime.utcnow)
     expires_at = Column(DateTime)
+    embedding = Column(Vector(settings.EMBEDDING_DIM))  # Of title, tags and synopsis
+    embedded_at = Column(DateTime)
+
+    __table_args__ = (
+        # Approximate nearest neighbours by cosine distance; only Postgres has pgvector
+        Index(
+            "ix_cached_anime_embedding",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
+
+class SyncCheckpoint(Base):
+    """Progress of a sync job, kept so the next run can pick up where it stopped"""
+
+    __tablename__ = "sync_checkpoints"
+
+    name = Column(String(50), primary_key=True)
+    mode = Column(String(20))  # full or incremental
+    high_water_mark = Column(Integer)  # Newest updatedAt the last complete run saw
+    target_mark = Column(Integer)  # high_water_mark once the running sync completes
+    cursor = Column(Integer)  # Last ID a full sync wrote, to resume from
+    synced = Column(Integer, default=0)  # Rows written by the current or last run
+    started_at = Column(DateTime)
+    completed_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
 # Database engine and session
@@ -92,6 +133,8 @@ async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit
 async def init_db():
     """Initialize database tables"""
     async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
         await conn.run_sync(Base.metadata.create_all)
 
 
@@ -0,0 +1,304 @@
+"""
+Compact in-memory records for AniList media, list entries and characters
+"""
+
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Nested objects of Media flattened into slots, and their fields
+TITLE_FIELDS = ("romaji", "english", "native")
+COVER_FIELDS = ("large", "medium")
+# Scalar Media fields and the slot holding each
+MEDIA_SLOTS = {
+    "episodes": "episodes",
+    "status": "status",
+    "format": "format",
+    "season": "season",
+    "seasonYear": "season_year",
+    "averageScore": "average_score",
+    "popularity": "popularity",
+    "updatedAt": "updated_at",
+}
+# Top-level Media fields held in slots; the rest of a Media object goes in extra
+MEDIA_SLOT_FIELDS = frozenset({"id", "title", "coverImage", "genres", *MEDIA_SLOTS})
+
+LIST_STATUSES = ("CURRENT", "PLANNING", "COMPLETED", "DROPPED", "PAUSED", "REPEATING")
+STATUS_CODES = {status: code for code, status in enumerate(LIST_STATUSES)}
+
+_shapes: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def shape_of(data: Dict[str, Any], nested: Iterable[str] = ()) -> Tuple[str, ...]:
+    """Fields a GraphQL object has, nested ones as parent.child
+
+    Objects from one query share a shape, so the tuple is interned and
+    each record holds a reference rather than its own copy.
+    """
+    keys = (
+        *data,
+        *(
+            f"{field}.{key}"
+            for field in nested
+            if isinstance(data.get(field), dict)
+            for key in data[field]
+        ),
+    )
+    return _shapes.setdefault(keys, keys)
+
+
+def enum(value: Optional[str]) -> Optional[str]:
+    """Interned enum value, so thousands of records share one string"""
+    return sys.intern(value) if value else value
+
+
+def pack_date(date: Optional[Dict[str, Any]]) -> int:
+    """FuzzyDate as YYYYMMDD, with unknown parts zero"""
+    date = date or {}
+    return (date.get("year") or 0) * 10000 + (date.get("month") or 0) * 100 + (date.get("day") or 0)
+
+
+def unpack_date(value: int, fields: Sequence[str] = ("year", "month", "day")) -> Dict[str, Any]:
+    """FuzzyDate from YYYYMMDD, with zero parts as null"""
+    parts = {"year": value // 10000, "month": value // 100 % 100, "day": value % 100}
+    return {field: parts[field] or None for field in fields}
+
+
+@dataclass(slots=True)
+class Media:
+    """An anime or manga from any of the Media fragments
+
+    Card fields get a slot each, with title and coverImage flattened;
+    detail fields (description, tags, studios, ...) are kept as given in
+    extra. shape remembers which fields the GraphQL object had, so
+    to_graphql gives back the same shape.
+    """
+
+    id: int
+    title_romaji: Optional[str] = None
+    title_english: Optional[str] = None
+    title_native: Optional[str] = None
+    cover_large: Optional[str] = None
+    cover_medium: Optional[str] = None
+    genres: Tuple[str, ...] = ()
+    episodes: Optional[int] = None
+    status: Optional[str] = None
+    format: Optional[str] = None
+    season: Optional[str] = None
+    season_year: Optional[int] = None
+    average_score: Optional[int] = None
+    popularity: Optional[int] = None
+    updated_at: Optional[int] = None
+    extra: Optional[Dict[str, Any]] = None
+    shape: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_graphql(cls, data: Dict[str, Any]) -> "Media":
+        """Record for a Media object"""
+        title = data.get("title") or {}
+        cover = data.get("coverImage") or {}
+        extra = {key: value for key, value in data.items() if key not in MEDIA_SLOT_FIELDS}
+        return cls(
+            id=data["id"],
+            title_romaji=title.get("romaji"),
+            title_english=title.get("english"),
+            title_native=title.get("native"),
+            cover_large=cover.get("large"),
+            cover_medium=cover.get("medium"),
+            genres=tuple(sys.intern(genre) for genre in data.get("genres") or ()),
+            episodes=data.get("episodes"),
+            status=enum(data.get("status")),
+            format=enum(data.get("format")),
+            season=enum(data.get("season")),
+            season_year=data.get("seasonYear"),
+            average_score=data.get("averageScore"),
+            popularity=data.get("popularity"),
+            updated_at=data.get("updatedAt"),
+            extra=extra or None,
+            shape=shape_of(data, ("title", "coverImage")),
+        )
+
+    def to_graphql(self) -> Dict[str, Any]:
+        """The Media object this record was made from"""
+        result: Dict[str, Any] = {}
+        for field in self.shape:
+            if field == "id":
+                result["id"] = self.id
+            elif field == "title":
+                result["title"] = {
+                    key: getattr(self, f"title_{key}")
+                    for key in TITLE_FIELDS
+                    if f"title.{key}" in self.shape
+                }
+            elif field == "coverImage":
+                result["coverImage"] = {
+                    key: getattr(self, f"cover_{key}")
+                    for key in COVER_FIELDS
+                    if f"coverImage.{key}" in self.shape
+                }
+            elif field == "genres":
+                result["genres"] = list(self.genres)
+            elif field in MEDIA_SLOT_FIELDS:
+                result[field] = getattr(self, MEDIA_SLOTS[field])
+            elif self.extra is not None and field in self.extra:
+                result[field] = self.extra[field]
+        return result
+
+
+@dataclass(slots=True)
+class MediaListEntry:
+    """An entry of a user's list, from the ListEntry fragment
+
+    Dates are packed as YYYYMMDD and missing numbers read as zero, as
+    AniList itself reports an unscored or unstarted entry.
+    """
+
+    id: int
+    media: Media
+    status: Optional[str] = None
+    score: float = 0.0
+    progress: int = 0
+    repeat: int = 0
+    updated_at: int = 0
+    started_at: int = 0
+    completed_at: int = 0
+
+    @classmethod
+    def from_graphql(cls, data: Dict[str, Any]) -> "MediaListEntry":
+        """Record for a MediaList object"""
+        return cls(
+            id=data["id"],
+            media=Media.from_graphql(data["media"]),
+            status=enum(data.get("status")),
+            score=data.get("score") or 0.0,
+            progress=data.get("progress") or 0,
+            repeat=data.get("repeat") or 0,
+            updated_at=data.get("updatedAt") or 0,
+            started_at=pack_date(data.get("startedAt")),
+            completed_at=pack_date(data.get("completedAt")),
+        )
+
+    def to_graphql(self) -> Dict[str, Any]:
+        """The MediaList object, in the ListEntry fragment's shape"""
+        return {
+            "id": self.id,
+            "updatedAt": self.updated_at,
+            "media": self.media.to_graphql(),
+            "score": self.score,
+            "progress": self.progress,
+            "status": self.status,
+            "repeat": self.repeat,
+            "startedAt": unpack_date(self.started_at),
+            "completedAt": unpack_date(self.completed_at),
+        }
+
+
+class MediaListColumns:
+    """List entries as struct-of-arrays columns, for filtering and sorting whole lists
+
+    Row i holds entries[i]. Statuses are small integer codes (see
+    LIST_STATUSES), with -1 for anything else.
+    """
+
+    def __init__(self, entries: Sequence[MediaListEntry]):
+        count = len(entries)
+        self.media_id = np.fromiter((entry.media.id for entry in entries), np.int64, count)
+        self.status = np.fromiter(
+            (STATUS_CODES.get(entry.status or "", -1) for entry in entries), np.int8, count
+        )
+        self.score = np.fromiter((entry.score for entry in entries), np.float32, count)
+        self.progress = np.fromiter((entry.progress for entry in entries), np.int32, count)
+        self.updated_at = np.fromiter((entry.updated_at for entry in entries), np.int64, count)
+        self.started_at = np.fromiter((entry.started_at for entry in entries), np.int32, count)
+        self.completed_at = np.fromiter((entry.completed_at for entry in entries), np.int32, count)
+
+    def __len__(self) -> int:
+        return len(self.media_id)
+
+    def rows(self, status: Optional[str] = None) -> np.ndarray:
+        """Rows with a status, or every row"""
+        if status is None:
+            return np.arange(len(self))
+        return np.flatnonzero(self.status == STATUS_CODES.get(status, -2))
+
+    def order(self, column: str, status: Optional[str] = None) -> np.ndarray:
+        """Rows with a status, highest value of a column first, ties in row order"""
+        rows = self.rows(status)
+        return rows[np.argsort(-getattr(self, column)[rows], kind="stable")]
+
+
+@dataclass(slots=True)
+class Character:
+    """A character, from the CharacterDetail fragment
+
+    The first page of media they appear in is small and read as a whole,
+    so it is kept as given.
+    """
+
+    id: int
+    name_full: Optional[str] = None
+    name_native: Optional[str] = None
+    name_alternative: Tuple[str, ...] = ()
+    image_large: Optional[str] = None
+    image_medium: Optional[str] = None
+    description: Optional[str] = None
+    gender: Optional[str] = None
+    birth_month: Optional[int] = None
+    birth_day: Optional[int] = None
+    age: Optional[str] = None
+    favourites: int = 0
+    media: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_graphql(cls, data: Dict[str, Any]) -> "Character":
+        """Record for a Character object"""
+        name = data.get("name") or {}
+        image = data.get("image") or {}
+        birth = data.get("dateOfBirth") or {}
+        return cls(
+            id=data["id"],
+            name_full=name.get("full"),
+            name_native=name.get("native"),
+            name_alternative=tuple(name.get("alternative") or ()),
+            image_large=image.get("large"),
+            image_medium=image.get("medium"),
+            description=data.get("description"),
+            gender=enum(data.get("gender")),
+            birth_month=birth.get("month"),
+            birth_day=birth.get("day"),
+            age=data.get("age"),
+            favourites=data.get("favourites") or 0,
+            media=data.get("media"),
+        )
+
+    @property
+    def name(self) -> Dict[str, Any]:
+        return {
+            "full": self.name_full,
+            "native": self.name_native,
+            "alternative": list(self.name_alternative),
+        }
+
+    @property
+    def image(self) -> Dict[str, Any]:
+        return {"large": self.image_large, "medium": self.image_medium}
+
+    @property
+    def date_of_birth(self) -> Dict[str, Any]:
+        return {"month": self.birth_month, "day": self.birth_day}
+
+    def to_graphql(self) -> Dict[str, Any]:
+        """The Character object, in the CharacterDetail fragment's shape"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "image": self.image,
+            "description": self.description,
+            "gender": self.gender,
+            "dateOfBirth": self.date_of_birth,
+            "age": self.age,
+            "favourites": self.favourites,
+            "media": self.media,
+        }
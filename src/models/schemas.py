@@ -13,7 +13,7 @@ class AnimeSearchParams(BaseModel):
     query: Optional[str] = Field(None, max_length=200)
     genres: Optional[List[str]] = Field(None, max_length=10)
     tags: Optional[List[str]] = Field(None, max_length=10)
-    season: Optional[str] = Field(None, regex="^(WINTER|SPRING|SUMMER|FALL)$")
+    season: Optional[str] = Field(None, pattern="^(WINTER|SPRING|SUMMER|FALL)$")
     year: Optional[int] = Field(None, ge=1940, le=2030)
     status: Optional[str] = None
     format: Optional[str] = None
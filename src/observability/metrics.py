@@ -0,0 +1,152 @@
+"""
+Prometheus metrics for tools, AniList calls and the cache
+"""
+
+import os
+import time
+from functools import wraps
+from typing import Any, AsyncIterator, Callable
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    make_asgi_app,
+    multiprocess,
+)
+
+TOOL_LATENCY = Histogram(
+    "mcp_tool_duration_seconds",
+    "Tool call latency",
+    ["tool", "status"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+ANILIST_REQUESTS = Counter(
+    "anilist_requests_total",
+    "AniList API requests, including retries",
+    ["operation", "status"],
+)
+
+ANILIST_LATENCY = Histogram(
+    "anilist_request_duration_seconds",
+    "AniList API request latency",
+    ["operation"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+
+ANILIST_RETRIES = Counter(
+    "anilist_retries_total",
+    "AniList API requests retried after a failure",
+    ["operation"],
+)
+
+ANILIST_RATE_LIMIT_REMAINING = Gauge(
+    "anilist_rate_limit_remaining",
+    "Requests left in the current AniList rate limit window",
+    multiprocess_mode="livemin",
+)
+
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by key prefix, tier and result",
+    ["prefix", "tier", "result"],
+)
+
+CACHE_ERRORS = Counter(
+    "cache_errors_total",
+    "Cache operations that failed",
+    ["operation"],
+)
+
+CACHE_PAYLOAD_BYTES = Histogram(
+    "cache_payload_bytes",
+    "Size of values written to Redis after serialization",
+    ["prefix"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+
+CATALOG_SEARCHES = Counter(
+    "catalog_searches_total",
+    "search_anime calls by whether the local catalog mirror answered them",
+    ["source"],
+)
+
+CATALOG_MEDIA_LOADS = Counter(
+    "catalog_media_loads_total",
+    "Media loaded by tool handlers, by whether CachedAnime or AniList had them",
+    ["source"],
+)
+
+CATALOG_SYNC_ROWS = Counter(
+    "catalog_sync_rows_total",
+    "Anime written to CachedAnime by catalog syncs",
+    ["mode"],
+)
+
+
+def key_prefix(key: str) -> str:
+    """Metric label for a cache key, e.g. search for search:abc"""
+    return key.split(":", 1)[0]
+
+
+def record_cache_lookup(key: str, tier: str, hit: bool):
+    """Count a cache hit or miss"""
+    CACHE_REQUESTS.labels(prefix=key_prefix(key), tier=tier, result="hit" if hit else "miss").inc()
+
+
+def timed_tool(name: str, handler: Callable) -> Callable:
+    """Wrap a tool handler to record its latency"""
+
+    @wraps(handler)
+    async def wrapper(*args, **kwargs) -> Any:
+        start = time.perf_counter()
+        status = "error"
+        try:
+            result = await handler(*args, **kwargs)
+            status = "success"
+            return result
+        finally:
+            TOOL_LATENCY.labels(tool=name, status=status).observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+def timed_tool_stream(name: str, stream: Callable) -> Callable:
+    """Wrap a tool stream to record the latency of producing every chunk
+
+    Only time spent producing chunks counts; time suspended while the
+    consumer (a slow SSE client, say) handles a chunk doesn't.
+    """
+
+    @wraps(stream)
+    async def wrapper(*args, **kwargs) -> AsyncIterator[Any]:
+        chunks = stream(*args, **kwargs)
+        elapsed = 0.0
+        status = "error"
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    status = "success"
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                yield chunk
+        finally:
+            await chunks.aclose()
+            TOOL_LATENCY.labels(tool=name, status=status).observe(elapsed)
+
+    return wrapper
+
+
+def metrics_app():
+    """ASGI app serving /metrics, aggregated across workers in multiprocess mode"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return make_asgi_app(registry=registry)
+    return make_asgi_app()
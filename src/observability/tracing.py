@@ -0,0 +1,104 @@
+"""
+OpenTelemetry tracing across MCP requests, tools, the cache and AniList
+"""
+
+from functools import wraps
+from typing import Any, AsyncIterator, Callable, Optional
+
+from opentelemetry import trace
+
+from src.config.settings import settings
+
+# Spans are no-ops until setup_tracing installs a provider
+tracer = trace.get_tracer("anilist-gpt")
+
+_provider: Optional[Any] = None
+
+
+def setup_tracing():
+    """Install a sampled tracer provider exporting to OTEL_EXPORTER"""
+    global _provider
+    if settings.OTEL_EXPORTER == "none" or _provider is not None:
+        return
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    if settings.OTEL_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        exporter = OTLPSpanExporter(endpoint=settings.OTEL_EXPORTER_OTLP_ENDPOINT)
+    elif settings.OTEL_EXPORTER == "console":
+        exporter = ConsoleSpanExporter()
+    else:
+        raise ValueError(f"Unknown OTEL_EXPORTER: {settings.OTEL_EXPORTER}")
+
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.OTEL_SERVICE_NAME}),
+        # Follow the caller's sampling decision so traces are never cut in half
+        sampler=ParentBased(TraceIdRatioBased(settings.OTEL_SAMPLE_RATIO)),
+    )
+    _provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(_provider)
+
+
+def shutdown_tracing():
+    """Flush and stop exporting spans"""
+    global _provider
+    if _provider is not None:
+        _provider.shutdown()
+        _provider = None
+
+
+def traced(name: str) -> Callable:
+    """Decorate a coroutine function to run inside a span"""
+
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        async def wrapper(*args, **kwargs) -> Any:
+            with tracer.start_as_current_span(name):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def traced_tool(name: str, handler: Callable) -> Callable:
+    """Wrap a tool handler in a span"""
+
+    @wraps(handler)
+    async def wrapper(*args, **kwargs) -> Any:
+        with tracer.start_as_current_span(f"tool {name}", attributes={"mcp.tool.name": name}):
+            return await handler(*args, **kwargs)
+
+    return wrapper
+
+
+def traced_tool_stream(name: str, stream: Callable) -> Callable:
+    """Wrap a tool stream in a span covering every chunk
+
+    The span is only made current while a chunk is being produced, since
+    the consumer may resume the stream from another task's context.
+    """
+
+    @wraps(stream)
+    async def wrapper(*args, **kwargs) -> AsyncIterator[Any]:
+        span = tracer.start_span(f"tool {name}", attributes={"mcp.tool.name": name})
+        chunks = stream(*args, **kwargs)
+        try:
+            while True:
+                with trace.use_span(span, end_on_exit=False):
+                    try:
+                        chunk = await chunks.__anext__()
+                    except StopAsyncIteration:
+                        return
+                    span.add_event("chunk")
+                yield chunk
+        finally:
+            await chunks.aclose()
+            span.end()
+
+    return wrapper
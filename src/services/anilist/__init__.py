@@ -2,6 +2,6 @@
 AniList services initialization
 """
 
-from .client import AniListClient
+from .client import AniListClient, close_anilist_client, get_anilist_client
 
-__all__ = ["AniListClient"]
+__all__ = ["AniListClient", "get_anilist_client", "close_anilist_client"]
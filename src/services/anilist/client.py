@@ -2,277 +2,273 @@
 AniList GraphQL client
 """
 
-from gql import Client, gql
-from gql.transport.aiohttp import AIOHTTPTransport
-from gql.transport.exceptions import TransportQueryError
 import asyncio
-from tenacity import retry, stop_after_attempt, wait_exponential
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import aiohttp
+from gql import Client
+from gql.client import AsyncClientSession
+from gql.transport.aiohttp import AIOHTTPTransport
+from gql.transport.exceptions import TransportServerError
+from graphql import GraphQLSchema, build_ast_schema, build_client_schema, parse
+from opentelemetry import trace
+from tenacity import (
+    RetryCallState,
+    retry,
+    retry_if_not_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
+
+from src.config.settings import settings
+from src.observability.metrics import (
+    ANILIST_LATENCY,
+    ANILIST_RATE_LIMIT_REMAINING,
+    ANILIST_REQUESTS,
+    ANILIST_RETRIES,
+)
+from src.observability.tracing import tracer
+from src.services.anilist.loader import DataLoader
+from src.services.anilist.rate_limiter import RateLimiter
+from src.services.anilist.operations import (
+    GET_AIRING_SCHEDULE,
+    GET_CATALOG_PAGE,
+    GET_CHARACTERS_BY_IDS,
+    GET_MEDIA_BY_IDS,
+    GET_RECOMMENDATIONS_BY_IDS,
+    GET_UPDATED_MEDIA,
+    GET_USER_LIST,
+    GET_USER_LIST_IDS,
+    GET_USER_LIST_UPDATES,
+    Operation,
+    Projection,
+    operations,
+    search_media_operation,
+)
+from src.utils.exceptions import AniListAPIError, RateLimitError
+from src.services.cache.single_flight import SingleFlight, make_flight_key
+
+BUNDLED_SCHEMA_PATH = Path(__file__).parent / "schema.graphql"
+
+
+def _count_retry(retry_state: RetryCallState):
+    """Count a retried AniList call and record it on the current span"""
+    operation = retry_state.args[1]
+    ANILIST_RETRIES.labels(operation=operation.name or "anonymous").inc()
+    trace.get_current_span().add_event(
+        "retry",
+        {
+            "attempt": retry_state.attempt_number,
+            "wait_seconds": retry_state.next_action.sleep if retry_state.next_action else 0.0,
+            "error": repr(retry_state.outcome.exception()) if retry_state.outcome else "",
+        },
+    )
+
+
+def load_schema(path: Optional[str] = None) -> Optional[GraphQLSchema]:
+    """Load the AniList schema from an SDL or introspection JSON file"""
+    schema_path = Path(path) if path else BUNDLED_SCHEMA_PATH
+    if not schema_path.exists():
+        return None
+
+    source = schema_path.read_text(encoding="utf-8")
+    if schema_path.suffix == ".json":
+        introspection = json.loads(source)
+        return build_client_schema(introspection.get("data", introspection))
+    return build_ast_schema(parse(source))
 
 
 class AniListClient:
     """GraphQL client for AniList API"""
 
-    def __init__(self):
-        self.endpoint = "https://graphql.anilist.co"
-        self.transport = AIOHTTPTransport(url=self.endpoint)
+    def __init__(self, schema: Optional[GraphQLSchema] = None):
+        self.endpoint = settings.ANILIST_API_URL
+        self.transport = AIOHTTPTransport(
+            url=self.endpoint, timeout=settings.ANILIST_REQUEST_TIMEOUT
+        )
+        # Operations are validated once here rather than by gql on every request
+        if schema is not None:
+            operations.validate(schema)
         self.client = Client(
             transport=self.transport,
-            fetch_schema_from_transport=True,
+            fetch_schema_from_transport=False,
+            execute_timeout=settings.ANILIST_REQUEST_TIMEOUT,
+        )
+        self.session: Optional[AsyncClientSession] = None
+        self._connect_lock = asyncio.Lock()
+        self._flight = SingleFlight()
+        self.rate_limiter = RateLimiter()
+        self.media_loader = DataLoader(self._batch_loader(GET_MEDIA_BY_IDS, "media"))
+        self.character_loader = DataLoader(
+            self._batch_loader(GET_CHARACTERS_BY_IDS, "characters")
+        )
+        self.recommendations_loader = DataLoader(
+            self._batch_loader(GET_RECOMMENDATIONS_BY_IDS, "media")
         )
-        self.rate_limit_remaining = 90
-        self.rate_limit_reset = 60
+
+    async def connect(self):
+        """Open the pooled keep-alive HTTP session"""
+        async with self._connect_lock:
+            if self.session:
+                return
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_request_end.append(self._on_request_end)
+            self.transport.client_session_args = {
+                "connector": aiohttp.TCPConnector(
+                    limit=settings.ANILIST_POOL_SIZE,
+                    limit_per_host=settings.ANILIST_POOL_SIZE_PER_HOST,
+                    keepalive_timeout=settings.ANILIST_KEEPALIVE_TIMEOUT,
+                ),
+                "trace_configs": [trace_config],
+            }
+            self.session = await self.client.connect_async()
+
+    async def _on_request_end(self, session, context, params: aiohttp.TraceRequestEndParams):
+        """Feed rate limit headers from every response to the limiter"""
+        await self.rate_limiter.observe(params.response.status, params.response.headers)
+        if self.rate_limiter.remaining is not None:
+            ANILIST_RATE_LIMIT_REMAINING.set(self.rate_limiter.remaining)
+
+    @property
+    def rate_limit_remaining(self) -> Optional[int]:
+        """Requests left in the current window, as last reported by AniList"""
+        return self.rate_limiter.remaining
+
+    async def close(self):
+        """Close the HTTP session and its connection pool"""
+        async with self._connect_lock:
+            if self.session:
+                await self.client.close_async()
+                self.session = None
+
+    async def execute(self, query: Union[Operation, str], variables: dict = None) -> dict:
+        """Execute GraphQL query, sharing the result with identical in-flight calls"""
+        operation = operations.resolve(query)
+        key = make_flight_key(operation.name or operation.query, variables)
+        name = operation.name or "anonymous"
+        with tracer.start_as_current_span(
+            f"anilist {name}", attributes={"graphql.operation.name": name}
+        ):
+            return await self._flight.do(key, lambda: self._execute(operation, variables))
 
     @retry(
+        # A rate limit timeout already waited RATE_LIMIT_ACQUIRE_TIMEOUT; retrying only waits again
+        retry=retry_if_not_exception_type(RateLimitError),
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=4, max=10),
+        before_sleep=_count_retry,
         reraise=True,
     )
-    async def execute(self, query: str, variables: dict = None) -> dict:
+    async def _execute(self, operation: Operation, variables: Optional[dict]) -> dict:
         """Execute GraphQL query with retry logic"""
-        if self.rate_limit_remaining < 5:
-            await asyncio.sleep(self.rate_limit_reset)
+        if not self.session:
+            await self.connect()
 
-        try:
-            result = await self.client.execute_async(
-                gql(query), variable_values=variables
-            )
-            return result
-        except TransportQueryError as e:
-            if "429" in str(e):
-                await asyncio.sleep(60)
+        name = operation.name or "anonymous"
+        with tracer.start_as_current_span("anilist request") as span:
+            # Wait for a token instead of sleeping here; 429s are turned into a
+            # shared block by the response hook, so retries queue behind it
+            await self.rate_limiter.acquire()
+            span.add_event("rate_limit.acquired")
+
+            start = time.perf_counter()
+            status = "error"
+            try:
+                result = await self.session.execute(operation.request(variables))
+                status = "success"
+                return result
+            except TransportServerError as e:
+                if e.code == 429:
+                    status = "rate_limited"
                 raise
-            raise
-
-    async def search_media(self, variables: dict) -> dict:
-        """Search anime/manga with filters"""
-        query = """
-        query ($page: Int, $perPage: Int, $search: String, $sort: [MediaSort], 
-               $type: MediaType, $genre_in: [String], $tag_in: [String],
-               $season: MediaSeason, $seasonYear: Int, $status: MediaStatus,
-               $format: MediaFormat, $averageScore_greater: Int) {
-            Page(page: $page, perPage: $perPage) {
-                pageInfo {
-                    total
-                    currentPage
-                    lastPage
-                    hasNextPage
-                    perPage
-                }
-                media(search: $search, sort: $sort, type: $type,
-                      genre_in: $genre_in, tag_in: $tag_in,
-                      season: $season, seasonYear: $seasonYear,
-                      status: $status, format: $format,
-                      averageScore_greater: $averageScore_greater) {
-                    id
-                    title {
-                        romaji
-                        english
-                        native
-                    }
-                    description(asHtml: false)
-                    coverImage {
-                        large
-                        medium
-                    }
-                    bannerImage
-                    genres
-                    tags {
-                        name
-                        rank
-                    }
-                    studios {
-                        nodes {
-                            name
-                        }
-                    }
-                    episodes
-                    duration
-                    status
-                    season
-                    seasonYear
-                    averageScore
-                    popularity
-                    trending
-                    format
-                    source
-                    startDate {
-                        year
-                        month
-                        day
-                    }
-                    nextAiringEpisode {
-                        episode
-                        timeUntilAiring
-                        airingAt
-                    }
-                    trailer {
-                        id
-                        site
-                    }
-                }
-            }
-        }
-        """
-        return await self.execute(query, variables)
+            finally:
+                span.set_attribute("anilist.status", status)
+                ANILIST_LATENCY.labels(operation=name).observe(time.perf_counter() - start)
+                ANILIST_REQUESTS.labels(operation=name, status=status).inc()
+
+    def _batch_loader(self, operation: Operation, field: str):
+        """Build a batch function resolving IDs with one id_in page query"""
+
+        async def load(ids: List[int]) -> Dict[int, dict]:
+            result = await self.execute(operation, {"ids": ids, "perPage": len(ids)})
+            return {item["id"]: item for item in result.get("Page", {}).get(field, [])}
+
+        return load
+
+    @staticmethod
+    async def _load(loader: DataLoader, kind: str, entity_id: int) -> dict:
+        """Load one entity, raising if AniList doesn't know it"""
+        entity = await loader.load(entity_id)
+        if entity is None:
+            raise AniListAPIError(f"{kind} not found: {entity_id}")
+        return entity
+
+    async def search_media(
+        self, variables: dict, projection: Projection = Projection.DETAIL
+    ) -> dict:
+        """Search anime/manga with filters, selecting only the projection's fields"""
+        return await self.execute(search_media_operation(projection), variables)
+
+    async def get_media(self, media_id: int) -> dict:
+        """Get media details, batched with concurrent lookups"""
+        return {"Media": await self._load(self.media_loader, "Media", media_id)}
 
     async def get_character(self, character_id: int) -> dict:
-        """Get character information"""
-        query = """
-        query ($id: Int!) {
-            Character(id: $id) {
-                id
-                name {
-                    full
-                    native
-                    alternative
-                }
-                image {
-                    large
-                    medium
-                }
-                description
-                gender
-                dateOfBirth {
-                    month
-                    day
-                }
-                age
-                favourites
-                media(page: 1, perPage: 10) {
-                    nodes {
-                        id
-                        title {
-                            english
-                            romaji
-                        }
-                        type
-                        coverImage {
-                            large
-                        }
-                    }
-                    edges {
-                        characterRole
-                        voiceActors(language: JAPANESE) {
-                            id
-                            name {
-                                full
-                            }
-                            image {
-                                medium
-                            }
-                        }
-                    }
-                }
-            }
-        }
-        """
-        return await self.execute(query, {"id": character_id})
+        """Get character information, batched with concurrent lookups"""
+        return {"Character": await self._load(self.character_loader, "Character", character_id)}
 
     async def get_user_list(self, variables: dict) -> dict:
         """Get user anime/manga list"""
-        query = """
-        query ($userId: Int, $userName: String, $type: MediaType) {
-            MediaListCollection(userId: $userId, userName: $userName, type: $type) {
-                user {
-                    id
-                    name
-                    avatar {
-                        large
-                    }
-                }
-                lists {
-                    name
-                    status
-                    entries {
-                        id
-                        media {
-                            id
-                            title {
-                                english
-                                romaji
-                            }
-                            coverImage {
-                                large
-                            }
-                            episodes
-                            averageScore
-                        }
-                        score
-                        progress
-                        status
-                        repeat
-                        startedAt {
-                            year
-                            month
-                            day
-                        }
-                        completedAt {
-                            year
-                            month
-                            day
-                        }
-                    }
-                }
-            }
-        }
-        """
-        return await self.execute(query, variables)
+        return await self.execute(GET_USER_LIST, variables)
+
+    async def get_user_list_ids(self, variables: dict) -> dict:
+        """Get the media IDs on a user's list"""
+        return await self.execute(GET_USER_LIST_IDS, variables)
+
+    async def get_user_list_updates(self, variables: dict) -> dict:
+        """Get a page of a user's list entries, most recently updated first"""
+        return await self.execute(GET_USER_LIST_UPDATES, variables)
 
     async def get_recommendations(self, anime_id: int) -> dict:
-        """Get anime recommendations"""
-        query = """
-        query ($id: Int!) {
-            Media(id: $id) {
-                id
-                recommendations(page: 1, perPage: 10, sort: RATING_DESC) {
-                    nodes {
-                        id
-                        rating
-                        userRating
-                        mediaRecommendation {
-                            id
-                            title {
-                                english
-                                romaji
-                            }
-                            coverImage {
-                                large
-                            }
-                            averageScore
-                        }
-                    }
-                }
-            }
-        }
-        """
-        return await self.execute(query, {"id": anime_id})
+        """Get anime recommendations, batched with concurrent lookups"""
+        return {"Media": await self._load(self.recommendations_loader, "Media", anime_id)}
 
     async def get_airing_schedule(self, variables: dict) -> dict:
         """Get airing schedule"""
-        query = """
-        query ($page: Int, $airingAt_greater: Int, $airingAt_lesser: Int) {
-            Page(page: $page, perPage: 50) {
-                airingSchedules(
-                    airingAt_greater: $airingAt_greater
-                    airingAt_lesser: $airingAt_lesser
-                ) {
-                    id
-                    episode
-                    airingAt
-                    timeUntilAiring
-                    media {
-                        id
-                        title {
-                            english
-                            romaji
-                        }
-                        coverImage {
-                            large
-                        }
-                        duration
-                    }
-                }
-            }
-        }
-        """
-        return await self.execute(query, variables)
+        return await self.execute(GET_AIRING_SCHEDULE, variables)
+
+    async def get_catalog_page(self, variables: dict) -> dict:
+        """Get the next page of the anime catalog in ID order, for the local mirror"""
+        return await self.execute(GET_CATALOG_PAGE, variables)
+
+    async def get_updated_media(self, variables: dict) -> dict:
+        """Get a page of anime in most recently updated order, for the local mirror"""
+        return await self.execute(GET_UPDATED_MEDIA, variables)
+
+
+_client: Optional[AniListClient] = None
+
+
+def get_anilist_client() -> AniListClient:
+    """Get the process-wide AniList client"""
+    global _client
+    if _client is None:
+        schema = load_schema(settings.ANILIST_SCHEMA_PATH)
+        if schema is None:
+            print(
+                "AniList schema not found, skipping operation validation; "
+                "run scripts/dump_anilist_schema.py to enable it"
+            )
+        _client = AniListClient(schema=schema)
+    return _client
+
+
+async def close_anilist_client():
+    """Close the process-wide AniList client"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,107 @@
+"""
+DataLoader-style batching of AniList entity lookups
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+from src.config.settings import settings
+from src.services.cache.cache_service import LocalCache
+
+BatchFn = Callable[[List[Any]], Awaitable[Dict[Any, Any]]]
+
+
+class DataLoader:
+    """Collect keys requested within a short window and resolve them in one call
+
+    The batch function receives the distinct keys of a batch and returns a
+    mapping of key to value; keys missing from the mapping resolve to None.
+    Resolved values are cached per key for ttl seconds.
+    """
+
+    def __init__(
+        self,
+        batch_fn: BatchFn,
+        max_batch_size: int = settings.ANILIST_BATCH_MAX_SIZE,
+        batch_window: float = settings.ANILIST_BATCH_WINDOW,
+        cache_size: int = settings.ANILIST_ENTITY_CACHE_SIZE,
+        ttl: int = settings.ANILIST_ENTITY_CACHE_TTL,
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.ttl = ttl
+        self.cache = LocalCache(max_entries=cache_size, max_bytes=cache_size)
+        self._futures: Dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Hashable] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+    async def load(self, key: Hashable) -> Optional[Any]:
+        """Load one value"""
+        hit, value = self.cache.get(str(key))
+        if hit:
+            return value
+
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._futures[key] = future
+            self._queue.append(key)
+
+            if len(self._queue) >= self.max_batch_size:
+                self._dispatch()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.batch_window, self._dispatch)
+
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[Hashable]) -> List[Optional[Any]]:
+        """Load several values, in order"""
+        return list(await asyncio.gather(*[self.load(key) for key in keys]))
+
+    def prime(self, key: Hashable, value: Any):
+        """Seed the cache with a value fetched elsewhere"""
+        self.cache.set(str(key), value, ttl=self.ttl, size=1)
+
+    def clear(self, key: Hashable):
+        """Drop a cached value"""
+        self.cache.delete(str(key))
+
+    def _dispatch(self):
+        """Send the queued keys as one batch"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._queue = self._queue, []
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Hashable]):
+        """Resolve a batch and settle its futures"""
+        try:
+            results = await self.batch_fn(batch)
+        except Exception as e:
+            for key in batch:
+                future = self._futures.pop(key)
+                future.set_exception(e)
+                # Mark retrieved in case every waiter was cancelled
+                future.exception()
+            return
+        except BaseException:
+            # Cancelled, say at shutdown: waiters are cancelled too rather than left hanging
+            for key in batch:
+                self._futures.pop(key).cancel()
+            raise
+
+        for key in batch:
+            value = results.get(key)
+            if value is not None:
+                self.prime(key, value)
+            self._futures.pop(key).set_result(value)
@@ -0,0 +1,604 @@
+"""
+Named AniList GraphQL operations, parsed once and reused by reference
+"""
+
+import re
+from dataclasses import dataclass, field
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from gql import GraphQLRequest
+from graphql import (
+    DocumentNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLSchema,
+    OperationDefinitionNode,
+    parse,
+    print_ast,
+    validate,
+)
+
+FRAGMENT_SPREAD = re.compile(r"\.\.\.\s*([_A-Za-z][_0-9A-Za-z]*)")
+
+
+class PreparedRequest(GraphQLRequest):
+    """GraphQL request that reuses the operation's pre-printed query string"""
+
+    def __init__(self, operation: "Operation", variables: Optional[Dict[str, Any]] = None):
+        super().__init__(
+            operation.document,
+            variable_values=variables,
+            operation_name=operation.name,
+        )
+        self._query = operation.query
+
+    @property
+    def payload(self) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"query": self._query}
+
+        if self.operation_name:
+            payload["operationName"] = self.operation_name
+
+        if self.variable_values:
+            payload["variables"] = self.variable_values
+
+        return payload
+
+
+@dataclass(frozen=True)
+class Operation:
+    """A parsed GraphQL operation"""
+
+    name: Optional[str]
+    document: DocumentNode = field(repr=False, compare=False)
+    query: str = field(repr=False)
+
+    def request(self, variables: Optional[Dict[str, Any]] = None) -> PreparedRequest:
+        """Build a request for this operation"""
+        return PreparedRequest(self, variables)
+
+
+class OperationRegistry:
+    """Registry of parsed GraphQL operations and the fragments they share"""
+
+    def __init__(self):
+        self._operations: Dict[str, Operation] = {}
+        self._by_source: Dict[str, Operation] = {}
+        self._fragments: Dict[str, str] = {}
+        self._schema: Optional[GraphQLSchema] = None
+
+    def fragment(self, source: str) -> str:
+        """Register a named fragment that operations can spread"""
+        for definition in parse(source).definitions:
+            if isinstance(definition, FragmentDefinitionNode):
+                self._fragments[definition.name.value] = source
+        return source
+
+    def register(self, source: str) -> Operation:
+        """Parse an operation once and register it under its name
+
+        Fragments spread by the operation are appended from the registered
+        fragments, including fragments spread by those fragments.
+        """
+        cached = self._by_source.get(source)
+        if cached:
+            return cached
+
+        document = parse(self._with_fragments(source))
+        names = [
+            d.name.value
+            for d in document.definitions
+            if isinstance(d, OperationDefinitionNode) and d.name is not None
+        ]
+        name = names[0] if len(names) == 1 else None
+        operation = Operation(name=name, document=document, query=print_ast(document))
+
+        if self._schema is not None:
+            self._validate(operation, self._schema)
+
+        if name:
+            self._operations[name] = operation
+        self._by_source[source] = operation
+        return operation
+
+    def get(self, name: str) -> Operation:
+        """Get a registered operation by name"""
+        return self._operations[name]
+
+    def resolve(self, operation: Union[Operation, str]) -> Operation:
+        """Resolve an operation, name or raw query string to an Operation"""
+        if isinstance(operation, Operation):
+            return operation
+        if operation in self._operations:
+            return self._operations[operation]
+        return self.register(operation)
+
+    def validate(self, schema: GraphQLSchema):
+        """Validate every registered operation against the schema once"""
+        for operation in self._by_source.values():
+            self._validate(operation, schema)
+        self._schema = schema
+
+    def names(self) -> List[str]:
+        """List registered operation names"""
+        return list(self._operations)
+
+    def fields(self, fragment: str) -> Tuple[str, ...]:
+        """Top-level response keys a registered fragment selects, spreads included"""
+        keys: List[str] = []
+        for definition in parse(self._fragments[fragment]).definitions:
+            if isinstance(definition, FragmentDefinitionNode) and definition.name.value == fragment:
+                for selection in definition.selection_set.selections:
+                    if isinstance(selection, FragmentSpreadNode):
+                        names = self.fields(selection.name.value)
+                    else:
+                        names = ((selection.alias or selection.name).value,)
+                    keys.extend(name for name in names if name not in keys)
+        return tuple(keys)
+
+    def _with_fragments(self, source: str) -> str:
+        """Append the definitions of every registered fragment the source uses"""
+        needed: List[str] = []
+        pending = FRAGMENT_SPREAD.findall(source)
+        while pending:
+            name = pending.pop()
+            if name == "on" or name in needed or f"fragment {name} " in source:
+                continue
+            if name not in self._fragments:
+                continue
+            needed.append(name)
+            pending.extend(FRAGMENT_SPREAD.findall(self._fragments[name]))
+
+        return source + "".join(self._fragments[name] for name in sorted(needed))
+
+    @staticmethod
+    def _validate(operation: Operation, schema: GraphQLSchema):
+        errors = validate(schema, operation.document)
+        if errors:
+            raise ValueError(f"Invalid GraphQL operation {operation.name}: {errors[0].message}")
+
+
+operations = OperationRegistry()
+
+
+class Projection(str, Enum):
+    """Media selection sets, from cheapest to most complete"""
+
+    ID = "MediaId"
+    CARD = "MediaCard"
+    DETAIL = "MediaDetail"
+
+
+operations.fragment(
+    """
+fragment MediaId on Media {
+    id
+}
+"""
+)
+
+operations.fragment(
+    """
+fragment MediaCard on Media {
+    id
+    title {
+        romaji
+        english
+        native
+    }
+    coverImage {
+        large
+        medium
+    }
+    genres
+    episodes
+    status
+    format
+    season
+    seasonYear
+    averageScore
+    popularity
+    updatedAt
+}
+"""
+)
+
+operations.fragment(
+    """
+fragment MediaDetail on Media {
+    ...MediaCard
+    description(asHtml: false)
+    bannerImage
+    tags {
+        name
+        rank
+    }
+    studios {
+        nodes {
+            name
+        }
+    }
+    duration
+    trending
+    source
+    startDate {
+        year
+        month
+        day
+    }
+    nextAiringEpisode {
+        episode
+        timeUntilAiring
+        airingAt
+    }
+    trailer {
+        id
+        site
+    }
+}
+"""
+)
+
+operations.fragment(
+    """
+fragment MediaCatalog on Media {
+    ...MediaCard
+    synonyms
+    description(asHtml: false)
+    bannerImage
+    tags {
+        name
+        rank
+    }
+    studios(isMain: true) {
+        nodes {
+            name
+        }
+    }
+    duration
+    trending
+    source
+    startDate {
+        year
+        month
+        day
+    }
+    trailer {
+        id
+        site
+    }
+}
+"""
+)
+
+operations.fragment(
+    """
+fragment CharacterDetail on Character {
+    id
+    name {
+        full
+        native
+        alternative
+    }
+    image {
+        large
+        medium
+    }
+    description
+    gender
+    dateOfBirth {
+        month
+        day
+    }
+    age
+    favourites
+    media(page: 1, perPage: 10) {
+        nodes {
+            id
+            title {
+                english
+                romaji
+            }
+            type
+            coverImage {
+                large
+            }
+        }
+        edges {
+            characterRole
+            voiceActors(language: JAPANESE) {
+                id
+                name {
+                    full
+                }
+                image {
+                    medium
+                }
+            }
+        }
+    }
+}
+"""
+)
+
+operations.fragment(
+    """
+fragment MediaRecommendations on Media {
+    id
+    recommendations(page: 1, perPage: 10, sort: RATING_DESC) {
+        nodes {
+            id
+            rating
+            userRating
+            mediaRecommendation {
+                id
+                title {
+                    english
+                    romaji
+                }
+                coverImage {
+                    large
+                }
+                averageScore
+            }
+        }
+    }
+}
+"""
+)
+
+
+SEARCH_MEDIA_TEMPLATE = """
+query SearchMedia{suffix}($page: Int, $perPage: Int, $search: String, $sort: [MediaSort],
+       $type: MediaType, $genre_in: [String], $tag_in: [String],
+       $season: MediaSeason, $seasonYear: Int, $status: MediaStatus,
+       $format: MediaFormat, $averageScore_greater: Int) {{
+    Page(page: $page, perPage: $perPage) {{
+        pageInfo {{
+            total
+            currentPage
+            lastPage
+            hasNextPage
+            perPage
+        }}
+        media(search: $search, sort: $sort, type: $type,
+              genre_in: $genre_in, tag_in: $tag_in,
+              season: $season, seasonYear: $seasonYear,
+              status: $status, format: $format,
+              averageScore_greater: $averageScore_greater) {{
+            ...{fragment}
+        }}
+    }}
+}}
+"""
+
+MEDIA_BY_IDS_TEMPLATE = """
+query GetMediaByIds{suffix}($ids: [Int], $perPage: Int) {{
+    Page(page: 1, perPage: $perPage) {{
+        media(id_in: $ids) {{
+            ...{fragment}
+        }}
+    }}
+}}
+"""
+
+
+@lru_cache(maxsize=None)
+def search_media_operation(projection: Projection = Projection.DETAIL) -> Operation:
+    """Get the media search operation selecting the given projection"""
+    return _project(SEARCH_MEDIA_TEMPLATE, projection)
+
+
+@lru_cache(maxsize=None)
+def media_by_ids_operation(projection: Projection = Projection.DETAIL) -> Operation:
+    """Get the batched media lookup operation selecting the given projection"""
+    return _project(MEDIA_BY_IDS_TEMPLATE, projection)
+
+
+@lru_cache(maxsize=None)
+def projection_fields(projection: Projection) -> Tuple[str, ...]:
+    """Top-level Media fields a projection selects, in response order"""
+    return operations.fields(projection.value)
+
+
+def _project(template: str, projection: Projection) -> Operation:
+    # The full-detail variant keeps the plain operation name
+    suffix = "" if projection is Projection.DETAIL else projection.name.title()
+    return operations.register(template.format(suffix=suffix, fragment=projection.value))
+
+
+operations.fragment(
+    """
+fragment ListEntry on MediaList {
+    id
+    updatedAt
+    media {
+        id
+        title {
+            english
+            romaji
+        }
+        coverImage {
+            large
+        }
+        episodes
+        averageScore
+    }
+    score
+    progress
+    status
+    repeat
+    startedAt {
+        year
+        month
+        day
+    }
+    completedAt {
+        year
+        month
+        day
+    }
+}
+"""
+)
+
+
+GET_USER_LIST = operations.register(
+    """
+query GetUserList($userId: Int, $userName: String, $type: MediaType) {
+    MediaListCollection(userId: $userId, userName: $userName, type: $type) {
+        user {
+            id
+            name
+            avatar {
+                large
+            }
+        }
+        lists {
+            name
+            status
+            isCustomList
+            entries {
+                ...ListEntry
+            }
+        }
+    }
+}
+"""
+)
+
+# Media on a user's list and nothing else, to find entries removed since it was cached
+
+GET_USER_LIST_IDS = operations.register(
+    """
+query GetUserListIds($userId: Int, $userName: String, $type: MediaType) {
+    MediaListCollection(userId: $userId, userName: $userName, type: $type) {
+        lists {
+            isCustomList
+            entries {
+                media {
+                    id
+                }
+            }
+        }
+    }
+}
+"""
+)
+
+# Entries of a user's list changed most recently, to refresh a cached collection
+
+GET_USER_LIST_UPDATES = operations.register(
+    """
+query GetUserListUpdates(
+    $userId: Int, $userName: String, $type: MediaType, $page: Int, $perPage: Int
+) {
+    Page(page: $page, perPage: $perPage) {
+        pageInfo {
+            hasNextPage
+        }
+        mediaList(userId: $userId, userName: $userName, type: $type, sort: UPDATED_TIME_DESC) {
+            ...ListEntry
+        }
+    }
+}
+"""
+)
+
+
+GET_AIRING_SCHEDULE = operations.register(
+    """
+query GetAiringSchedule($page: Int, $airingAt_greater: Int, $airingAt_lesser: Int) {
+    Page(page: $page, perPage: 50) {
+        airingSchedules(
+            airingAt_greater: $airingAt_greater
+            airingAt_lesser: $airingAt_lesser
+        ) {
+            id
+            episode
+            airingAt
+            timeUntilAiring
+            media {
+                id
+                title {
+                    english
+                    romaji
+                }
+                coverImage {
+                    large
+                }
+                duration
+            }
+        }
+    }
+}
+"""
+)
+
+
+# Batched lookups used by the data loaders; AniList pages hold at most 50 items
+
+GET_MEDIA_BY_IDS = media_by_ids_operation(Projection.DETAIL)
+
+
+GET_CHARACTERS_BY_IDS = operations.register(
+    """
+query GetCharactersByIds($ids: [Int], $perPage: Int) {
+    Page(page: 1, perPage: $perPage) {
+        characters(id_in: $ids) {
+            ...CharacterDetail
+        }
+    }
+}
+"""
+)
+
+
+GET_RECOMMENDATIONS_BY_IDS = operations.register(
+    """
+query GetRecommendationsByIds($ids: [Int], $perPage: Int) {
+    Page(page: 1, perPage: $perPage) {
+        media(id_in: $ids) {
+            ...MediaRecommendations
+        }
+    }
+}
+"""
+)
+
+
+# Catalog mirror: every anime in ID order, paged by the last ID seen
+
+GET_CATALOG_PAGE = operations.register(
+    """
+query GetCatalogPage($after: Int, $perPage: Int) {
+    Page(page: 1, perPage: $perPage) {
+        pageInfo {
+            hasNextPage
+        }
+        media(type: ANIME, sort: ID, id_greater: $after) {
+            ...MediaCatalog
+        }
+    }
+}
+"""
+)
+
+# Catalog mirror: recently changed anime, newest first, until the last sync's high-water mark
+
+GET_UPDATED_MEDIA = operations.register(
+    """
+query GetUpdatedMedia($page: Int, $perPage: Int) {
+    Page(page: $page, perPage: $perPage) {
+        pageInfo {
+            hasNextPage
+        }
+        media(type: ANIME, sort: UPDATED_AT_DESC) {
+            ...MediaCatalog
+        }
+    }
+}
+"""
+)
@@ -0,0 +1,244 @@
+"""
+Distributed token-bucket rate limiter for AniList requests
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Iterator, List, Mapping, Optional, Tuple
+
+from src.config.settings import settings
+from src.services.cache.redis_client import RedisClient
+from src.utils.exceptions import RateLimitError
+
+
+class Priority(IntEnum):
+    """Request priority classes; lower values are served first"""
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+current_priority: ContextVar[Priority] = ContextVar(
+    "anilist_priority", default=Priority.INTERACTIVE
+)
+
+
+@contextmanager
+def request_priority(priority: Priority) -> Iterator[None]:
+    """Run AniList calls made inside the block at the given priority"""
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+# Take one token; returns 0 when granted, otherwise milliseconds to wait
+TAKE_TOKEN_SCRIPT = """
+local blocked = redis.call("pttl", KEYS[2])
+if blocked > 0 then
+    return blocked
+end
+local t = redis.call("time")
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local state = redis.call("hmget", KEYS[1], "tokens", "ts")
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) / rate)
+end
+redis.call("hset", KEYS[1], "tokens", tostring(tokens), "ts", now)
+redis.call("pexpire", KEYS[1], math.ceil(capacity / rate) * 2)
+return wait
+"""
+
+# Lower the bucket to the upstream's reported remaining requests
+SYNC_REMAINING_SCRIPT = """
+local t = redis.call("time")
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local remaining = tonumber(ARGV[1])
+local tokens = tonumber(redis.call("hget", KEYS[1], "tokens"))
+if tokens == nil or remaining < tokens then
+    redis.call("hset", KEYS[1], "tokens", remaining, "ts", now)
+end
+return remaining
+"""
+
+
+class LocalTokenBucket:
+    """In-process token bucket used when Redis is unavailable"""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    def take(self) -> float:
+        """Take one token; returns 0 when granted, otherwise seconds to wait"""
+        now = time.monotonic()
+        if self.blocked_until > now:
+            return self.blocked_until - now
+
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second
+        )
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.refill_per_second
+
+    def sync_remaining(self, remaining: int):
+        """Lower the bucket to the upstream's reported remaining requests"""
+        self.tokens = min(self.tokens, remaining)
+
+    def block(self, seconds: float):
+        """Refuse tokens for the given number of seconds"""
+        self.tokens = 0
+        self.blocked_until = time.monotonic() + seconds
+
+
+class RateLimiter:
+    """Token bucket shared by every worker through Redis
+
+    Callers queue locally by priority class and then arrival order; a single
+    dispatcher per process takes tokens from the shared bucket and hands them
+    to the head of the queue.
+    """
+
+    def __init__(
+        self,
+        redis: Optional[RedisClient] = None,
+        key: str = "ratelimit:anilist",
+        requests: int = settings.RATE_LIMIT_REQUESTS,
+        window: int = settings.RATE_LIMIT_WINDOW,
+    ):
+        self.redis = redis or RedisClient()
+        self.bucket_key = key
+        self.block_key = f"{key}:blocked"
+        self.capacity = requests
+        self.window = window
+        self.local = LocalTokenBucket(
+            capacity=max(1, requests // max(1, settings.WORKERS)),
+            refill_per_second=requests / window / max(1, settings.WORKERS),
+        )
+        self.remaining: Optional[int] = None
+        # While Redis is unreachable the local bucket is used without trying it
+        self._redis_down = False
+        self._redis_retry_at = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    async def acquire(self, priority: Optional[Priority] = None, timeout: Optional[float] = None):
+        """Wait for a token"""
+        if priority is None:
+            priority = current_priority.get()
+        if timeout is None:
+            timeout = settings.RATE_LIMIT_ACQUIRE_TIMEOUT
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise RateLimitError("Timed out waiting for AniList rate limit") from None
+
+    async def observe(self, status: int, headers: Mapping[str, str]):
+        """Update the bucket from an AniList response"""
+        remaining = headers.get("X-RateLimit-Remaining")
+        if remaining is not None and remaining.isdigit():
+            self.remaining = int(remaining)
+            await self._sync_remaining(self.remaining)
+
+        if status == 429:
+            retry_after = headers.get("Retry-After", "")
+            seconds = int(retry_after) if retry_after.isdigit() else self.window
+            await self.block(seconds)
+
+    async def block(self, seconds: float):
+        """Stop handing out tokens in every worker for the given number of seconds"""
+        self.local.block(seconds)
+        if not self._use_redis():
+            return
+        try:
+            await self.redis.set(self.block_key, "1", ttl=max(1, int(seconds)))
+            self._redis_recovered()
+        except Exception as e:
+            self._redis_failed(e)
+
+    async def _sync_remaining(self, remaining: int):
+        self.local.sync_remaining(remaining)
+        if not self._use_redis():
+            return
+        try:
+            await self.redis.eval(SYNC_REMAINING_SCRIPT, [self.bucket_key], [remaining])
+            self._redis_recovered()
+        except Exception as e:
+            self._redis_failed(e)
+
+    async def _take(self) -> float:
+        """Take a token from the shared bucket; returns seconds to wait"""
+        if not self._use_redis():
+            return self.local.take()
+        try:
+            wait_ms = await self.redis.eval(
+                TAKE_TOKEN_SCRIPT,
+                [self.bucket_key, self.block_key],
+                [self.capacity, self.capacity / (self.window * 1000)],
+            )
+            self._redis_recovered()
+            return int(wait_ms) / 1000
+        except Exception as e:
+            self._redis_failed(e)
+            return self.local.take()
+
+    def _use_redis(self) -> bool:
+        """Whether to try Redis, or keep to the local bucket until the next retry"""
+        return time.monotonic() >= self._redis_retry_at
+
+    def _redis_failed(self, error: Exception):
+        """Use the local bucket until the next retry, logging once per outage"""
+        if not self._redis_down:
+            print(f"Rate limiter error, using local bucket: {error}")
+            self._redis_down = True
+        self._redis_retry_at = time.monotonic() + settings.RATE_LIMIT_REDIS_RETRY_INTERVAL
+
+    def _redis_recovered(self):
+        if self._redis_down:
+            print("Rate limiter Redis reachable again, using shared bucket")
+            self._redis_down = False
+
+    async def _dispatch(self):
+        """Grant tokens to queued callers in priority order"""
+        while self._waiters:
+            if self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+                continue
+
+            wait = await self._take()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            while self._waiters:
+                _, _, future = heapq.heappop(self._waiters)
+                if not future.done():
+                    future.set_result(None)
+                    break
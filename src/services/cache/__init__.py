@@ -2,7 +2,13 @@
 Cache services initialization
 """
 
-from .redis_client import RedisClient
-from .cache_service import CacheService
+from .redis_client import RedisClient, close_redis_pool, get_redis_pool
+from .cache_service import CacheService, get_cache_service
 
-__all__ = ["RedisClient", "CacheService"]
+__all__ = [
+    "RedisClient",
+    "CacheService",
+    "get_redis_pool",
+    "close_redis_pool",
+    "get_cache_service",
+]
@@ -2,61 +2,383 @@
 Cache service with AniList-specific caching strategies
 """
 
-from typing import Optional, Any
+import asyncio
+import fnmatch
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Any, Awaitable, Callable, Dict, List, Tuple, Union
 
+from src.config.settings import settings
+from src.observability.metrics import (
+    CACHE_ERRORS,
+    CACHE_PAYLOAD_BYTES,
+    key_prefix,
+    record_cache_lookup,
+)
+from src.observability.tracing import traced, tracer
+from src.services.cache.codecs import get_serializer
 from src.services.cache.redis_client import RedisClient
+from src.services.cache.single_flight import SingleFlight
+
+# Tags given directly, or computed from the value being cached
+Tags = Union[List[str], Callable[[Any], List[str]]]
+
+
+def tag(*parts: Any) -> str:
+    """Key of the set tracking cache entries for a tag, e.g. tag:media:123"""
+    return "tag:" + ":".join(str(part) for part in parts)
+
+
+class LocalCache:
+    """In-process LRU cache with per-entry TTL, bounded by entries and bytes"""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Get value and whether it was present and fresh"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+
+        expires_at, _, value = entry
+        if expires_at <= time.monotonic():
+            self.delete(key)
+            return False, None
+
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Any, ttl: int, size: int):
+        """Store value, evicting least recently used entries when full"""
+        self.delete(key)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+
+        self._entries[key] = (time.monotonic() + ttl, size, value)
+        self.size_bytes += size
+
+        while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self.size_bytes -= evicted_size
+
+    def delete(self, key: str) -> bool:
+        """Remove a key"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.size_bytes -= entry[1]
+        return True
+
+    def delete_pattern(self, pattern: str) -> int:
+        """Remove every key matching a glob pattern"""
+        keys = [key for key in self._entries if fnmatch.fnmatchcase(key, pattern)]
+        for key in keys:
+            self.delete(key)
+        return len(keys)
+
+    def clear(self):
+        """Remove every key"""
+        self._entries.clear()
+        self.size_bytes = 0
 
 
 class CacheService:
-    """High-level cache service"""
+    """High-level cache service
+
+    Reads go to an in-process L1 cache first and fall back to Redis (L2).
+    Values returned from L1 are shared between callers and must be treated
+    as read-only. Writes and deletes are broadcast over Redis pub/sub so
+    that other workers drop their L1 copies.
+    """
 
-    def __init__(self):
-        self.redis = RedisClient()
+    def __init__(self, redis: Optional[RedisClient] = None):
+        self.redis = redis or RedisClient()
+        self.serializer = get_serializer()
+        self.local = LocalCache(
+            max_entries=settings.CACHE_L1_MAX_ENTRIES,
+            max_bytes=settings.CACHE_L1_MAX_BYTES,
+        )
+        self.stats: Dict[str, int] = {
+            "l1_hits": 0,
+            "l1_misses": 0,
+            "l2_hits": 0,
+            "l2_misses": 0,
+        }
+        self._origin = uuid.uuid4().hex
+        self._listener: Optional[asyncio.Task] = None
+        self._flight = SingleFlight()
 
     async def get(self, key: str) -> Optional[Any]:
         """Get cached value"""
-        try:
-            await self.redis.connect()
-            return await self.redis.get(key)
-        except Exception as e:
-            print(f"Cache get error: {e}")
-            return None
-        finally:
-            await self.redis.disconnect()
+        hit, value = self.local.get(key)
+        if hit:
+            self.stats["l1_hits"] += 1
+            record_cache_lookup(key, "l1", hit=True)
+            return value
+        self.stats["l1_misses"] += 1
+        record_cache_lookup(key, "l1", hit=False)
+
+        # L1 hits are too cheap and frequent to be worth a span
+        with tracer.start_as_current_span(
+            "cache get", attributes={"cache.prefix": key_prefix(key)}
+        ) as span:
+            try:
+                raw = await self.redis.get_raw(key)
+                span.set_attribute("cache.hit", raw is not None)
+                if raw is None:
+                    self.stats["l2_misses"] += 1
+                    record_cache_lookup(key, "l2", hit=False)
+                    return None
+                value, size = self.serializer.decode(raw)
+            except Exception as e:
+                print(f"Cache get error: {e}")
+                CACHE_ERRORS.labels(operation="get").inc()
+                return None
 
-    async def set(self, key: str, value: Any, ttl: int = 3600) -> bool:
+        self.stats["l2_hits"] += 1
+        record_cache_lookup(key, "l2", hit=True)
+        self.local.set(key, value, ttl=settings.CACHE_L1_TTL, size=size)
+        return value
+
+    @traced("cache set")
+    async def set(self, key: str, value: Any, ttl: int = 3600, tags: Optional[Tags] = None) -> bool:
         """Set cached value"""
+        serialized, size = self.serializer.encode(value)
+        CACHE_PAYLOAD_BYTES.labels(prefix=key_prefix(key)).observe(len(serialized))
+        self.local.set(key, value, ttl=min(ttl, settings.CACHE_L1_TTL), size=size)
+        if callable(tags):
+            tags = tags(value)
+
         try:
-            await self.redis.connect()
-            return await self.redis.set(key, value, ttl=ttl)
+            result = await self.redis.set(key, serialized, ttl=ttl, tags=tags)
+            await self._broadcast({"keys": [key]})
+            return result
         except Exception as e:
             print(f"Cache set error: {e}")
+            CACHE_ERRORS.labels(operation="set").inc()
             return False
-        finally:
-            await self.redis.disconnect()
 
+    @traced("cache delete")
     async def delete(self, key: str) -> bool:
         """Delete cached value"""
+        self.local.delete(key)
+
         try:
-            await self.redis.connect()
-            return await self.redis.delete(key)
+            result = await self.redis.delete(key)
+            await self._broadcast({"keys": [key]})
+            return result
         except Exception as e:
             print(f"Cache delete error: {e}")
+            CACHE_ERRORS.labels(operation="delete").inc()
             return False
-        finally:
-            await self.redis.disconnect()
 
-    async def invalidate_pattern(self, pattern: str) -> int:
-        """Invalidate all keys matching pattern"""
+    @traced("cache invalidate_tags")
+    async def invalidate_tags(self, *tags: str) -> int:
+        """Invalidate every entry registered under any of the tags"""
         try:
-            await self.redis.connect()
-            keys = await self.redis.keys(pattern)
-            if keys:
-                for key in keys:
-                    await self.redis.delete(key)
+            members = await self.redis.smembers_many(list(tags))
+            keys = sorted({key for tagged in members for key in tagged})
+            for key in keys:
+                self.local.delete(key)
+            await self.redis.unlink(keys + list(tags))
+            await self._broadcast({"keys": keys})
             return len(keys)
         except Exception as e:
             print(f"Cache invalidation error: {e}")
+            CACHE_ERRORS.labels(operation="invalidate").inc()
+            return 0
+
+    @traced("cache invalidate_pattern")
+    async def invalidate_pattern(self, pattern: str) -> int:
+        """Invalidate all keys matching pattern
+
+        Prefer invalidate_tags; this walks the keyspace with SCAN, which
+        doesn't block Redis but still visits every key.
+        """
+        self.local.delete_pattern(pattern)
+
+        try:
+            deleted = 0
+            async for keys in self.redis.scan_keys(pattern):
+                deleted += await self.redis.unlink(keys)
+            await self._broadcast({"pattern": pattern})
+            return deleted
+        except Exception as e:
+            print(f"Cache invalidation error: {e}")
+            CACHE_ERRORS.labels(operation="invalidate").inc()
             return 0
+
+    async def get_or_fetch(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        ttl: int = 3600,
+        tags: Optional[Tags] = None,
+    ) -> Any:
+        """Get cached value, or fetch and cache it once across all concurrent callers
+
+        Callers in this process share one in-flight fetch. Across workers, a
+        short Redis lock elects one filler while the others wait for the
+        value to appear in Redis.
+        """
+        cached = await self.get(key)
+        if cached is not None:
+            return cached
+
+        return await self._flight.do(key, lambda: self._fill(key, fetch, ttl, tags))
+
+    @traced("cache fill")
+    async def _fill(
+        self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: int, tags: Optional[Tags]
+    ) -> Any:
+        """Fetch and cache a value while holding the fill lock"""
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self.redis.acquire_lock(lock_key, token, settings.CACHE_FILL_LOCK_TTL)
+        except Exception as e:
+            print(f"Cache lock error: {e}")
+            CACHE_ERRORS.labels(operation="lock").inc()
+            acquired = False
+        else:
+            if not acquired:
+                value = await self._wait_for_fill(key, lock_key)
+                if value is not None:
+                    return value
+
+        try:
+            value = await fetch()
+            await self.set(key, value, ttl=ttl, tags=tags)
+            return value
+        finally:
+            if acquired:
+                try:
+                    await self.redis.release_lock(lock_key, token)
+                except Exception as e:
+                    print(f"Cache lock error: {e}")
+                    CACHE_ERRORS.labels(operation="lock").inc()
+
+    @traced("cache refresh")
+    async def refresh(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        ttl: int = 3600,
+        tags: Optional[Tags] = None,
+    ) -> bool:
+        """Re-fetch and cache a value unless another worker is already filling it"""
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        if not await self.redis.acquire_lock(lock_key, token, settings.CACHE_FILL_LOCK_TTL):
+            return False
+
+        try:
+            await self.set(key, await fetch(), ttl=ttl, tags=tags)
+            return True
         finally:
-            await self.redis.disconnect()
+            await self.redis.release_lock(lock_key, token)
+
+    async def _wait_for_fill(self, key: str, lock_key: str) -> Optional[Any]:
+        """Wait for another worker to fill key, until its lock is released"""
+        deadline = time.monotonic() + settings.CACHE_FILL_WAIT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(settings.CACHE_FILL_POLL_INTERVAL)
+            try:
+                raw = await self.redis.get_raw(key)
+                if raw is not None:
+                    value, size = self.serializer.decode(raw)
+                    self.local.set(key, value, ttl=settings.CACHE_L1_TTL, size=size)
+                    return value
+                if not await self.redis.exists(lock_key):
+                    return None
+            except Exception as e:
+                print(f"Cache get error: {e}")
+                CACHE_ERRORS.labels(operation="get").inc()
+                return None
+        return None
+
+    async def publish_invalidation(self, keys: List[str]):
+        """Tell other workers to drop their L1 copies of keys"""
+        try:
+            await self._broadcast({"keys": keys})
+        except Exception as e:
+            print(f"Cache invalidation error: {e}")
+            CACHE_ERRORS.labels(operation="invalidate").inc()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters per tier"""
+        return {
+            **self.stats,
+            "l1_entries": len(self.local),
+            "l1_bytes": self.local.size_bytes,
+        }
+
+    async def start(self):
+        """Start listening for invalidations from other workers"""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        """Stop the invalidation listener"""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _broadcast(self, message: Dict[str, Any]):
+        """Tell other workers to drop their L1 copies"""
+        message["origin"] = self._origin
+        await self.redis.publish(settings.CACHE_INVALIDATION_CHANNEL, json.dumps(message))
+
+    def _apply_invalidation(self, message: Dict[str, Any]):
+        """Apply an invalidation message from another worker"""
+        if message.get("origin") == self._origin:
+            return
+        for key in message.get("keys", []):
+            self.local.delete(key)
+        if message.get("pattern"):
+            self.local.delete_pattern(message["pattern"])
+
+    async def _listen(self):
+        """Consume invalidation messages, resubscribing on connection loss"""
+        while True:
+            pubsub = None
+            try:
+                pubsub = await self.redis.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._apply_invalidation(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Cache invalidation listener error: {e}")
+                CACHE_ERRORS.labels(operation="listen").inc()
+                # Messages may have been missed while disconnected
+                self.local.clear()
+                await asyncio.sleep(1)
+            finally:
+                if pubsub is not None:
+                    await pubsub.aclose()
+
+
+_cache: Optional[CacheService] = None
+
+
+def get_cache_service() -> CacheService:
+    """Get the process-wide cache service"""
+    global _cache
+    if _cache is None:
+        _cache = CacheService()
+    return _cache
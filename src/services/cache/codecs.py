@@ -0,0 +1,219 @@
+"""
+Pluggable serialization for cached values
+"""
+
+import zlib
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Set, Tuple
+
+import msgpack
+import orjson
+
+from src.config.settings import settings
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+# First byte of every encoded value. Bump it when the frame layout changes;
+# values that don't start with a known version are read as legacy JSON text.
+FORMAT_VERSION = 1
+
+
+class Codec(ABC):
+    """Converts values to and from bytes"""
+
+    id: int = 0
+    name: str = ""
+
+    @abstractmethod
+    def dumps(self, value: Any) -> bytes:
+        """Encode a value"""
+
+    @abstractmethod
+    def loads(self, data: bytes) -> Any:
+        """Decode a value"""
+
+
+class JsonCodec(Codec):
+    """JSON via orjson"""
+
+    id = 1
+    name = "json"
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackCodec(Codec):
+    """MessagePack; smaller than JSON and faster to decode"""
+
+    id = 2
+    name = "msgpack"
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+class Compressor:
+    """Compresses encoded values"""
+
+    id: int = 0
+    name: str = "none"
+
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def decompress(self, data: bytes) -> bytes:
+        return data
+
+
+class ZlibCompressor(Compressor):
+    """zlib; always available"""
+
+    id = 1
+    name = "zlib"
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class ZstdCompressor(Compressor):
+    """Zstandard; best ratio for its speed, needs the zstandard package"""
+
+    id = 2
+    name = "zstd"
+
+    def __init__(self, level: int = 3):
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decompressor.decompress(data)
+
+
+class Lz4Compressor(Compressor):
+    """LZ4; fastest to decompress, needs the lz4 package"""
+
+    id = 3
+    name = "lz4"
+
+    def compress(self, data: bytes) -> bytes:
+        return lz4_frame.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return lz4_frame.decompress(data)
+
+
+CODECS: Dict[int, Codec] = {codec.id: codec for codec in (JsonCodec(), MsgpackCodec())}
+
+COMPRESSORS: Dict[int, Compressor] = {
+    Compressor.id: Compressor(),
+    ZlibCompressor.id: ZlibCompressor(),
+}
+if zstandard is not None:
+    COMPRESSORS[ZstdCompressor.id] = ZstdCompressor()
+if lz4_frame is not None:
+    COMPRESSORS[Lz4Compressor.id] = Lz4Compressor()
+
+
+# Unavailable compressions already reported, so each is logged once per process
+_missing_compressions: Set[str] = set()
+
+
+def _by_name(registry: Dict[int, Any], name: str) -> Optional[Any]:
+    """Find a registered codec or compressor by name"""
+    return next((item for item in registry.values() if item.name == name), None)
+
+
+class Serializer:
+    """Encodes values as a small header followed by the codec payload
+
+    The header records the format version, codec and compression, so
+    values written under any configuration can always be read back and
+    settings can change without flushing Redis. Payloads smaller than the
+    threshold are stored uncompressed.
+    """
+
+    def __init__(self, codec: str = "json", compression: str = "none", threshold: int = 1024):
+        self.codec = _by_name(CODECS, codec)
+        if self.codec is None:
+            raise ValueError(f"Unknown cache codec: {codec}")
+
+        self.compressor = _by_name(COMPRESSORS, compression)
+        if self.compressor is None:
+            if compression not in _missing_compressions:
+                print(f"Cache compression {compression} unavailable, using zlib")
+                _missing_compressions.add(compression)
+            self.compressor = COMPRESSORS[ZlibCompressor.id]
+        self.threshold = threshold
+
+    def encode(self, value: Any) -> Tuple[bytes, int]:
+        """Encode a value, returning the bytes and the uncompressed size"""
+        payload = self.codec.dumps(value)
+        compressor = COMPRESSORS[Compressor.id]
+        if len(payload) >= self.threshold:
+            compressor = self.compressor
+
+        header = bytes((FORMAT_VERSION, self.codec.id, compressor.id))
+        return header + compressor.compress(payload), len(payload)
+
+    def decode(self, data: bytes) -> Tuple[Any, int]:
+        """Decode a value, returning it and its uncompressed size"""
+        if data[:1] != bytes((FORMAT_VERSION,)) or len(data) < 3:
+            return self._decode_legacy(data), len(data)
+
+        codec = CODECS[data[1]]
+        payload = COMPRESSORS[data[2]].decompress(data[3:])
+        return codec.loads(payload), len(payload)
+
+    def dumps(self, value: Any) -> bytes:
+        """Encode a value"""
+        return self.encode(value)[0]
+
+    def loads(self, data: bytes) -> Any:
+        """Decode a value"""
+        return self.decode(data)[0]
+
+    def _decode_legacy(self, data: bytes) -> Any:
+        """Decode a value written as plain JSON text before framing existed"""
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return data.decode("utf-8", errors="replace")
+
+
+_serializer: Optional[Serializer] = None
+
+
+def get_serializer() -> Serializer:
+    """Get the process-wide serializer configured in settings"""
+    global _serializer
+    if _serializer is None:
+        _serializer = Serializer(
+            codec=settings.CACHE_CODEC,
+            compression=settings.CACHE_COMPRESSION,
+            threshold=settings.CACHE_COMPRESSION_THRESHOLD,
+        )
+    return _serializer
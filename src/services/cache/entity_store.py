@@ -0,0 +1,210 @@
+"""
+Normalized cache of AniList entities stored once by ID
+"""
+
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from src.config.settings import settings
+from src.observability.metrics import CACHE_ERRORS, CACHE_PAYLOAD_BYTES, CACHE_REQUESTS
+from src.services.cache.cache_service import CacheService, get_cache_service, tag
+
+Fallback = Callable[[List[int]], Awaitable[List[Optional[Dict[str, Any]]]]]
+
+
+def entity_key(kind: str, entity_id: Any) -> str:
+    """Redis key holding one entity"""
+    return f"entity:{kind}:{entity_id}"
+
+
+def page_tags(page: Dict[str, Any]) -> List[str]:
+    """Tags for a cached page reference, one per entity it lists"""
+    return [tag(page["kind"], entity_id) for entity_id in page.get("ids", [])]
+
+
+def has_fields(entity: Dict[str, Any], fields: Sequence[str]) -> bool:
+    """Whether an entity holds every one of fields"""
+    return all(field in entity for field in fields)
+
+
+def project(entity: Dict[str, Any], fields: Sequence[str]) -> Dict[str, Any]:
+    """An entity with only the given fields, in their order"""
+    return {field: entity.get(field) for field in fields}
+
+
+class EntityStore:
+    """Entities stored once by ID as Redis hashes, one field per top-level attribute
+
+    Query results cache only the ordered IDs and page info, so the same
+    anime is held once no matter how many searches return it, and writing
+    an entity updates every result that lists it. Hashes (and their L1
+    copies) merge fields, so a card-sized write never drops detail fields
+    stored earlier. A hash that expired and was re-created by a card write
+    holds card fields only, so readers name the fields they need.
+    """
+
+    def __init__(self, cache: Optional[CacheService] = None, ttl: int = settings.CACHE_TTL_ENTITY):
+        self.cache = cache or get_cache_service()
+        self.ttl = ttl
+
+    async def put_many(self, kind: str, entities: Iterable[Dict[str, Any]]) -> List[Any]:
+        """Store entities and return their IDs in order"""
+        ids = []
+        items = {}
+        for entity in entities:
+            ids.append(entity["id"])
+            key = entity_key(kind, entity["id"])
+            items[key] = {
+                field: self.cache.serializer.dumps(value) for field, value in entity.items()
+            }
+            CACHE_PAYLOAD_BYTES.labels(prefix="entity").observe(
+                sum(len(value) for value in items[key].values())
+            )
+            # Merge into the L1 copy as Redis merges into the hash, keeping fields
+            # of a larger projection cached earlier
+            hit, cached = self.cache.local.get(key)
+            merged = {**cached, **entity} if hit else entity
+            kept = {field: value for field, value in merged.items() if field not in items[key]}
+            self.cache.local.set(
+                key,
+                merged,
+                ttl=settings.CACHE_L1_TTL,
+                size=sum(len(value) for value in items[key].values())
+                + sum(len(self.cache.serializer.dumps(value)) for value in kept.values()),
+            )
+
+        if items:
+            try:
+                await self.cache.redis.hset_many(items, ttl=self.ttl)
+                await self.cache.publish_invalidation(list(items))
+            except Exception as e:
+                print(f"Entity store set error: {e}")
+                CACHE_ERRORS.labels(operation="entity_set").inc()
+        return ids
+
+    async def put_page(
+        self, kind: str, entities: List[Dict[str, Any]], page_info: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Store a page of entities and return a reference to cache in their place"""
+        return {"kind": kind, "ids": await self.put_many(kind, entities), "page_info": page_info}
+
+    async def get_many(
+        self,
+        kind: str,
+        ids: List[Any],
+        fallback: Optional[Fallback] = None,
+        fields: Sequence[str] = (),
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Get entities in order, loading any that have expired through fallback
+
+        With fields, entities are returned with exactly those fields, and
+        one stored without all of them (say a card written after its
+        detail fields expired) is treated as expired too.
+        """
+        results: Dict[Any, Optional[Dict[str, Any]]] = {}
+        missing = []
+        for entity_id in ids:
+            hit, value = self.cache.local.get(entity_key(kind, entity_id))
+            if hit and has_fields(value, fields):
+                results[entity_id] = value
+            else:
+                missing.append(entity_id)
+        CACHE_REQUESTS.labels(prefix="entity", tier="l1", result="hit").inc(len(results))
+        CACHE_REQUESTS.labels(prefix="entity", tier="l1", result="miss").inc(len(missing))
+
+        if missing:
+            try:
+                hashes = await self.cache.redis.hgetall_many(
+                    [entity_key(kind, entity_id) for entity_id in missing]
+                )
+            except Exception as e:
+                print(f"Entity store get error: {e}")
+                CACHE_ERRORS.labels(operation="entity_get").inc()
+                hashes = [{} for _ in missing]
+
+            expired = []
+            for entity_id, stored in zip(missing, hashes):
+                if not stored:
+                    expired.append(entity_id)
+                    continue
+                entity = {
+                    field: self.cache.serializer.loads(value) for field, value in stored.items()
+                }
+                self.cache.local.set(
+                    entity_key(kind, entity_id),
+                    entity,
+                    ttl=settings.CACHE_L1_TTL,
+                    size=sum(len(value) for value in stored.values()),
+                )
+                if has_fields(entity, fields):
+                    results[entity_id] = entity
+                else:
+                    expired.append(entity_id)
+
+            CACHE_REQUESTS.labels(prefix="entity", tier="l2", result="hit").inc(
+                len(missing) - len(expired)
+            )
+            CACHE_REQUESTS.labels(prefix="entity", tier="l2", result="miss").inc(len(expired))
+
+            if expired and fallback is not None:
+                loaded = [entity for entity in await fallback(expired) if entity]
+                await self.put_many(kind, loaded)
+                results.update({entity["id"]: entity for entity in loaded})
+
+        if fields:
+            return [
+                None if results.get(entity_id) is None else project(results[entity_id], fields)
+                for entity_id in ids
+            ]
+        return [results.get(entity_id) for entity_id in ids]
+
+    async def hydrate_page(
+        self, page: Dict[str, Any], fallback: Optional[Fallback] = None, fields: Sequence[str] = ()
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Resolve a cached page reference into its entities and page info"""
+        if "ids" not in page:
+            # Pages cached before normalization hold their entities inline
+            return page.get("results", []), page.get("page_info", {})
+
+        entities = await self.get_many(page["kind"], page["ids"], fallback=fallback, fields=fields)
+        return [entity for entity in entities if entity is not None], page["page_info"]
+
+    async def iter_page(
+        self,
+        page: Dict[str, Any],
+        chunk_size: int,
+        fallback: Optional[Fallback] = None,
+        fields: Sequence[str] = (),
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Resolve a cached page reference chunk_size entities at a time"""
+        if "ids" not in page:
+            yield page.get("results", [])
+            return
+
+        ids = page["ids"]
+        for start in range(0, len(ids), chunk_size):
+            entities = await self.get_many(
+                page["kind"], ids[start : start + chunk_size], fallback=fallback, fields=fields
+            )
+            yield [entity for entity in entities if entity is not None]
+
+
+_store: Optional[EntityStore] = None
+
+
+def get_entity_store() -> EntityStore:
+    """Get the process-wide entity store"""
+    global _store
+    if _store is None:
+        _store = EntityStore()
+    return _store
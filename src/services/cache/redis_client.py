@@ -2,51 +2,116 @@
 Redis cache client
 """
 
-import json
 import redis.asyncio as redis
-from typing import Optional, Any, List
+from typing import Optional, Any, AsyncIterator, Dict, List
 
 from src.config.settings import settings
+from src.services.cache.codecs import Serializer, get_serializer
+
+
+# Delete the lock only if it still holds our token
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+_pool: Optional[redis.ConnectionPool] = None
+
+
+def get_redis_pool() -> redis.ConnectionPool:
+    """Get the process-wide Redis connection pool"""
+    global _pool
+    if _pool is None:
+        _pool = redis.BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        )
+    return _pool
+
+
+async def close_redis_pool():
+    """Close every connection in the process-wide pool"""
+    global _pool
+    if _pool is not None:
+        await _pool.disconnect()
+        _pool = None
+
+
+def _text(values: List[bytes]) -> List[str]:
+    """Decode key names returned by Redis"""
+    return [value.decode() for value in values]
 
 
 class RedisClient:
-    """Async Redis client wrapper"""
+    """Async Redis client wrapper
 
-    def __init__(self):
+    Connections return raw bytes; values pass through the serializer and
+    key names are decoded to str.
+    """
+
+    def __init__(
+        self,
+        pool: Optional[redis.ConnectionPool] = None,
+        serializer: Optional[Serializer] = None,
+    ):
         self.redis_url = settings.REDIS_URL
+        self.pool = pool
+        self.serializer = serializer or get_serializer()
         self.client: Optional[redis.Redis] = None
 
     async def connect(self):
         """Connect to Redis"""
         if not self.client:
-            self.client = redis.from_url(self.redis_url, decode_responses=True)
+            self.client = redis.Redis(connection_pool=self.pool or get_redis_pool())
 
     async def disconnect(self):
-        """Disconnect from Redis"""
+        """Release the client; the shared pool stays open"""
         if self.client:
-            await self.client.close()
+            await self.client.aclose()
             self.client = None
 
     async def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
+        value = await self.get_raw(key)
+        if value:
+            return self.serializer.loads(value)
+        return None
+
+    async def get_raw(self, key: str) -> Optional[bytes]:
+        """Get the encoded value from cache"""
         if not self.client:
             await self.connect()
 
-        value = await self.client.get(key)
-        if value:
-            try:
-                return json.loads(value)
-            except json.JSONDecodeError:
-                return value
-        return None
+        return await self.client.get(key)
+
+    async def set(
+        self, key: str, value: Any, ttl: int = 3600, tags: Optional[List[str]] = None
+    ) -> bool:
+        """Set value in cache with TTL, registering it under each tag
 
-    async def set(self, key: str, value: Any, ttl: int = 3600) -> bool:
-        """Set value in cache with TTL"""
+        Bytes are stored as-is and anything else is encoded first.
+        """
         if not self.client:
             await self.connect()
 
-        serialized = json.dumps(value) if not isinstance(value, str) else value
-        return await self.client.setex(key, ttl, serialized)
+        serialized = value if isinstance(value, bytes) else self.serializer.dumps(value)
+        if not tags:
+            return await self.client.setex(key, ttl, serialized)
+
+        pipe = self.client.pipeline(transaction=False)
+        pipe.setex(key, ttl, serialized)
+        for tag in tags:
+            pipe.sadd(tag, key)
+            # Tag sets live as long as their longest-lived member
+            pipe.expire(tag, ttl, nx=True)
+            pipe.expire(tag, ttl, gt=True)
+        results = await pipe.execute()
+        return results[0]
 
     async def delete(self, key: str) -> bool:
         """Delete key from cache"""
@@ -96,7 +161,7 @@ class RedisClient:
         if not self.client:
             await self.connect()
 
-        return list(await self.client.smembers(key))
+        return _text(await self.client.smembers(key))
 
     async def zadd(self, key: str, mapping: dict) -> int:
         """Add to sorted set"""
@@ -112,7 +177,7 @@ class RedisClient:
         if not self.client:
             await self.connect()
 
-        return await self.client.zrangebyscore(key, min_score, max_score)
+        return _text(await self.client.zrangebyscore(key, min_score, max_score))
 
     async def zrem(self, key: str, *members) -> int:
         """Remove from sorted set"""
@@ -133,12 +198,108 @@ class RedisClient:
         if not self.client:
             await self.connect()
 
-        return list(await self.client.keys(pattern))
+        return _text(await self.client.keys(pattern))
+
+    async def scan_keys(self, pattern: str, count: int = 1000) -> AsyncIterator[List[str]]:
+        """Yield batches of keys matching pattern without blocking Redis"""
+        if not self.client:
+            await self.connect()
+
+        cursor = 0
+        while True:
+            cursor, keys = await self.client.scan(cursor, match=pattern, count=count)
+            if keys:
+                yield _text(keys)
+            if cursor == 0:
+                return
+
+    async def unlink(self, keys: List[str], batch_size: int = 500) -> int:
+        """Delete keys in pipelined batches, freeing memory in the background"""
+        if not keys:
+            return 0
+        if not self.client:
+            await self.connect()
+
+        pipe = self.client.pipeline(transaction=False)
+        for start in range(0, len(keys), batch_size):
+            pipe.unlink(*keys[start : start + batch_size])
+        return sum(await pipe.execute())
+
+    async def smembers_many(self, keys: List[str]) -> List[List[str]]:
+        """Get the members of several sets in one pipelined round trip"""
+        if not self.client:
+            await self.connect()
+
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.smembers(key)
+        return [_text(members) for members in await pipe.execute()]
 
-    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+    async def mget(self, keys: List[str]) -> List[Optional[Any]]:
         """Get multiple keys"""
         if not self.client:
             await self.connect()
 
         values = await self.client.mget(keys)
-        return [v if v else None for v in values]
+        return [self.serializer.loads(v) if v else None for v in values]
+
+    async def publish(self, channel: str, message: str) -> int:
+        """Publish message to channel"""
+        if not self.client:
+            await self.connect()
+
+        return await self.client.publish(channel, message)
+
+    async def subscribe(self, *channels: str) -> redis.client.PubSub:
+        """Subscribe to channels on a dedicated connection"""
+        if not self.client:
+            await self.connect()
+
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(*channels)
+        return pubsub
+
+    async def hset_many(self, items: Dict[str, Dict[str, bytes]], ttl: int) -> None:
+        """Write several hashes and reset their TTL in one pipelined round trip"""
+        if not self.client:
+            await self.connect()
+
+        pipe = self.client.pipeline(transaction=False)
+        for key, mapping in items.items():
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, ttl)
+        await pipe.execute()
+
+    async def hgetall_many(self, keys: List[str]) -> List[Dict[str, bytes]]:
+        """Read several hashes in one pipelined round trip"""
+        if not self.client:
+            await self.connect()
+
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.hgetall(key)
+        return [
+            {field.decode(): value for field, value in fields.items()}
+            for fields in await pipe.execute()
+        ]
+
+    async def eval(self, script: str, keys: List[str], args: List[Any]) -> Any:
+        """Run a Lua script"""
+        if not self.client:
+            await self.connect()
+
+        return await self.client.eval(script, len(keys), *keys, *args)
+
+    async def acquire_lock(self, key: str, token: str, ttl: int) -> bool:
+        """Acquire a lock that expires after ttl seconds"""
+        if not self.client:
+            await self.connect()
+
+        return bool(await self.client.set(key, token, nx=True, ex=ttl))
+
+    async def release_lock(self, key: str, token: str) -> bool:
+        """Release a lock if it is still held by token"""
+        if not self.client:
+            await self.connect()
+
+        return bool(await self.client.eval(RELEASE_LOCK_SCRIPT, 1, key, token))
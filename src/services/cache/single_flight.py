@@ -0,0 +1,54 @@
+"""
+Request coalescing for identical concurrent calls
+"""
+
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+def make_flight_key(operation: Optional[str], variables: Optional[Dict[str, Any]]) -> str:
+    """Build a normalized key for an operation and its variables"""
+    normalized = {k: v for k, v in (variables or {}).items() if v is not None}
+    return f"{operation}:{json.dumps(normalized, sort_keys=True, separators=(',', ':'))}"
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share its result
+
+    The call runs in its own task. Cancelling one caller only stops that
+    caller waiting; the call is cancelled once nobody is waiting for it.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._waiters: Dict[asyncio.Future, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Call fn, or wait for the in-flight call with the same key"""
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(fn())
+            self._calls[key] = call
+            call.add_done_callback(lambda _: self._finish(key, call))
+
+        self._waiters[call] = self._waiters.get(call, 0) + 1
+        try:
+            return await asyncio.shield(call)
+        finally:
+            self._waiters[call] -= 1
+            if not self._waiters[call]:
+                del self._waiters[call]
+                if not call.done():
+                    call.cancel()
+
+    def _finish(self, key: str, call: asyncio.Future):
+        """Forget a finished call so the next caller starts a new one"""
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.cancelled():
+            # Mark retrieved so a call without waiters doesn't log a warning
+            call.exception()
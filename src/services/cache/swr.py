@@ -0,0 +1,87 @@
+"""
+Stale-while-revalidate caching for tool results
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from src.config.settings import settings
+from src.services.anilist.rate_limiter import Priority, request_priority
+from src.services.cache.cache_service import CacheService, Tags
+
+ENVELOPE_MARKER = "__swr__"
+
+_refreshing: Dict[str, asyncio.Task] = {}
+
+
+def wrap(value: Any, ttl: int) -> Dict[str, Any]:
+    """Wrap a value with its soft expiry"""
+    return {ENVELOPE_MARKER: 1, "value": value, "fresh_until": time.time() + ttl}
+
+
+def unwrap(entry: Any) -> Tuple[Any, bool]:
+    """Get the value and whether it is still fresh"""
+    if isinstance(entry, dict) and entry.get(ENVELOPE_MARKER):
+        return entry["value"], entry["fresh_until"] > time.time()
+    # Entries written before envelopes existed are treated as fresh
+    return entry, True
+
+
+async def cached(
+    cache: CacheService,
+    key: str,
+    fetch: Callable[[], Awaitable[Any]],
+    ttl: int,
+    stale_ttl: Optional[int] = None,
+    tags: Optional[Tags] = None,
+) -> Any:
+    """Get a cached value, serving it stale and refreshing in the background
+
+    Up to ttl seconds the value is fresh. For stale_ttl seconds after that
+    it is still returned immediately while one background refresh replaces
+    it. Only once both have passed do callers wait for AniList.
+    """
+    if stale_ttl is None:
+        stale_ttl = int(ttl * settings.CACHE_STALE_RATIO)
+
+    async def fetch_entry() -> Dict[str, Any]:
+        return wrap(await fetch(), ttl)
+
+    entry_tags = (lambda entry: tags(entry["value"])) if callable(tags) else tags
+    entry = await cache.get_or_fetch(key, fetch_entry, ttl=ttl + stale_ttl, tags=entry_tags)
+    value, fresh = unwrap(entry)
+    if not fresh:
+        schedule_refresh(cache, key, fetch_entry, ttl + stale_ttl, tags=entry_tags)
+    return value
+
+
+def schedule_refresh(
+    cache: CacheService,
+    key: str,
+    fetch: Callable[[], Awaitable[Any]],
+    ttl: int,
+    tags: Optional[Tags] = None,
+):
+    """Start a background refresh unless one is already running for key"""
+    if key in _refreshing:
+        return
+
+    task = asyncio.create_task(_refresh(cache, key, fetch, ttl, tags))
+    _refreshing[key] = task
+    task.add_done_callback(lambda _: _refreshing.pop(key, None))
+
+
+async def _refresh(
+    cache: CacheService,
+    key: str,
+    fetch: Callable[[], Awaitable[Any]],
+    ttl: int,
+    tags: Optional[Tags],
+):
+    """Refresh key at background priority"""
+    try:
+        with request_priority(Priority.BACKGROUND):
+            await cache.refresh(key, fetch, ttl=ttl, tags=tags)
+    except Exception as e:
+        print(f"Cache refresh error for {key}: {e}")
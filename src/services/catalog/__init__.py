@@ -0,0 +1,8 @@
+"""
+Local catalog mirror and search index
+"""
+
+from .index import CatalogIndex
+from .mirror import CatalogMirror, get_catalog
+
+__all__ = ["CatalogIndex", "CatalogMirror", "get_catalog"]
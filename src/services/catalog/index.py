@@ -0,0 +1,312 @@
+"""
+In-memory title index and facet bitsets over the mirrored catalog
+"""
+
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from functools import lru_cache
+from itertools import compress, islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from src.models.records import Media
+
+# Fields of the MediaCard fragment, which is what search results carry
+CARD_FIELDS = (
+    "id",
+    "title",
+    "coverImage",
+    "genres",
+    "episodes",
+    "status",
+    "format",
+    "season",
+    "seasonYear",
+    "averageScore",
+    "popularity",
+    "updatedAt",
+)
+
+# Filters answered with one bitset per value
+FACETS = ("genre", "tag", "season", "year", "format", "status")
+
+PREFIX_MIN_LENGTH = 2
+FUZZY_MIN_LENGTH = 4
+# Longest expected walk down a sort order before sorting the matches instead
+WALK_LIMIT = 2000
+
+WORD = re.compile(r"\w+")
+# Maps bin() digits to 0/1 bytes so a bitset can drive itertools.compress
+BITS_TO_FLAGS = bytes.maketrans(b"01", b"\x00\x01")
+
+
+def start_date(media: Dict[str, Any]) -> int:
+    """Start date as YYYYMMDD, with unknown parts zero"""
+    date = media.get("startDate") or {}
+    return (date.get("year") or 0) * 10000 + (date.get("month") or 0) * 100 + (date.get("day") or 0)
+
+
+def descending(field: Callable[[Dict[str, Any]], Optional[int]]) -> Callable:
+    """Sort key putting high values first and missing ones last, ties by ID"""
+    return lambda media: (not field(media), -(field(media) or 0), media["id"])
+
+
+# Sort orders the index can answer; anything else goes upstream
+SORTS = {
+    "POPULARITY_DESC": descending(lambda media: media.get("popularity")),
+    "SCORE_DESC": descending(lambda media: media.get("averageScore")),
+    "START_DATE_DESC": descending(start_date),
+}
+
+
+def normalize(text: str) -> str:
+    """Casefold and strip accents, so Pokémon matches pokemon"""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+@lru_cache(maxsize=None)
+def facet_key(name: str) -> str:
+    """Genre or tag name as looked up, so Sci-fi finds Sci-Fi"""
+    return normalize(name)
+
+
+def terms(text: str) -> List[str]:
+    """Search terms in text
+
+    Words are split on anything that isn't a letter or digit. Japanese and
+    Chinese aren't written with spaces, so runs of wide characters become
+    overlapping bigrams instead.
+    """
+    found = []
+    for word in WORD.findall(normalize(text)):
+        if len(word) > 2 and unicodedata.east_asian_width(word[0]) in "WF":
+            found.extend(word[i : i + 2] for i in range(len(word) - 1))
+        else:
+            found.append(word)
+    return found
+
+
+def trigrams(term: str) -> List[str]:
+    """Overlapping three-character slices of a term"""
+    return [term[i : i + 3] for i in range(len(term) - 2)]
+
+
+def within_one_edit(a: str, b: str) -> bool:
+    """Whether a becomes b by one insertion, deletion, substitution or swap"""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    start = 0
+    while start < min(len(a), len(b)) and a[start] == b[start]:
+        start += 1
+    a, b = a[start:], b[start:]
+    return (
+        a[1:] == b[1:]
+        or a[1:] == b
+        or a == b[1:]
+        or (len(a) > 1 and len(b) > 1 and a[0] == b[1] and a[1] == b[0] and a[2:] == b[2:])
+    )
+
+
+def set_bits(bits: str) -> Iterator[int]:
+    """Documents in a bitset, from its bin() digits reversed"""
+    position = bits.find("1")
+    while position != -1:
+        yield position
+        position = bits.find("1", position + 1)
+
+
+def bitset(docs: Iterable[int], size: int) -> int:
+    """Bitset with the given document numbers set"""
+    buffer = bytearray((size + 7) // 8)
+    for doc in docs:
+        buffer[doc >> 3] |= 1 << (doc & 7)
+    return int.from_bytes(buffer, "little")
+
+
+class CatalogIndex:
+    """Title search and facet filters over an in-memory copy of the catalog
+
+    Documents are numbered in popularity order. Facet values and score
+    thresholds map to bitsets (Python ints) of the documents that have
+    them; title terms map to sorted document arrays, turned into bitsets
+    when queried. A search ANDs the bitsets together and walks the set
+    bits in the requested sort order, stopping once the page is full.
+    """
+
+    def __init__(self, media: Iterable[Dict[str, Any]] = ()):
+        catalog = sorted(media, key=SORTS["POPULARITY_DESC"])
+        self.size = len(catalog)
+        # Cards are held as records and turned back into MediaCard objects when served
+        self.cards = [
+            Media.from_graphql({field: item.get(field) for field in CARD_FIELDS})
+            for item in catalog
+        ]
+        self.docs = {card.id: doc for doc, card in enumerate(self.cards)}
+        self.everything = (1 << self.size) - 1
+
+        postings: Dict[str, List[int]] = {}
+        facets: Dict[str, Dict[Any, List[int]]] = {facet: {} for facet in FACETS}
+        scores: List[List[int]] = [[] for _ in range(101)]
+        for doc, item in enumerate(catalog):
+            title = item.get("title") or {}
+            names = [title.get("romaji"), title.get("english"), title.get("native")]
+            words = {
+                term
+                for name in names + (item.get("synonyms") or [])
+                if name
+                for term in terms(name)
+            }
+            for term in words:
+                postings.setdefault(term, []).append(doc)
+
+            values = {
+                "genre": [facet_key(genre) for genre in item.get("genres") or []],
+                "tag": [facet_key(tag["name"]) for tag in item.get("tags") or []],
+                "season": [item.get("season")],
+                "year": [item.get("seasonYear")],
+                "format": [item.get("format")],
+                "status": [item.get("status")],
+            }
+            for facet, keys in values.items():
+                for key in keys:
+                    if key is not None:
+                        facets[facet].setdefault(key, []).append(doc)
+            if item.get("averageScore") is not None:
+                scores[min(max(item["averageScore"], 0), 100)].append(doc)
+
+        self.postings = {term: array("I", docs) for term, docs in postings.items()}
+        self.vocabulary = sorted(self.postings)
+        self.facets = {
+            facet: {key: bitset(docs, self.size) for key, docs in values.items()}
+            for facet, values in facets.items()
+        }
+        # score_above[n] holds documents scoring more than n, like averageScore_greater
+        self.score_above = [0] * 101
+        above = 0
+        for score in range(100, 0, -1):
+            above |= bitset(scores[score], self.size)
+            self.score_above[score - 1] = above
+
+        self.trigrams: Dict[str, List[int]] = {}
+        for number, term in enumerate(self.vocabulary):
+            if len(term) >= FUZZY_MIN_LENGTH:
+                for gram in set(trigrams(term)):
+                    self.trigrams.setdefault(gram, []).append(number)
+
+        # Documents in each sort order, and each document's place in it
+        self.orders: Dict[str, Sequence[int]] = {"POPULARITY_DESC": range(self.size)}
+        self.ranks: Dict[str, Sequence[int]] = {}
+        for sort, key in SORTS.items():
+            if sort not in self.orders:
+                order = array("I", sorted(range(self.size), key=lambda doc: key(catalog[doc])))
+                rank = array("I", bytes(4 * self.size))
+                for position, doc in enumerate(order):
+                    rank[doc] = position
+                self.orders[sort] = order
+                self.ranks[sort] = rank
+
+        # Typed prefixes repeat across queries, and a short one can cover many terms
+        self._match = lru_cache(maxsize=4096)(self._match_term)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def card(self, media_id: int) -> Optional[Dict[str, Any]]:
+        """Card of one anime, if it is in the catalog"""
+        doc = self.docs.get(media_id)
+        return None if doc is None else self.cards[doc].to_graphql()
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        genres: Optional[list] = None,
+        tags: Optional[list] = None,
+        season: Optional[str] = None,
+        year: Optional[int] = None,
+        status: Optional[str] = None,
+        format: Optional[str] = None,
+        minimum_score: Optional[int] = None,
+        sort: str = "POPULARITY_DESC",
+        page: int = 1,
+        per_page: int = 10,
+    ) -> Optional[Dict[str, Any]]:
+        """Page of cards matching the filters, or None if the sort isn't indexed"""
+        order = self.orders.get(sort)
+        if order is None:
+            return None
+
+        matches = self.everything
+        for term in terms(query or ""):
+            matches &= self._match(term)
+        for genre in genres or []:
+            matches &= self.facets["genre"].get(facet_key(genre), 0)
+        for tag in tags or []:
+            matches &= self.facets["tag"].get(facet_key(tag), 0)
+        for facet, value in (
+            ("season", season),
+            ("year", year),
+            ("status", status),
+            ("format", format),
+        ):
+            if value:
+                matches &= self.facets[facet].get(value, 0)
+        if minimum_score:
+            matches &= self.score_above[min(max(minimum_score, 0), 100)]
+
+        total = matches.bit_count()
+        start = (page - 1) * per_page
+        stop = start + per_page
+        bits = bin(matches)[:1:-1]
+        if isinstance(order, range):
+            docs = list(islice(set_bits(bits), start, stop))
+        elif stop * self.size <= total * WALK_LIMIT:
+            # Matches are dense enough that the page fills after a short walk;
+            # flags[doc] is 1 for every match, so compress picks them out in order
+            flags = bits.encode().translate(BITS_TO_FLAGS).ljust(self.size, b"\0")
+            docs = list(islice(compress(order, map(flags.__getitem__, order)), start, stop))
+        else:
+            docs = sorted(set_bits(bits), key=self.ranks[sort].__getitem__)[start:stop]
+        return {
+            "results": [self.cards[doc].to_graphql() for doc in docs],
+            "page_info": {
+                "total": total,
+                "currentPage": page,
+                "lastPage": max(1, -(-total // per_page)),
+                "hasNextPage": start + per_page < total,
+                "perPage": per_page,
+            },
+        }
+
+    def _match_term(self, term: str) -> int:
+        """Bitset of documents with a title word starting with term, or close to it"""
+        if len(term) < PREFIX_MIN_LENGTH:
+            words = [term] if term in self.postings else []
+        else:
+            words = []
+            position = bisect_left(self.vocabulary, term)
+            while position < len(self.vocabulary) and self.vocabulary[position].startswith(term):
+                words.append(self.vocabulary[position])
+                position += 1
+        if not words and len(term) >= FUZZY_MIN_LENGTH:
+            words = self._similar(term)
+
+        if len(words) == 1:
+            return bitset(self.postings[words[0]], self.size)
+        return bitset({doc for word in words for doc in self.postings[word]}, self.size)
+
+    def _similar(self, term: str) -> List[str]:
+        """Indexed words one typo away from term"""
+        grams = trigrams(term)
+        shared = Counter(number for gram in set(grams) for number in self.trigrams.get(gram, ()))
+        # One edit changes at most three trigrams
+        needed = max(1, len(grams) - 3)
+        return [
+            self.vocabulary[number]
+            for number, count in shared.items()
+            if count >= needed and within_one_edit(term, self.vocabulary[number])
+        ]
@@ -0,0 +1,397 @@
+"""
+Local mirror of the AniList anime catalog, kept in CachedAnime
+"""
+
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.config.settings import settings
+from src.models.database import CachedAnime, SyncCheckpoint, async_session, engine
+from src.observability.metrics import CATALOG_MEDIA_LOADS, CATALOG_SYNC_ROWS
+from src.observability.tracing import traced, tracer
+from src.services.anilist.client import get_anilist_client
+from src.services.anilist.rate_limiter import Priority, request_priority
+from src.services.cache.cache_service import get_cache_service
+from src.services.catalog.index import CatalogIndex, start_date
+from src.services.recommendations import RecommendationEngine
+
+# Searches whose answer changes faster than the mirror is refreshed
+FRESHNESS_SENSITIVE_SORTS = {"TRENDING_DESC"}
+FRESHNESS_SENSITIVE_STATUSES = {"RELEASING", "NOT_YET_RELEASED"}
+
+SYNC_CHECKPOINT = "catalog"
+SYNC_LOCK = "lock:catalog:sync"
+
+
+def media_row(media: Dict[str, Any]) -> Dict[str, Any]:
+    """CachedAnime columns for a MediaCatalog result"""
+    title = media.get("title") or {}
+    cover = media.get("coverImage") or {}
+    now = datetime.utcnow()
+    return {
+        "anilist_id": media["id"],
+        "title_english": title.get("english"),
+        "title_romaji": title.get("romaji"),
+        "title_native": title.get("native"),
+        "synonyms": json.dumps(media.get("synonyms") or []),
+        "description": media.get("description"),
+        "genres": json.dumps(media.get("genres") or []),
+        "tags": json.dumps(media.get("tags") or []),
+        "studios": json.dumps(
+            [studio["name"] for studio in (media.get("studios") or {}).get("nodes", [])]
+        ),
+        "episodes": media.get("episodes"),
+        "duration": media.get("duration"),
+        "status": media.get("status"),
+        "format": media.get("format"),
+        "source": media.get("source"),
+        "season": media.get("season"),
+        "season_year": media.get("seasonYear"),
+        "start_date": start_date(media) or None,
+        "average_score": media.get("averageScore"),
+        "popularity": media.get("popularity"),
+        "trending": media.get("trending"),
+        "cover_image_url": cover.get("large"),
+        "cover_image_medium_url": cover.get("medium"),
+        "banner_image_url": media.get("bannerImage"),
+        "trailer": json.dumps(media["trailer"]) if media.get("trailer") else None,
+        "anilist_updated_at": media.get("updatedAt"),
+        "cached_at": now,
+        "expires_at": now + timedelta(seconds=settings.CATALOG_MAX_AGE),
+    }
+
+
+def row_media(row: CachedAnime) -> Dict[str, Any]:
+    """MediaCatalog-shaped dict for a CachedAnime row, covering MediaDetail too"""
+    date = row.start_date or 0
+    return {
+        "id": row.anilist_id,
+        "title": {
+            "romaji": row.title_romaji,
+            "english": row.title_english,
+            "native": row.title_native,
+        },
+        "coverImage": {"large": row.cover_image_url, "medium": row.cover_image_medium_url},
+        "genres": json.loads(row.genres or "[]"),
+        "episodes": row.episodes,
+        "status": row.status,
+        "format": row.format,
+        "season": row.season,
+        "seasonYear": row.season_year,
+        "averageScore": row.average_score,
+        "popularity": row.popularity,
+        "updatedAt": row.anilist_updated_at,
+        "synonyms": json.loads(row.synonyms or "[]"),
+        "description": row.description,
+        "bannerImage": row.banner_image_url,
+        "tags": json.loads(row.tags or "[]"),
+        "studios": {"nodes": [{"name": name} for name in json.loads(row.studios or "[]")]},
+        "duration": row.duration,
+        "trending": row.trending,
+        "source": row.source,
+        "startDate": {
+            "year": date // 10000 or None,
+            "month": date // 100 % 100 or None,
+            "day": date % 100 or None,
+        },
+        # Rows only stand in for anime that aren't airing, so there is no next episode
+        "nextAiringEpisode": None,
+        "trailer": json.loads(row.trailer) if row.trailer else None,
+    }
+
+
+def upsert(rows: List[Dict[str, Any]]):
+    """INSERT ... ON CONFLICT DO UPDATE writing rows of CachedAnime columns"""
+    insert = postgresql.insert if engine.dialect.name == "postgresql" else sqlite.insert
+    statement = insert(CachedAnime)
+    return statement.on_conflict_do_update(
+        index_elements=[CachedAnime.anilist_id],
+        set_={column: statement.excluded[column] for column in rows[0] if column != "anilist_id"},
+    )
+
+
+class CatalogMirror:
+    """The anime catalog mirrored into CachedAnime and indexed in memory
+
+    Loading builds both the search index and the recommendation engine.
+    search_anime asks the mirror first. It answers from the index while
+    the last complete sync is younger than CATALOG_MAX_AGE, except for
+    queries that need live data (trending order, airing or upcoming
+    shows), which return None so the caller goes to AniList. Every worker
+    reloads the index from the table each CATALOG_RELOAD_INTERVAL, so one
+    sync reaches them all, and one worker at a time syncs each
+    CATALOG_SYNC_INTERVAL.
+    """
+
+    def __init__(self):
+        self.index = CatalogIndex()
+        self.recommender = RecommendationEngine()
+        self.synced_at: Optional[datetime] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def fresh(self) -> bool:
+        """Whether the index holds a recent enough copy of the catalog"""
+        return (
+            len(self.index) > 0
+            and self.synced_at is not None
+            and datetime.utcnow() - self.synced_at < timedelta(seconds=settings.CATALOG_MAX_AGE)
+        )
+
+    def search(self, **arguments) -> Optional[Dict[str, Any]]:
+        """Answer a search_anime call locally, or None if it should go upstream
+
+        The answer is a page reference like those cached for upstream
+        searches, so both are hydrated through the entity store with the
+        same projection.
+        """
+        if not self.fresh:
+            return None
+        if arguments.get("sort") in FRESHNESS_SENSITIVE_SORTS:
+            return None
+        if arguments.get("status") in FRESHNESS_SENSITIVE_STATUSES:
+            return None
+
+        with tracer.start_as_current_span("catalog search") as span:
+            page = self.index.search(**arguments)
+            span.set_attribute("catalog.hit", page is not None)
+        if page is None:
+            return None
+        return {
+            "kind": "media",
+            "ids": [card["id"] for card in page["results"]],
+            "page_info": page["page_info"],
+        }
+
+    @traced("catalog load media")
+    async def load_media(self, ids: List[int]) -> List[Optional[Dict[str, Any]]]:
+        """Media by ID from CachedAnime, going to AniList only for the rest
+
+        Tool handlers pass this to the entity store as its fallback. Rows
+        are used while the mirror is fresh, except for airing and upcoming
+        anime, whose next episode and dates change too often.
+        """
+        found: Dict[int, Optional[Dict[str, Any]]] = {}
+        if self.fresh:
+            async with async_session() as session:
+                rows = (
+                    (
+                        await session.execute(
+                            select(CachedAnime)
+                            .where(CachedAnime.anilist_id.in_(ids))
+                            .where(CachedAnime.status.not_in(FRESHNESS_SENSITIVE_STATUSES))
+                        )
+                    )
+                    .scalars()
+                    .all()
+                )
+            found = {row.anilist_id: row_media(row) for row in rows}
+
+        missing = [media_id for media_id in ids if media_id not in found]
+        CATALOG_MEDIA_LOADS.labels(source="catalog").inc(len(ids) - len(missing))
+        CATALOG_MEDIA_LOADS.labels(source="upstream").inc(len(missing))
+        if missing:
+            loaded = await get_anilist_client().media_loader.load_many(missing)
+            found.update(zip(missing, loaded))
+        return [found.get(media_id) for media_id in ids]
+
+    @traced("catalog load")
+    async def load(self) -> int:
+        """Rebuild the index from CachedAnime, returning how many anime it holds"""
+        async with async_session() as session:
+            rows = (await session.execute(select(CachedAnime))).scalars().all()
+            checkpoint = await session.get(SyncCheckpoint, SYNC_CHECKPOINT)
+
+        media = [row_media(row) for row in rows]
+        # Indexing the whole catalog takes a moment; keep the loop responsive meanwhile
+        self.index, self.recommender = await asyncio.to_thread(
+            lambda: (CatalogIndex(media), RecommendationEngine(media))
+        )
+        self.synced_at = checkpoint.completed_at if checkpoint else None
+        return len(self.index)
+
+    @traced("catalog sync")
+    async def sync(self, full: bool = False) -> int:
+        """Bring CachedAnime up to date with AniList and reindex
+
+        The first run, or a full one, copies every anime in ID order, and
+        a full sync that was interrupted resumes after the last ID it
+        wrote. Later runs page through anime by most recent update and stop
+        at the high-water mark the last complete run reached, so they cost
+        a couple of requests when little has changed. Rows are written
+        CATALOG_SYNC_BATCH_SIZE at a time with INSERT ... ON CONFLICT DO
+        UPDATE, saving the checkpoint with each batch. Returns how many
+        anime this run wrote.
+        """
+        # Leave rate limit headroom for interactive tool calls
+        with request_priority(Priority.BACKGROUND):
+            async with async_session() as session:
+                checkpoint = await session.get(SyncCheckpoint, SYNC_CHECKPOINT)
+            checkpoint = checkpoint or SyncCheckpoint(name=SYNC_CHECKPOINT)
+
+            resuming = (
+                checkpoint.mode == "full"
+                and checkpoint.cursor is not None
+                and (checkpoint.completed_at or datetime.min) < checkpoint.started_at
+            )
+            if not resuming:
+                checkpoint.mode = (
+                    "full" if full or checkpoint.high_water_mark is None else "incremental"
+                )
+                checkpoint.cursor = None
+                checkpoint.synced = 0
+                checkpoint.started_at = datetime.utcnow()
+                # Anything updated after this is picked up by the next run
+                checkpoint.target_mark = await self._newest_update()
+
+            if checkpoint.mode == "full":
+                pages = self._pages_after(checkpoint.cursor or 0)
+            else:
+                pages = self._pages_since(checkpoint.high_water_mark)
+
+            written = 0
+            batch: List[Dict[str, Any]] = []
+            async for media in pages:
+                batch.extend(media_row(item) for item in media)
+                if len(batch) >= settings.CATALOG_SYNC_BATCH_SIZE:
+                    written += await self._write(batch, checkpoint)
+                    batch = []
+            written += await self._write(batch, checkpoint)
+
+        if checkpoint.target_mark is not None:
+            checkpoint.high_water_mark = checkpoint.target_mark
+        checkpoint.cursor = None
+        checkpoint.completed_at = datetime.utcnow()
+        async with async_session() as session, session.begin():
+            await session.merge(checkpoint)
+
+        await self.load()
+        return written
+
+    async def progress(self) -> Dict[str, Any]:
+        """Where the last or running sync has got to, and what this worker has loaded"""
+        async with async_session() as session:
+            checkpoint = await session.get(SyncCheckpoint, SYNC_CHECKPOINT)
+        sync: Dict[str, Any] = {"running": False}
+        if checkpoint is not None:
+            sync = {
+                "mode": checkpoint.mode,
+                "running": (checkpoint.completed_at or datetime.min) < checkpoint.started_at,
+                "synced": checkpoint.synced,
+                "cursor": checkpoint.cursor,
+                "high_water_mark": checkpoint.high_water_mark,
+                "started_at": checkpoint.started_at.isoformat(),
+                "completed_at": checkpoint.completed_at and checkpoint.completed_at.isoformat(),
+                "updated_at": checkpoint.updated_at and checkpoint.updated_at.isoformat(),
+            }
+        return {"sync": sync, "loaded": len(self.index), "fresh": self.fresh}
+
+    async def _write(self, rows: List[Dict[str, Any]], checkpoint: SyncCheckpoint) -> int:
+        """Upsert a batch of rows and save the checkpoint in the same transaction"""
+        if not rows:
+            return 0
+        if checkpoint.mode == "full":
+            checkpoint.cursor = rows[-1]["anilist_id"]
+        checkpoint.synced = (checkpoint.synced or 0) + len(rows)
+        checkpoint.updated_at = datetime.utcnow()
+        async with async_session() as session, session.begin():
+            await session.execute(upsert(rows), rows)
+            await session.merge(checkpoint)
+        CATALOG_SYNC_ROWS.labels(mode=checkpoint.mode).inc(len(rows))
+        return len(rows)
+
+    async def _newest_update(self) -> Optional[int]:
+        """updatedAt of the most recently changed anime on AniList"""
+        result = await get_anilist_client().get_updated_media({"page": 1, "perPage": 1})
+        media = result.get("Page", {}).get("media", [])
+        return media[0].get("updatedAt") if media else None
+
+    async def _pages_after(self, after: int) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Every anime with an ID above after, a page at a time in ID order"""
+        anilist = get_anilist_client()
+        while True:
+            result = await anilist.get_catalog_page(
+                {"after": after, "perPage": settings.CATALOG_SYNC_PAGE_SIZE}
+            )
+            media = result.get("Page", {}).get("media", [])
+            if media:
+                yield media
+            if not media or not result["Page"].get("pageInfo", {}).get("hasNextPage"):
+                return
+            after = media[-1]["id"]
+
+    async def _pages_since(self, mark: int) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Anime updated at or after mark, a page at a time, most recent first"""
+        anilist = get_anilist_client()
+        page = 1
+        while True:
+            result = await anilist.get_updated_media(
+                {"page": page, "perPage": settings.CATALOG_SYNC_PAGE_SIZE}
+            )
+            media = result.get("Page", {}).get("media", [])
+            # Anime updated in the same second as the mark are rewritten rather than missed
+            newer = [item for item in media if (item.get("updatedAt") or 0) >= mark]
+            if newer:
+                yield newer
+            if len(newer) < len(media) or not result["Page"].get("pageInfo", {}).get("hasNextPage"):
+                return
+            page += 1
+
+    async def start(self):
+        """Load the index and keep reloading it from the table, and syncing it"""
+        if not settings.CATALOG_ENABLED or self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._reload()))
+        if settings.CATALOG_SYNC_INTERVAL:
+            self._tasks.append(asyncio.create_task(self._sync()))
+
+    async def stop(self):
+        """Stop reloading and syncing"""
+        for task in self._tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def _reload(self):
+        """Reload the index now and then every CATALOG_RELOAD_INTERVAL"""
+        while True:
+            try:
+                await self.load()
+            except Exception as e:
+                print(f"Catalog load error: {e}")
+            await asyncio.sleep(settings.CATALOG_RELOAD_INTERVAL)
+
+    async def _sync(self):
+        """Sync every CATALOG_SYNC_INTERVAL in whichever worker takes the lock"""
+        redis = get_cache_service().redis
+        while True:
+            token = uuid.uuid4().hex
+            try:
+                if await redis.acquire_lock(SYNC_LOCK, token, settings.CATALOG_SYNC_LOCK_TTL):
+                    try:
+                        await self.sync()
+                    finally:
+                        await redis.release_lock(SYNC_LOCK, token)
+            except Exception as e:
+                print(f"Catalog sync error: {e}")
+            await asyncio.sleep(settings.CATALOG_SYNC_INTERVAL)
+
+
+_catalog: Optional[CatalogMirror] = None
+
+
+def get_catalog() -> CatalogMirror:
+    """Get the process-wide catalog mirror"""
+    global _catalog
+    if _catalog is None:
+        _catalog = CatalogMirror()
+    return _catalog
@@ -0,0 +1,16 @@
+"""
+Text embeddings of the catalog and similarity search over them
+"""
+
+from .embedder import Embedder, HashingEmbedder, anime_text, get_embedder
+from .store import EmbeddingStore, MemoryIndex, get_embedding_store
+
+__all__ = [
+    "Embedder",
+    "HashingEmbedder",
+    "anime_text",
+    "get_embedder",
+    "EmbeddingStore",
+    "MemoryIndex",
+    "get_embedding_store",
+]
@@ -0,0 +1,120 @@
+"""
+Local, CPU-only text embeddings for anime descriptions and queries
+"""
+
+import re
+import zlib
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.config.settings import settings
+from src.services.catalog.index import normalize
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+WORD = re.compile(r"\w+")
+MARKUP = re.compile(r"<[^>]+>|\(Source:[^)]*\)")
+
+# Words that say nothing about what an anime is like
+STOP_WORDS = frozenset(
+    "a an and anime are as at be but by for from has have he her his in is it its "
+    "like more of on one or show she similar something that the their them they "
+    "this to was what who with".split()
+)
+
+
+def anime_text(media: Dict[str, Any]) -> str:
+    """Text describing an anime: its titles, genres, tags and synopsis"""
+    title = media.get("title") or {}
+    parts = [title.get("romaji"), title.get("english"), *(media.get("synonyms") or [])]
+    parts.extend(media.get("genres") or [])
+    parts.extend(tag["name"] for tag in media.get("tags") or [])
+    parts.append(MARKUP.sub(" ", media.get("description") or ""))
+    return ". ".join(part for part in parts if part)
+
+
+class Embedder(ABC):
+    """Turns text into unit-length vectors"""
+
+    name: str = ""
+    dim: int = 0
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Unit vectors for the texts, one row each"""
+
+
+class HashingEmbedder(Embedder):
+    """Signed feature hashing of words and their character trigrams
+
+    Needs no model download or GPU. Words are hashed to a dimension and
+    a sign, and so are their trigrams at a lower weight, so that darker
+    still lands near dark. CRC32 keeps vectors stable across processes.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts: Dict[str, float] = {}
+            for word in WORD.findall(normalize(text)):
+                if word in STOP_WORDS or len(word) < 2:
+                    continue
+                counts[word] = counts.get(word, 0.0) + 1.0
+                padded = f"<{word}>"
+                for start in range(len(padded) - 2):
+                    gram = padded[start : start + 3]
+                    counts[gram] = counts.get(gram, 0.0) + 0.25
+            for feature, count in counts.items():
+                digest = zlib.crc32(feature.encode())
+                sign = 1.0 if digest & 0x80000000 else -1.0
+                # Repeats matter less than presence, as with sublinear TF
+                vectors[row, digest % self.dim] += sign * (1.0 + np.log(count + 1.0))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """A sentence-transformers model run on the CPU"""
+
+    def __init__(self, model: str):
+        self.name = model
+        self.model = SentenceTransformer(model, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32)
+
+
+_embedder: Optional[Embedder] = None
+
+
+def get_embedder() -> Embedder:
+    """Get the process-wide embedder chosen by EMBEDDING_MODEL"""
+    global _embedder
+    if _embedder is None:
+        if settings.EMBEDDING_MODEL == "hashing":
+            embedder: Embedder = HashingEmbedder(settings.EMBEDDING_DIM)
+        elif SentenceTransformer is None:
+            raise RuntimeError(
+                f"EMBEDDING_MODEL {settings.EMBEDDING_MODEL} needs sentence-transformers installed"
+            )
+        else:
+            embedder = SentenceTransformerEmbedder(settings.EMBEDDING_MODEL)
+        if embedder.dim != settings.EMBEDDING_DIM:
+            raise ValueError(
+                f"EMBEDDING_MODEL {embedder.name} makes {embedder.dim}-dimensional vectors, "
+                f"but EMBEDDING_DIM is {settings.EMBEDDING_DIM}"
+            )
+        _embedder = embedder
+    return _embedder
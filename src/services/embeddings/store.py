@@ -0,0 +1,202 @@
+"""
+Nearest-neighbour search over the catalog's embeddings
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import or_, select, text, update
+
+from src.config.settings import settings
+from src.models.database import CachedAnime, async_session, engine
+from src.observability.tracing import traced
+from src.services.catalog.mirror import row_media
+from src.services.embeddings.embedder import anime_text, get_embedder
+
+Neighbour = Tuple[int, float]
+
+# pgvector rejects larger hnsw.ef_search values
+HNSW_EF_SEARCH_MAX = 1000
+
+
+class MemoryIndex:
+    """Exact cosine search over unit vectors held in a NumPy matrix"""
+
+    def __init__(self, ids: List[int] = (), vectors: Optional[np.ndarray] = None):
+        self.ids = np.array(ids, dtype=np.int64)
+        self.rows = {media_id: row for row, media_id in enumerate(ids)}
+        self.vectors = (
+            vectors if vectors is not None else np.zeros((0, settings.EMBEDDING_DIM), np.float32)
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def vector(self, media_id: int) -> Optional[np.ndarray]:
+        """Embedding of one anime, if it has one"""
+        row = self.rows.get(media_id)
+        return None if row is None else self.vectors[row]
+
+    def nearest(
+        self, query: np.ndarray, count: int, exclude: Iterable[int] = ()
+    ) -> List[Neighbour]:
+        """Anime closest to a unit query vector, with their cosine similarity"""
+        scores = self.vectors @ query
+        excluded = [self.rows[media_id] for media_id in exclude if media_id in self.rows]
+        scores[excluded] = -np.inf
+        count = min(count, len(scores) - len(set(excluded)))
+        if count <= 0:
+            return []
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ids[row]), float(scores[row])) for row in top]
+
+
+class EmbeddingStore:
+    """Embeddings of every anime in CachedAnime, and search over them
+
+    On Postgres the vectors live in the embedding column and searches are
+    approximate nearest-neighbour scans of its HNSW index. Elsewhere (SQLite
+    in development and tests) the column is loaded into a MemoryIndex and
+    searched exactly, reloading every CATALOG_RELOAD_INTERVAL.
+    """
+
+    def __init__(self):
+        self.memory = MemoryIndex()
+        self.loaded_at = float("-inf")
+        self._load_lock = asyncio.Lock()
+
+    @property
+    def approximate(self) -> bool:
+        """Whether searches go to pgvector rather than memory"""
+        return engine.dialect.name == "postgresql"
+
+    async def vector(self, media_id: int) -> Optional[np.ndarray]:
+        """Stored embedding of one anime, if it has been embedded"""
+        if not self.approximate:
+            return (await self._memory()).vector(media_id)
+        async with async_session() as session:
+            vector = (
+                await session.execute(
+                    select(CachedAnime.embedding).where(CachedAnime.anilist_id == media_id)
+                )
+            ).scalar()
+        return None if vector is None else np.asarray(vector, dtype=np.float32)
+
+    @traced("embedding search")
+    async def nearest(
+        self, query: np.ndarray, count: int, exclude: Iterable[int] = ()
+    ) -> List[Neighbour]:
+        """Anime closest to a unit query vector, with their cosine similarity"""
+        exclude = list(exclude)
+        if not self.approximate:
+            return (await self._memory()).nearest(query, count, exclude)
+
+        distance = CachedAnime.embedding.cosine_distance(query).label("distance")
+        statement = (
+            select(CachedAnime.anilist_id, distance)
+            .where(CachedAnime.embedding.is_not(None))
+            .order_by(distance)
+            .limit(count)
+        )
+        if exclude:
+            statement = statement.where(CachedAnime.anilist_id.not_in(exclude))
+        async with async_session() as session, session.begin():
+            # The index returns ef_search candidates before exclusions are dropped
+            ef_search = min(
+                max(settings.EMBEDDING_EF_SEARCH, count + len(exclude)), HNSW_EF_SEARCH_MAX
+            )
+            await session.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+            rows = (await session.execute(statement)).all()
+            if len(rows) < count and count + len(exclude) > ef_search:
+                # Too few candidates survived the exclusions; scan the table exactly instead
+                await session.execute(text("SET LOCAL enable_indexscan = off"))
+                rows = (await session.execute(statement)).all()
+        return [(media_id, 1.0 - float(distance)) for media_id, distance in rows]
+
+    @traced("catalog embed")
+    async def embed_pending(self) -> int:
+        """Embed every anime new or changed since it was last embedded
+
+        Works through the table in primary key order, EMBEDDING_BATCH_SIZE
+        rows at a time, so memory stays flat and an interrupted run picks
+        up where it left off. Returns how many anime were embedded.
+        """
+        embedder = get_embedder()
+        after = 0
+        embedded = 0
+        while True:
+            async with async_session() as session:
+                rows = (
+                    (
+                        await session.execute(
+                            select(CachedAnime)
+                            .where(CachedAnime.anilist_id > after)
+                            .where(
+                                or_(
+                                    CachedAnime.embedded_at.is_(None),
+                                    CachedAnime.embedded_at < CachedAnime.cached_at,
+                                )
+                            )
+                            .order_by(CachedAnime.anilist_id)
+                            .limit(settings.EMBEDDING_BATCH_SIZE)
+                        )
+                    )
+                    .scalars()
+                    .all()
+                )
+            if not rows:
+                break
+
+            texts = [anime_text(row_media(row)) for row in rows]
+            vectors = await asyncio.to_thread(embedder.embed, texts)
+            now = datetime.utcnow()
+            async with async_session() as session, session.begin():
+                await session.execute(
+                    update(CachedAnime),
+                    [
+                        {"anilist_id": row.anilist_id, "embedding": vector, "embedded_at": now}
+                        for row, vector in zip(rows, vectors)
+                    ],
+                )
+            embedded += len(rows)
+            after = rows[-1].anilist_id
+
+        self.loaded_at = float("-inf")
+        return embedded
+
+    async def _memory(self) -> MemoryIndex:
+        """The in-memory index, reloaded from the table when it is old"""
+        if time.monotonic() - self.loaded_at < settings.CATALOG_RELOAD_INTERVAL:
+            return self.memory
+        async with self._load_lock:
+            if time.monotonic() - self.loaded_at >= settings.CATALOG_RELOAD_INTERVAL:
+                async with async_session() as session:
+                    rows = (
+                        await session.execute(
+                            select(CachedAnime.anilist_id, CachedAnime.embedding).where(
+                                CachedAnime.embedding.is_not(None)
+                            )
+                        )
+                    ).all()
+                ids = [media_id for media_id, _ in rows]
+                vectors = np.array([vector for _, vector in rows], dtype=np.float32).reshape(
+                    len(rows), settings.EMBEDDING_DIM
+                )
+                self.memory = MemoryIndex(ids, vectors)
+                self.loaded_at = time.monotonic()
+        return self.memory
+
+
+_store: Optional[EmbeddingStore] = None
+
+
+def get_embedding_store() -> EmbeddingStore:
+    """Get the process-wide embedding store"""
+    global _store
+    if _store is None:
+        _store = EmbeddingStore()
+    return _store
@@ -1,3 +1,7 @@
 """
 Recommendation engine services
 """
+
+from .engine import RecommendationEngine, taste_weights
+
+__all__ = ["RecommendationEngine", "taste_weights"]
@@ -0,0 +1,223 @@
+"""
+Content-based anime recommendations over the mirrored catalog
+"""
+
+import statistics
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# How much each block of features counts towards similarity
+BLOCK_WEIGHTS = {
+    "genre": 1.0,
+    "tag": 1.0,
+    "studio": 0.5,
+    "format": 0.3,
+    "era": 0.3,
+    "score": 0.3,
+}
+
+# Tags and studios on fewer titles than this add columns without linking anything
+MIN_FEATURE_TITLES = 3
+ERA_YEARS = 5
+
+# How much a list entry in each status says about a user's taste
+STATUS_WEIGHTS = {
+    "COMPLETED": 1.0,
+    "REPEATING": 1.0,
+    "CURRENT": 0.8,
+    "PAUSED": 0.3,
+    "PLANNING": 0.3,
+    "DROPPED": -0.5,
+}
+
+# How far a score one standard deviation from the user's average moves a weight
+SCORE_WEIGHT = 0.5
+# Most a title's current trending can raise its score, as a multiple
+TREND_WEIGHT = 1.0
+# Most AniList's community recommendations can add to a title's similarity
+COMMUNITY_WEIGHT = 0.3
+
+Recommendation = Tuple[int, float]
+
+
+def features(media: Dict[str, Any]) -> Dict[Tuple[str, Any], float]:
+    """Weighted features of one anime, keyed by (block, value)"""
+    found: Dict[Tuple[str, Any], float] = {}
+    for genre in media.get("genres") or []:
+        found["genre", genre] = 1.0
+    for tag in media.get("tags") or []:
+        found["tag", tag["name"]] = (tag.get("rank") or 0) / 100
+    for studio in (media.get("studios") or {}).get("nodes", []):
+        found["studio", studio["name"]] = 1.0
+    if media.get("format"):
+        found["format", media["format"]] = 1.0
+    year = media.get("seasonYear") or (media.get("startDate") or {}).get("year")
+    if year:
+        # Neighbouring eras count half, so 1999 and 2001 still look alike
+        era = year // ERA_YEARS
+        found["era", era] = 1.0
+        found["era", era - 1] = found["era", era + 1] = 0.5
+    if media.get("averageScore"):
+        found["score", None] = media["averageScore"] / 100
+    return found
+
+
+def taste_weights(entries: Iterable[Dict[str, Any]]) -> Dict[int, float]:
+    """Weight of each anime in a user's taste, from list entries
+
+    Status sets a base weight, and scores above or below the user's own
+    average add to or take from it, whatever scoring format they use.
+    """
+    entries = [entry for entry in entries if entry.get("media")]
+    scores = [entry["score"] for entry in entries if entry.get("score")]
+    mean = statistics.fmean(scores) if scores else 0.0
+    spread = statistics.pstdev(scores) if len(scores) > 1 else 0.0
+
+    weights = {}
+    for entry in entries:
+        weight = STATUS_WEIGHTS.get(entry.get("status"), 0.0)
+        if entry.get("score") and spread:
+            weight += SCORE_WEIGHT * max(-1.0, min(1.0, (entry["score"] - mean) / spread))
+        weights[entry["media"]["id"]] = weight
+    return weights
+
+
+class RecommendationEngine:
+    """Scores the whole catalog against a title or a user's taste at once
+
+    Every anime is a row of an L2-normalized feature matrix, so its
+    product with a normalized query vector gives the cosine similarity of
+    each candidate, and argpartition picks the top k without sorting the
+    rest. An anime has a dozen or so of the catalog's thousand features,
+    so the matrix is held in CSR form (row offsets, column indices and
+    values) and multiplied with gathers and add.reduceat.
+    """
+
+    def __init__(self, media: Iterable[Dict[str, Any]] = ()):
+        catalog = [(item["id"], features(item), item.get("trending") or 0) for item in media]
+        self.ids = np.array([media_id for media_id, _, _ in catalog], dtype=np.int64)
+        self.rows = {media_id: row for row, (media_id, _, _) in enumerate(catalog)}
+
+        counts: Dict[Tuple[str, Any], int] = {}
+        for _, found, _ in catalog:
+            for key in found:
+                counts[key] = counts.get(key, 0) + 1
+        self.columns = {
+            key: column
+            for column, key in enumerate(
+                key
+                for key, count in counts.items()
+                if key[0] not in ("tag", "studio") or count >= MIN_FEATURE_TITLES
+            )
+        }
+
+        offsets, columns, values = [0], [], []
+        for _, found, _ in catalog:
+            for key, value in found.items():
+                column = self.columns.get(key)
+                if column is not None:
+                    columns.append(column)
+                    values.append(value * BLOCK_WEIGHTS[key[0]])
+            offsets.append(len(columns))
+
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.indices = np.array(columns, dtype=np.int32)
+        self.values = np.array(values, dtype=np.float32)
+        # reduceat gives an empty row the next row's first value; these are zeroed
+        self.empty = self.offsets[:-1] == self.offsets[1:]
+        norms = np.sqrt(self._row_sums(self.values**2))
+        self.values /= np.repeat(np.where(norms > 0, norms, 1), np.diff(self.offsets))
+
+        trending = np.array([value for _, _, value in catalog], dtype=np.float32)
+        # Dampened so a few viral shows don't drown out everything else
+        self.trend = np.log1p(trending) / max(float(np.log1p(trending).max(initial=0)), 1.0)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, media_id: int) -> bool:
+        return media_id in self.rows
+
+    def similar(
+        self,
+        media_id: int,
+        count: int,
+        exclude: Iterable[int] = (),
+        ratings: Optional[Dict[int, int]] = None,
+    ) -> List[Recommendation]:
+        """Anime most like one title, raised by any community recommendation ratings"""
+        scores = self._scores(self._profile({media_id: 1.0}))
+        if ratings:
+            scores += self._community(ratings)
+        return self._top(scores, count, [media_id, *exclude])
+
+    def trending_like(
+        self, media_id: int, count: int, exclude: Iterable[int] = ()
+    ) -> List[Recommendation]:
+        """Anime like one title, favouring what is trending now"""
+        scores = self._scores(self._profile({media_id: 1.0})) * (1 + TREND_WEIGHT * self.trend)
+        return self._top(scores, count, [media_id, *exclude])
+
+    def for_taste(
+        self, weights: Dict[int, float], count: int, exclude: Iterable[int] = ()
+    ) -> List[Recommendation]:
+        """Anime closest to a taste profile, leaving out everything in it"""
+        return self._top(self._scores(self._profile(weights)), count, [*weights, *exclude])
+
+    def _community(self, ratings: Dict[int, int]) -> np.ndarray:
+        """Boost for titles the community recommends, relative to the best rated"""
+        boost = np.zeros(len(self.ids), dtype=np.float32)
+        top = max(ratings.values(), default=0)
+        if top <= 0:
+            return boost
+        for media_id, rating in ratings.items():
+            row = self.rows.get(media_id)
+            if row is not None and rating > 0:
+                boost[row] = COMMUNITY_WEIGHT * rating / top
+        return boost
+
+    def _profile(self, weights: Dict[int, float]) -> np.ndarray:
+        """Weighted sum of the feature rows of some anime, as a dense vector"""
+        known = [media_id for media_id in weights if media_id in self.rows]
+        rows = np.array([self.rows[media_id] for media_id in known], dtype=np.int64)
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows + 1] - starts
+        # Positions of every stored value in those rows, row after row
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(
+            lengths.sum()
+        )
+        row_weights = np.array([weights[media_id] for media_id in known], dtype=np.float32)
+        return np.bincount(
+            self.indices[positions],
+            weights=self.values[positions] * np.repeat(row_weights, lengths),
+            minlength=len(self.columns),
+        ).astype(np.float32)
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every anime to a query vector"""
+        norm = np.linalg.norm(query)
+        if not norm:
+            return np.zeros(len(self.ids), dtype=np.float32)
+        return self._row_sums(self.values * (query / norm)[self.indices])
+
+    def _row_sums(self, products: np.ndarray) -> np.ndarray:
+        """Sum of each row's entries of a per-value array"""
+        if not len(self.ids):
+            return np.zeros(0, dtype=np.float32)
+        # The trailing zero keeps reduceat in bounds when the last rows are empty
+        sums = np.add.reduceat(np.append(products, np.float32(0)), self.offsets[:-1])
+        sums[self.empty] = 0
+        return sums
+
+    def _top(self, scores: np.ndarray, count: int, exclude: Iterable[int]) -> List[Recommendation]:
+        """Highest scoring anime, best first"""
+        excluded = [self.rows[media_id] for media_id in exclude if media_id in self.rows]
+        scores[excluded] = -np.inf
+        count = min(count, len(scores) - len(set(excluded)))
+        if count <= 0:
+            return []
+
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ids[row]), float(scores[row])) for row in top if scores[row] > 0]
@@ -0,0 +1,7 @@
+"""
+User list ingestion and indexing
+"""
+
+from .collection import UserListIndex, load_user_list
+
+__all__ = ["UserListIndex", "load_user_list"]
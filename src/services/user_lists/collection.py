@@ -0,0 +1,210 @@
+"""
+Users' AniList lists, fetched once and kept up to date with deltas
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from src.config.settings import settings
+from src.models.records import MediaListColumns, MediaListEntry
+from src.services.anilist.client import get_anilist_client
+from src.services.cache.cache_service import get_cache_service, tag
+from src.services.cache.swr import cached, unwrap
+
+# Most entries AniList returns per page
+DELTA_PAGE_SIZE = 50
+# Collections kept indexed per process, so paging through one sorts it once
+INDEX_CACHE_SIZE = 256
+
+
+# Sort orders of get_user_list and the column each sorts on, highest or most recent first
+SORT_COLUMNS = {
+    "SCORE": "score",
+    "PROGRESS": "progress",
+    "UPDATED_TIME": "updated_at",
+    "STARTED_ON": "started_at",
+    "FINISHED_ON": "completed_at",
+}
+
+
+def compact(
+    user: Dict[str, Any],
+    entries: Iterable[Dict[str, Any]],
+    list_names: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """Cached form of a list: each entry once, most recently updated first
+
+    Custom lists repeat entries already in a status list, so they are
+    left out. list_names holds the name of the user's list for each
+    status. high_water_mark is the newest updatedAt, where the next
+    delta refresh starts.
+    """
+    unique = {entry["media"]["id"]: entry for entry in entries if entry.get("media")}
+    ordered = sorted(unique.values(), key=lambda entry: entry.get("updatedAt") or 0, reverse=True)
+    return {
+        "user": user,
+        "entries": ordered,
+        "list_names": list_names or {},
+        "high_water_mark": (ordered[0].get("updatedAt") or 0) if ordered else 0,
+        "synced_at": time.time(),
+    }
+
+
+class UserListIndex:
+    """A cached list as compact records, with its entries in each status and sort order
+
+    Entries are MediaListEntry records keyed by media ID, with their
+    sortable fields copied into NumPy columns. Orders are built the
+    first time a status and sort are asked for, and pages are slices of
+    them turned back into ListEntry objects.
+    """
+
+    def __init__(self, collection: Dict[str, Any]):
+        self.user = collection["user"]
+        self.list_names: Dict[str, str] = collection.get("list_names") or {}
+        self.records = [MediaListEntry.from_graphql(entry) for entry in collection["entries"]]
+        self.entries = {record.media.id: record for record in self.records}
+        self.columns = MediaListColumns(self.records)
+        self._orders: Dict[Tuple[Optional[str], str], np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def order(self, status: Optional[str], sort: str) -> np.ndarray:
+        """Rows of entries with a status (or all of them) in a sort order"""
+        key = (status, sort)
+        if key not in self._orders:
+            # Records are stored most recently updated first, and the sort is
+            # stable, so ties stay in that order
+            self._orders[key] = self.columns.order(SORT_COLUMNS[sort], status)
+        return self._orders[key]
+
+    def page(
+        self, status: Optional[str], sort: str, page: int, per_page: int
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """One page of entries and its page info"""
+        rows = self.order(status, sort)
+        start = (page - 1) * per_page
+        return [self.records[row].to_graphql() for row in rows[start : start + per_page]], {
+            "total": len(rows),
+            "currentPage": page,
+            "lastPage": max(1, -(-len(rows) // per_page)),
+            "hasNextPage": start + per_page < len(rows),
+            "perPage": per_page,
+        }
+
+
+_indexes: "OrderedDict[Tuple[str, float], UserListIndex]" = OrderedDict()
+
+
+def user_list_index(key: str, collection: Dict[str, Any]) -> UserListIndex:
+    """Index of a cached collection, reused until the collection is refreshed"""
+    version = (key, collection["synced_at"])
+    index = _indexes.get(version)
+    if index is None:
+        index = _indexes[version] = UserListIndex(collection)
+        if len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    else:
+        _indexes.move_to_end(version)
+    return index
+
+
+def status_lists(collection: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """A MediaListCollection's lists, without custom ones"""
+    return [group for group in collection.get("lists") or [] if not group.get("isCustomList")]
+
+
+async def fetch_user_list(variables: Dict[str, Any]) -> Dict[str, Any]:
+    """A user's whole list, compacted"""
+    result = await get_anilist_client().get_user_list(variables)
+    collection = result.get("MediaListCollection") or {}
+    lists = status_lists(collection)
+    return compact(
+        collection.get("user") or {},
+        (entry for group in lists for entry in group.get("entries") or []),
+        {group["status"]: group["name"] for group in lists if group.get("status")},
+    )
+
+
+async def list_media_ids(variables: Dict[str, Any]) -> Set[int]:
+    """IDs of every anime or manga on a user's list, without the entries themselves"""
+    result = await get_anilist_client().get_user_list_ids(variables)
+    return {
+        entry["media"]["id"]
+        for group in status_lists(result.get("MediaListCollection") or {})
+        for entry in group.get("entries") or []
+        if entry.get("media")
+    }
+
+
+async def refresh_user_list(variables: Dict[str, Any], previous: Dict[str, Any]) -> Dict[str, Any]:
+    """A cached list brought up to date with the entries changed since it was fetched
+
+    Pages through the list by most recent update until reaching entries
+    older than the high-water mark. Deletions don't show up that way, so
+    the IDs still on the list are fetched on their own and the rest
+    dropped. An ID neither cached nor in the delta (added while the delta
+    was paged) means the cached list can't be patched, so the whole list
+    is fetched again.
+    """
+    anilist = get_anilist_client()
+    entries = {entry["media"]["id"]: entry for entry in previous["entries"]}
+    mark = previous["high_water_mark"]
+    page = 1
+    while True:
+        result = await anilist.get_user_list_updates(
+            {**variables, "page": page, "perPage": DELTA_PAGE_SIZE}
+        )
+        data = result.get("Page") or {}
+        media_list = data.get("mediaList") or []
+        # Entries updated in the same second as the mark are fetched again rather than missed
+        changed = [entry for entry in media_list if (entry.get("updatedAt") or 0) >= mark]
+        entries.update((entry["media"]["id"], entry) for entry in changed if entry.get("media"))
+        if len(changed) < len(media_list) or not data.get("pageInfo", {}).get("hasNextPage"):
+            break
+        page += 1
+
+    # Listed after the delta, so anything added meanwhile shows up as unknown
+    ids = await list_media_ids(variables)
+    if not ids <= entries.keys():
+        return await fetch_user_list(variables)
+    return compact(
+        previous["user"],
+        (entry for media_id, entry in entries.items() if media_id in ids),
+        previous.get("list_names"),
+    )
+
+
+async def load_user_list(
+    user_id: Optional[int] = None, user_name: Optional[str] = None, list_type: str = "ANIME"
+) -> UserListIndex:
+    """A user's whole list, indexed
+
+    The list is cached once per user and type. It is fresh for
+    CACHE_TTL_USER_LIST; for CACHE_TTL_USER_LIST_RETAIN after that it is
+    served as is while a background refresh fetches only what changed.
+    """
+    cache = get_cache_service()
+    user = user_id or user_name
+    key = f"user_list:{user}:{list_type}"
+    variables = {"userId": user_id, "userName": user_name, "type": list_type}
+
+    async def fetch() -> Dict[str, Any]:
+        previous = await cache.get(key)
+        if previous is None:
+            return await fetch_user_list(variables)
+        return await refresh_user_list(variables, unwrap(previous)[0])
+
+    collection = await cached(
+        cache,
+        key,
+        fetch,
+        ttl=settings.CACHE_TTL_USER_LIST,
+        stale_ttl=settings.CACHE_TTL_USER_LIST_RETAIN,
+        tags=[tag("user", user)],
+    )
+    return user_list_index(key, collection)
@@ -2,6 +2,6 @@
 Tools module initialization
 """
 
-from . import anime_tools, trending_tools, character_tools, user_tools
+from . import anime_tools, trending_tools, character_tools, user_tools, discovery_tools
 
 __all__ = ["registry"]
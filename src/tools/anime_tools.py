@@ -4,14 +4,28 @@ Anime search and discovery tools
 
 import hashlib
 import json
-from typing import Dict, Any, Optional
-
-from src.tools.registry import registry, MCPTool
-from src.services.anilist.client import AniListClient
-from src.services.cache.cache_service import CacheService
+from typing import Dict, Any, AsyncIterator, Optional
+
+from src.config.settings import settings
+from src.observability.metrics import CATALOG_SEARCHES
+from src.observability.tracing import tracer
+from src.tools.formats import STRUCTURED, SUMMARY, WIDGET, wants
+from src.tools.registry import registry, MCPTool, collect
+from src.services.anilist.client import get_anilist_client
+from src.services.anilist.operations import Projection, projection_fields
+from src.services.cache.cache_service import get_cache_service
+from src.services.cache.entity_store import get_entity_store, page_tags
+from src.services.cache.swr import cached
+from src.services.catalog import get_catalog
+from src.widgets import render_search_widget
+
+
+async def search_anime_handler(**arguments) -> Dict[str, Any]:
+    """Search for anime with filters"""
+    return await collect(search_anime_stream(**arguments))
 
 
-async def search_anime_handler(
+async def search_anime_stream(
     query: Optional[str] = None,
     genres: Optional[list] = None,
     tags: Optional[list] = None,
@@ -23,10 +37,11 @@ async def search_anime_handler(
     sort: str = "POPULARITY_DESC",
     page: int = 1,
     per_page: int = 10,
-) -> Dict[str, Any]:
-    """Search for anime with filters"""
-    cache = CacheService()
-    anilist = AniListClient()
+) -> AsyncIterator[Dict[str, Any]]:
+    """Search for anime, yielding the summary first and then cards in chunks"""
+    cache = get_cache_service()
+    store = get_entity_store()
+    anilist = get_anilist_client()
 
     # Generate cache key
     cache_params = {
@@ -44,11 +59,6 @@ async def search_anime_handler(
     }
     cache_key = f"search:{hashlib.md5(str(cache_params).encode()).hexdigest()}"
 
-    # Try cache
-    cached = await cache.get(cache_key)
-    if cached:
-        return cached
-
     # Build GraphQL variables
     variables = {"page": page, "perPage": per_page, "sort": sort, "type": "ANIME"}
 
@@ -70,21 +80,55 @@ async def search_anime_handler(
     if minimum_score:
         variables["averageScore_greater"] = minimum_score
 
-    # Execute query
-    result = await anilist.search_media(variables)
-
-    # Format for ChatGPT
-    formatted = {
-        "results": result.get("Page", {}).get("media", []),
-        "page_info": result.get("Page", {}).get("pageInfo", {}),
-        "widget_html": generate_search_widget(result.get("Page", {}).get("media", [])),
-        "text_summary": format_search_summary(result.get("Page", {}).get("media", [])),
-    }
+    async def fetch() -> Dict[str, Any]:
+        result = await anilist.search_media(variables)
+        page = result.get("Page", {})
+        return await store.put_page("media", page.get("media", []), page.get("pageInfo", {}))
+
+    # Served from the local catalog mirror unless the query needs live data;
+    # otherwise try cache, fetching once on a miss
+    page = get_catalog().search(
+        query=query,
+        genres=genres,
+        tags=tags,
+        season=season,
+        year=year,
+        status=status,
+        format=format,
+        minimum_score=minimum_score,
+        sort=sort,
+        page=page,
+        per_page=per_page,
+    )
+    CATALOG_SEARCHES.labels(source="upstream" if page is None else "catalog").inc()
+    if page is None:
+        page = await cached(cache, cache_key, fetch, ttl=3600, tags=page_tags)
+
+    # Hydrate a chunk at a time so the first cards go out early; the summary
+    # and widget are only rendered for callers that asked for them
+    media_list = []
+    async for chunk in store.iter_page(
+        page,
+        settings.MCP_STREAM_CHUNK_SIZE,
+        fallback=get_catalog().load_media,
+        fields=projection_fields(Projection.DETAIL),
+    ):
+        if not media_list and chunk and wants(SUMMARY):
+            yield {"text_summary": format_search_summary(chunk)}
+        media_list.extend(chunk)
+        yield {"results": chunk}
 
-    # Cache results
-    await cache.set(cache_key, formatted, ttl=3600)
+    if not media_list:
+        empty: Dict[str, Any] = {"results": []}
+        if wants(SUMMARY):
+            empty["text_summary"] = format_search_summary(media_list)
+        yield empty
 
-    return formatted
+    last: Dict[str, Any] = {"page_info": page.get("page_info", {})}
+    if wants(WIDGET):
+        with tracer.start_as_current_span("render search widget"):
+            last["widget_html"] = render_search_widget(media_list)
+    yield last
 
 
 def format_search_summary(media_list: list) -> str:
@@ -104,51 +148,6 @@ def format_search_summary(media_list: list) -> str:
     return "\n".join(summaries)
 
 
-def generate_search_widget(media_list: list) -> str:
-    """Generate HTML widget for ChatGPT"""
-    if not media_list:
-        return "<div>No results found</div>"
-
-    cards = []
-    for media in media_list:
-        title = media.get("title", {}).get("english") or media.get("title", {}).get(
-            "romaji", "Unknown"
-        )
-        image = media.get("coverImage", {}).get("large", "")
-        score = media.get("averageScore", 0)
-        episodes = media.get("episodes", "?")
-        genres = media.get("genres", [])[:3]
-
-        cards.append(f"""
-        <div class="anime-card" data-id="{media.get("id")}">
-            <img src="{image}" alt="{title}" />
-            <div class="info">
-                <h4>{title}</h4>
-                <div class="meta">
-                    <span class="score">★ {score / 10:.1f}</span>
-                    <span class="episodes">{episodes} eps</span>
-                </div>
-                <div class="genres">{", ".join(genres)}</div>
-            </div>
-        </div>
-        """)
-
-    return f"""
-    <div class="anime-search-results">
-        <style>
-            .anime-search-results {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(200px, 1fr)); gap: 16px; }}
-            .anime-card {{ border: 1px solid #ddd; border-radius: 8px; overflow: hidden; cursor: pointer; }}
-            .anime-card img {{ width: 100%; height: 280px; object-fit: cover; }}
-            .anime-card .info {{ padding: 12px; }}
-            .anime-card h4 {{ margin: 0 0 8px 0; font-size: 14px; }}
-            .anime-card .meta {{ display: flex; justify-content: space-between; font-size: 12px; color: #666; }}
-            .anime-card .genres {{ font-size: 11px; color: #999; margin-top: 4px; }}
-        </style>
-        {"".join(cards)}
-    </div>
-    """
-
-
 # Register tool
 registry.register(
     MCPTool(
@@ -219,5 +218,7 @@ registry.register(
             },
         },
         handler=search_anime_handler,
+        stream=search_anime_stream,
+        formats=(STRUCTURED, SUMMARY, WIDGET),
     )
 )
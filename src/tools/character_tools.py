@@ -4,9 +4,11 @@ Character information tools
 
 from typing import Dict, Any, Optional
 
+from src.models.records import Character
 from src.tools.registry import registry, MCPTool
-from src.services.anilist.client import AniListClient
-from src.services.cache.cache_service import CacheService
+from src.services.anilist.client import get_anilist_client
+from src.services.cache.cache_service import get_cache_service, tag
+from src.services.cache.swr import cached
 
 
 async def get_character_info_handler(
@@ -16,36 +18,39 @@ async def get_character_info_handler(
     include_anime: bool = True,
 ) -> Dict[str, Any]:
     """Get detailed information about a character"""
-    cache = CacheService()
-    anilist = AniListClient()
+    cache = get_cache_service()
+    anilist = get_anilist_client()
 
     cache_key = f"character:{character_id}"
 
-    cached = await cache.get(cache_key)
-    if cached:
-        return cached
+    async def fetch() -> Dict[str, Any]:
+        result = await anilist.get_character(character_id)
 
-    result = await anilist.get_character(character_id)
+        character = Character.from_graphql(result.get("Character") or {"id": character_id})
 
-    character = result.get("Character", {})
-
-    formatted = {
-        "id": character.get("id"),
-        "name": character.get("name", {}),
-        "image": character.get("image", {}),
-        "description": character.get("description", ""),
-        "gender": character.get("gender"),
-        "age": character.get("age"),
-        "date_of_birth": character.get("dateOfBirth", {}),
-        "favourites": character.get("favourites", 0),
-    }
+        formatted = {
+            "id": character.id,
+            "name": character.name,
+            "image": character.image,
+            "description": character.description or "",
+            "gender": character.gender,
+            "age": character.age,
+            "date_of_birth": character.date_of_birth,
+            "favourites": character.favourites,
+        }
 
-    if include_anime:
-        formatted["appearances"] = format_appearances(character.get("media", {}))
+        if include_anime:
+            formatted["appearances"] = format_appearances(character.media or {})
 
-    await cache.set(cache_key, formatted, ttl=86400 * 7)  # 7 days
+        return formatted
 
-    return formatted
+    return await cached(
+        cache,
+        cache_key,
+        fetch,
+        ttl=86400 * 7,  # 7 days
+        tags=[tag("character", character_id)],
+    )
 
 
 def format_appearances(media_data: Dict) -> list:
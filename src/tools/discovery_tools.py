@@ -0,0 +1,142 @@
+"""
+Free-text anime discovery by embedding similarity
+"""
+
+import asyncio
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.config.settings import settings
+from src.services.anilist.operations import Projection, projection_fields
+from src.services.cache.entity_store import get_entity_store
+from src.services.catalog import get_catalog
+from src.services.embeddings import get_embedder, get_embedding_store
+from src.tools.registry import registry, MCPTool
+
+# "like <title>", then optionally a separator and what to change about it
+LIKE_QUERY = re.compile(
+    r"^(?:(?:an?|some)\s+)?(?:(?:anime|shows?|series|something)\s+)?(?:like|similar\s+to)\s+"
+    r"(?P<reference>.+?)"
+    r"(?:\s*(?:,|;|\s-\s)?\s*\b(?P<separator>but|with|only|without|minus|except|less)\b"
+    r"\s*(?P<modifier>.*))?$",
+    re.IGNORECASE,
+)
+# Separators asking for less of the modifier rather than more
+NEGATING = {"without", "minus", "except", "less"}
+# How strongly the modifier pulls results away from the reference title
+MODIFIER_WEIGHT = 0.8
+
+
+def parse_query(query: str) -> Tuple[Optional[str], str, float]:
+    """Split a query into the reference title, the modifier and its sign"""
+    match = LIKE_QUERY.match(query.strip())
+    if not match:
+        return None, query, 1.0
+    separator = (match.group("separator") or "").lower()
+    return (
+        match.group("reference").strip(" \"'"),
+        match.group("modifier") or "",
+        -1.0 if separator in NEGATING else 1.0,
+    )
+
+
+async def discover_anime_handler(
+    query: str,
+    reference_anime_id: Optional[int] = None,
+    count: int = 10,
+    exclude_ids: Optional[list] = None,
+) -> Dict[str, Any]:
+    """Find anime matching a description, or like a title but with some change"""
+    catalog = get_catalog()
+    embedder = get_embedder()
+    store = get_embedding_store()
+
+    reference_title, modifier, sign = parse_query(query)
+    if reference_title and not reference_anime_id:
+        found = catalog.index.search(query=reference_title, per_page=1)["results"]
+        if found:
+            reference_anime_id = found[0]["id"]
+
+    reference = await store.vector(reference_anime_id) if reference_anime_id else None
+    if reference is None:
+        # Nothing to anchor on, so the whole query is the description
+        reference_anime_id = None
+        vector = (await asyncio.to_thread(embedder.embed, [query]))[0]
+    else:
+        vector = reference.copy()
+        if modifier:
+            vector += (
+                sign * MODIFIER_WEIGHT * (await asyncio.to_thread(embedder.embed, [modifier]))[0]
+            )
+    norm = np.linalg.norm(vector)
+    if not norm:
+        return {"error": "Query has nothing to search for"}
+
+    exclude = [*(exclude_ids or []), *([reference_anime_id] if reference_anime_id else [])]
+    scored = await store.nearest(vector / norm, count, exclude)
+
+    return {
+        "query": query,
+        "reference_anime_id": reference_anime_id,
+        "modifier": modifier or None,
+        "results": [
+            {"anime": anime, "similarity": round(similarity, 3)}
+            for anime, (_, similarity) in zip(await cards(scored), scored)
+            if anime is not None and similarity > 0
+        ],
+    }
+
+
+async def cards(scored: List[Tuple[int, float]]) -> List[Optional[Dict[str, Any]]]:
+    """Cards for scored anime, from the catalog index or else the entity store"""
+    catalog = get_catalog()
+    found = {media_id: catalog.index.card(media_id) for media_id, _ in scored}
+    missing = [media_id for media_id, card in found.items() if card is None]
+    if missing:
+        loaded = await get_entity_store().get_many(
+            "media", missing, fallback=catalog.load_media, fields=projection_fields(Projection.CARD)
+        )
+        found.update(zip(missing, loaded))
+    return [found[media_id] for media_id, _ in scored]
+
+
+def tool_description() -> str:
+    """What the tool does, and whether it matches by meaning or by shared words"""
+    description = (
+        "Find anime from a free-text description or a title with a twist, "
+        'such as "like Cowboy Bebop but darker" or "something like Mushishi without the gore"'
+    )
+    if settings.EMBEDDING_MODEL == "hashing":
+        description += (
+            ". Matches words shared with titles, genres, tags and synopses rather than meaning, "
+            'so a twist like "darker" favours anime whose descriptions use that word'
+        )
+    return description
+
+
+# Register tool
+registry.register(
+    MCPTool(
+        name="discover_anime",
+        description=tool_description(),
+        parameters={
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": 'Description, or "like <title> but/with/without <change>"',
+                },
+                "reference_anime_id": {
+                    "type": "integer",
+                    "description": "AniList ID of the title the query is like",
+                },
+                "count": {"type": "integer", "default": 10, "maximum": 25},
+                "exclude_ids": {"type": "array", "items": {"type": "integer"}},
+            },
+            "required": ["query"],
+        },
+        handler=discover_anime_handler,
+    )
+)
@@ -0,0 +1,33 @@
+"""
+Output formats a tool call can ask for
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import FrozenSet, Iterable, Iterator
+
+STRUCTURED = "structured"
+SUMMARY = "summary"
+WIDGET = "widget"
+
+OUTPUT_FORMATS: FrozenSet[str] = frozenset({STRUCTURED, SUMMARY, WIDGET})
+
+# Result fields holding each rendered format
+FORMAT_FIELDS = {SUMMARY: "text_summary", WIDGET: "widget_html"}
+
+requested_formats: ContextVar[FrozenSet[str]] = ContextVar("output_formats", default=OUTPUT_FORMATS)
+
+
+@contextmanager
+def output_formats(formats: Iterable[str]) -> Iterator[None]:
+    """Render only the given formats in tool calls made inside the block"""
+    token = requested_formats.set(frozenset(formats))
+    try:
+        yield
+    finally:
+        requested_formats.reset(token)
+
+
+def wants(output_format: str) -> bool:
+    """Whether the current tool call asked for a format"""
+    return output_format in requested_formats.get()
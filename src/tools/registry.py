@@ -2,18 +2,47 @@
 Tool registry for MCP tools
 """
 
-from typing import Dict, List, Callable, Any
-from dataclasses import dataclass
+from typing import Dict, List, Callable, Any, AsyncIterator, Optional, Tuple
+from dataclasses import dataclass, replace
+
+from src.observability.metrics import timed_tool, timed_tool_stream
+from src.observability.tracing import traced_tool, traced_tool_stream
+from src.tools.formats import STRUCTURED
 
 
 @dataclass
 class MCPTool:
-    """MCP Tool definition"""
+    """MCP Tool definition
+
+    Tools may also provide stream, an async generator taking the same
+    arguments as handler and yielding partial results; merged in order
+    they form the full result. formats lists the output formats the tool
+    can render (see src.tools.formats).
+    """
 
     name: str
     description: str
     parameters: Dict[str, Any]
     handler: Callable
+    stream: Optional[Callable[..., AsyncIterator[Dict[str, Any]]]] = None
+    formats: Tuple[str, ...] = (STRUCTURED,)
+
+
+def merge_chunk(result: Dict[str, Any], chunk: Dict[str, Any]):
+    """Merge a partial result into result; lists are extended, other fields replaced"""
+    for field, value in chunk.items():
+        if isinstance(value, list) and isinstance(result.get(field), list):
+            result[field].extend(value)
+        else:
+            result[field] = list(value) if isinstance(value, list) else value
+
+
+async def collect(chunks: AsyncIterator[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge every partial result from a tool stream"""
+    result: Dict[str, Any] = {}
+    async for chunk in chunks:
+        merge_chunk(result, chunk)
+    return result
 
 
 class ToolRegistry:
@@ -23,8 +52,15 @@ class ToolRegistry:
         self._tools: Dict[str, MCPTool] = {}
 
     def register(self, tool: MCPTool):
-        """Register a tool"""
-        self._tools[tool.name] = tool
+        """Register a tool, tracing and recording the latency of every call"""
+        stream = None
+        if tool.stream:
+            stream = timed_tool_stream(tool.name, traced_tool_stream(tool.name, tool.stream))
+        self._tools[tool.name] = replace(
+            tool,
+            handler=timed_tool(tool.name, traced_tool(tool.name, tool.handler)),
+            stream=stream,
+        )
 
     def get_tool(self, name: str) -> MCPTool:
         """Get a tool by name"""
@@ -41,6 +77,7 @@ class ToolRegistry:
                 "name": tool.name,
                 "description": tool.description,
                 "parameters": tool.parameters,
+                "outputFormats": list(tool.formats),
             }
             for tool in self._tools.values()
         ]
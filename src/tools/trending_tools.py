@@ -5,23 +5,24 @@ Trending and seasonal anime tools
 from typing import Dict, Any, Optional
 
 from src.tools.registry import registry, MCPTool
-from src.services.anilist.client import AniListClient
-from src.services.cache.cache_service import CacheService
+from src.services.anilist.client import get_anilist_client
+from src.services.anilist.operations import Projection, projection_fields
+from src.services.cache.cache_service import get_cache_service, tag
+from src.services.cache.entity_store import get_entity_store, page_tags
+from src.services.cache.swr import cached
+from src.services.catalog import get_catalog
 
 
 async def get_trending_anime_handler(
     media_type: str = "ANIME", page: int = 1, per_page: int = 10
 ) -> Dict[str, Any]:
     """Get currently trending anime"""
-    cache = CacheService()
-    anilist = AniListClient()
+    cache = get_cache_service()
+    store = get_entity_store()
+    anilist = get_anilist_client()
 
     cache_key = f"trending:{media_type}:{page}:{per_page}"
 
-    cached = await cache.get(cache_key)
-    if cached:
-        return cached
-
     variables = {
         "page": page,
         "perPage": per_page,
@@ -29,18 +30,28 @@ async def get_trending_anime_handler(
         "type": media_type,
     }
 
-    result = await anilist.search_media(variables)
+    async def fetch() -> Dict[str, Any]:
+        result = await anilist.search_media(variables, projection=Projection.CARD)
+        page = result.get("Page", {})
+        return await store.put_page("media", page.get("media", []), page.get("pageInfo", {}))
+
+    page = await cached(
+        cache,
+        cache_key,
+        fetch,
+        ttl=1800,  # 30 minutes
+        tags=lambda page: [tag("trending", media_type), *page_tags(page)],
+    )
+    media_list, page_info = await store.hydrate_page(
+        page, fallback=get_catalog().load_media, fields=projection_fields(Projection.CARD)
+    )
 
-    formatted = {
-        "results": result.get("Page", {}).get("media", []),
-        "page_info": result.get("Page", {}).get("pageInfo", {}),
+    return {
+        "results": media_list,
+        "page_info": page_info,
         "text_summary": f"Showing {per_page} trending {media_type.lower()} titles",
     }
 
-    await cache.set(cache_key, formatted, ttl=1800)  # 30 minutes
-
-    return formatted
-
 
 async def get_seasonal_anime_handler(
     season: Optional[str] = None,
@@ -49,8 +60,9 @@ async def get_seasonal_anime_handler(
     per_page: int = 25,
 ) -> Dict[str, Any]:
     """Get anime for a specific season"""
-    cache = CacheService()
-    anilist = AniListClient()
+    cache = get_cache_service()
+    store = get_entity_store()
+    anilist = get_anilist_client()
 
     # Default to current season if not specified
     if not season or not year:
@@ -72,10 +84,6 @@ async def get_seasonal_anime_handler(
 
     cache_key = f"seasonal:{season}:{year}:{page}"
 
-    cached = await cache.get(cache_key)
-    if cached:
-        return cached
-
     variables = {
         "page": page,
         "perPage": per_page,
@@ -85,19 +93,29 @@ async def get_seasonal_anime_handler(
         "seasonYear": year,
     }
 
-    result = await anilist.search_media(variables)
+    async def fetch() -> Dict[str, Any]:
+        result = await anilist.search_media(variables, projection=Projection.CARD)
+        page = result.get("Page", {})
+        return await store.put_page("media", page.get("media", []), page.get("pageInfo", {}))
+
+    page = await cached(
+        cache,
+        cache_key,
+        fetch,
+        ttl=86400,  # 24 hours
+        tags=lambda page: [tag("season", season, year), *page_tags(page)],
+    )
+    media_list, page_info = await store.hydrate_page(
+        page, fallback=get_catalog().load_media, fields=projection_fields(Projection.CARD)
+    )
 
-    formatted = {
+    return {
         "season": season,
         "year": year,
-        "results": result.get("Page", {}).get("media", []),
-        "page_info": result.get("Page", {}).get("pageInfo", {}),
+        "results": media_list,
+        "page_info": page_info,
     }
 
-    await cache.set(cache_key, formatted, ttl=86400)  # 24 hours
-
-    return formatted
-
 
 # Register tools
 registry.register(
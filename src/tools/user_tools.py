@@ -2,11 +2,16 @@
 User list and authentication tools
 """
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 from src.tools.registry import registry, MCPTool
-from src.services.anilist.client import AniListClient
-from src.services.cache.cache_service import CacheService
+from src.services.anilist.client import get_anilist_client
+from src.services.anilist.operations import Projection
+from src.services.cache.cache_service import get_cache_service, tag
+from src.services.cache.swr import cached
+from src.services.catalog import CatalogMirror, get_catalog
+from src.services.recommendations import taste_weights
+from src.services.user_lists import load_user_list
 
 
 async def get_user_list_handler(
@@ -18,39 +23,34 @@ async def get_user_list_handler(
     page: int = 1,
     per_page: int = 50,
 ) -> Dict[str, Any]:
-    """Get a user's anime/manga list from AniList"""
-    cache = CacheService()
-    anilist = AniListClient()
-
+    """Get a page of a user's anime/manga list from AniList"""
     if not user_id and not user_name:
         return {"error": "Either user_id or user_name must be provided"}
 
-    cache_key = f"user_list:{user_id or user_name}:{list_type}:{status or 'all'}:{page}"
-
-    cached = await cache.get(cache_key)
-    if cached:
-        return cached
-
-    variables = {"userId": user_id, "userName": user_name, "type": list_type}
-
-    result = await anilist.get_user_list(variables)
+    # The whole list is cached once; each status, sort and page is served from it
+    user_list = await load_user_list(user_id=user_id, user_name=user_name, list_type=list_type)
+    entries, page_info = user_list.page(status, sort, page, per_page)
 
-    lists = result.get("MediaListCollection", {}).get("lists", [])
-
-    # Filter by status if specified
-    if status:
-        lists = [l for l in lists if l.get("status") == status]
+    # Grouped by list, in the shape get_user_list returned before it paged
+    lists: Dict[Any, Dict[str, Any]] = {}
+    for entry in entries:
+        group = lists.get(entry["status"])
+        if group is None:
+            group = lists[entry["status"]] = {
+                "name": user_list.list_names.get(entry["status"], entry["status"]),
+                "status": entry["status"],
+                "isCustomList": False,
+                "entries": [],
+            }
+        group["entries"].append(entry)
 
-    formatted = {
-        "user": result.get("MediaListCollection", {}).get("user", {}),
-        "lists": lists,
-        "total_entries": sum(len(l.get("entries", [])) for l in lists),
+    return {
+        "user": user_list.user,
+        "lists": list(lists.values()),
+        "total_entries": page_info["total"],
+        "page_info": page_info,
     }
 
-    await cache.set(cache_key, formatted, ttl=300)  # 5 minutes
-
-    return formatted
-
 
 async def get_anime_recommendations_handler(
     reference_anime_id: Optional[int] = None,
@@ -58,70 +58,155 @@ async def get_anime_recommendations_handler(
     recommendation_type: str = "similar",
     count: int = 5,
     exclude_ids: Optional[list] = None,
+    user_id: Optional[int] = None,
+    user_name: Optional[str] = None,
 ) -> Dict[str, Any]:
     """Get anime recommendations"""
-    cache = CacheService()
-    anilist = AniListClient()
+    cache = get_cache_service()
+    anilist = get_anilist_client()
+    catalog = get_catalog()
+    engine = catalog.recommender
 
-    # If title provided instead of ID, search for it
+    # If title provided instead of ID, search for it, locally when the catalog is loaded
     if reference_title and not reference_anime_id:
-        search_result = await anilist.search_media(
-            {"search": reference_title, "page": 1, "perPage": 1, "type": "ANIME"}
+        found = catalog.index.search(query=reference_title, per_page=1)["results"]
+        if not found:
+            search_result = await anilist.search_media(
+                {"search": reference_title, "page": 1, "perPage": 1, "type": "ANIME"},
+                projection=Projection.ID,
+            )
+            found = search_result.get("Page", {}).get("media", [])
+        if found:
+            reference_anime_id = found[0].get("id")
+
+    # Scored against the mirrored catalog when it is loaded, with no AniList calls
+    # beyond the user's (cached) list
+    if recommendation_type == "taste_profile" and (user_id or user_name) and len(engine):
+        user_list = await load_user_list(user_id=user_id, user_name=user_name)
+        weights = taste_weights(entry.to_graphql() for entry in user_list.records)
+        scored = engine.for_taste(weights, count, exclude_ids or [])
+        return catalog_recommendations(
+            catalog, scored, recommendation_type=recommendation_type, user=user_list.user
         )
-        media_list = search_result.get("Page", {}).get("media", [])
-        if media_list:
-            reference_anime_id = media_list[0].get("id")
 
     if not reference_anime_id:
         return {"error": "Could not find reference anime"}
 
+    if reference_anime_id in engine:
+        community: List[Dict[str, Any]] = []
+        if recommendation_type == "trending_genre":
+            scored = engine.trending_like(reference_anime_id, count, exclude_ids or [])
+        else:
+            # AniList's community picks still count, as one feature among the catalog's
+            community = await community_recommendations(reference_anime_id)
+            ratings = {
+                node["mediaRecommendation"]["id"]: node.get("rating") or 0
+                for node in community
+                if node.get("mediaRecommendation")
+            }
+            scored = engine.similar(reference_anime_id, count, exclude_ids or [], ratings)
+        return catalog_recommendations(
+            catalog,
+            scored,
+            community,
+            reference_anime_id=reference_anime_id,
+            recommendation_type=recommendation_type,
+        )
+
     cache_key = f"recommendations:{reference_anime_id}:{recommendation_type}:{count}"
 
-    cached = await cache.get(cache_key)
-    if cached:
-        return cached
+    async def fetch() -> Dict[str, Any]:
+        # Get recommendations from AniList
+        result = await anilist.get_recommendations(reference_anime_id)
+
+        recommendations = (
+            result.get("Media", {}).get("recommendations", {}).get("nodes", [])
+        )
 
-    # Get recommendations from AniList
-    result = await anilist.get_recommendations(reference_anime_id)
+        # Filter excluded IDs
+        if exclude_ids:
+            recommendations = [
+                r
+                for r in recommendations
+                if r.get("mediaRecommendation", {}).get("id") not in exclude_ids
+            ]
 
-    recommendations = (
-        result.get("Media", {}).get("recommendations", {}).get("nodes", [])
+        # Take top N
+        recommendations = recommendations[:count]
+
+        return {
+            "reference_anime_id": reference_anime_id,
+            "recommendation_type": recommendation_type,
+            "recommendations": [
+                {
+                    "anime": rec.get("mediaRecommendation", {}),
+                    "rating": rec.get("rating"),
+                    "user_rating": rec.get("userRating"),
+                }
+                for rec in recommendations
+            ],
+        }
+
+    return await cached(
+        cache,
+        cache_key,
+        fetch,
+        ttl=3600,  # 1 hour
+        tags=[tag("media", reference_anime_id)],
+    )
+
+
+async def community_recommendations(anime_id: int) -> List[Dict[str, Any]]:
+    """AniList's community recommendations for a title, best rated first"""
+
+    async def fetch() -> List[Dict[str, Any]]:
+        result = await get_anilist_client().get_recommendations(anime_id)
+        return result.get("Media", {}).get("recommendations", {}).get("nodes", [])
+
+    return await cached(
+        get_cache_service(),
+        f"community_recommendations:{anime_id}",
+        fetch,
+        ttl=3600,  # 1 hour
+        tags=[tag("media", anime_id)],
     )
 
-    # Filter excluded IDs
-    if exclude_ids:
-        recommendations = [
-            r
-            for r in recommendations
-            if r.get("mediaRecommendation", {}).get("id") not in exclude_ids
-        ]
 
-    # Take top N
-    recommendations = recommendations[:count]
+def catalog_recommendations(
+    catalog: CatalogMirror,
+    scored: List[Tuple[int, float]],
+    community: Optional[List[Dict[str, Any]]] = None,
+    **fields,
+) -> Dict[str, Any]:
+    """Recommendation result for anime scored by the catalog's engine
 
-    formatted = {
-        "reference_anime_id": reference_anime_id,
-        "recommendation_type": recommendation_type,
+    Keeps the rating and user_rating of AniList's community recommendations,
+    which are None for anime the community didn't recommend.
+    """
+    nodes = {
+        node["mediaRecommendation"]["id"]: node
+        for node in community or []
+        if node.get("mediaRecommendation")
+    }
+    return {
+        **fields,
         "recommendations": [
             {
-                "anime": rec.get("mediaRecommendation", {}),
-                "rating": rec.get("rating"),
-                "user_rating": rec.get("userRating"),
+                "anime": catalog.index.card(media_id),
+                "rating": nodes.get(media_id, {}).get("rating"),
+                "user_rating": nodes.get(media_id, {}).get("userRating"),
+                "similarity": round(similarity, 3),
             }
-            for rec in recommendations
+            for media_id, similarity in scored
         ],
     }
 
-    await cache.set(cache_key, formatted, ttl=3600)  # 1 hour
-
-    return formatted
-
 
 # Register tools
 registry.register(
     MCPTool(
         name="get_user_list",
-        description="Get a user's anime/manga list from AniList",
+        description="Get a page of a user's anime/manga list from AniList, by status and sort",
         parameters={
             "type": "object",
             "properties": {
@@ -184,6 +269,14 @@ registry.register(
                 },
                 "count": {"type": "integer", "default": 5, "maximum": 20},
                 "exclude_ids": {"type": "array", "items": {"type": "integer"}},
+                "user_id": {
+                    "type": "integer",
+                    "description": "AniList user ID whose list builds the taste profile",
+                },
+                "user_name": {
+                    "type": "string",
+                    "description": "AniList username whose list builds the taste profile",
+                },
             },
         },
         handler=get_anime_recommendations_handler,
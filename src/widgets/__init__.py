@@ -1,3 +1,15 @@
 """
 Widget templates and generators
 """
+
+from .search import render_card, render_search_widget
+from .stylesheet import STYLESHEET, STYLESHEET_VERSION, stylesheet_tag, stylesheet_url
+
+__all__ = [
+    "STYLESHEET",
+    "STYLESHEET_VERSION",
+    "render_card",
+    "render_search_widget",
+    "stylesheet_tag",
+    "stylesheet_url",
+]
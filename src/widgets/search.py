@@ -0,0 +1,96 @@
+"""
+Search results widget
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+from src.config.settings import settings
+from src.widgets.stylesheet import stylesheet_tag
+from src.widgets.template import Markup, Template
+
+PAGE = Template("""
+    <div class="anime-search-results">
+        {stylesheet}
+        {cards}
+    </div>
+    """)
+
+CARD = Template("""
+    <div class="anime-card" data-id="{id}">
+        <img src="{image}" alt="{title}" loading="lazy" />
+        <div class="info">
+            <h4>{title}</h4>
+            <div class="meta">
+                <span class="score">★ {score}</span>
+                <span class="episodes">{episodes} eps</span>
+            </div>
+            <div class="genres">{genres}</div>
+        </div>
+    </div>
+    """)
+
+EMPTY = Markup("<div>No results found</div>")
+
+
+def card_fields(media: Dict[str, Any]) -> Tuple:
+    """Everything a card shows"""
+    title = media.get("title") or {}
+    score = media.get("averageScore")
+    return (
+        media.get("id"),
+        title.get("english") or title.get("romaji") or "Unknown",
+        (media.get("coverImage") or {}).get("large") or "",
+        f"{score / 10:.1f}" if score is not None else "?",
+        media.get("episodes") or "?",
+        ", ".join((media.get("genres") or [])[:3]),
+    )
+
+
+def card_key(media: Dict[str, Any]) -> Tuple:
+    """Identify what a card shows without extracting it
+
+    AniList bumps updatedAt when a media's details change, but scores are
+    recalculated without it, so the score is part of the key. Media
+    fetched without updatedAt are keyed by every field the card shows.
+    """
+    updated_at = media.get("updatedAt")
+    if updated_at is None:
+        return card_fields(media)
+    return (media.get("id"), updated_at, media.get("averageScore"))
+
+
+# Rendered cards by card_key; oldest evicted first, as hits shouldn't pay for LRU upkeep
+_cards: Dict[Tuple, str] = {}
+
+
+def render_card(media: Dict[str, Any]) -> str:
+    """HTML for one media card, rendered once per version of the media"""
+    key = card_key(media)
+    card = _cards.get(key)
+    if card is None:
+        media_id, title, image, score, episodes, genres = card_fields(media)
+        card = str(
+            CARD.render(
+                id=media_id, title=title, image=image, score=score, episodes=episodes, genres=genres
+            )
+        )
+        if len(_cards) >= settings.WIDGET_CARD_CACHE_SIZE:
+            del _cards[next(iter(_cards))]
+        _cards[key] = card
+    return card
+
+
+@lru_cache(maxsize=4)
+def _page_frame(stylesheet: Markup) -> Tuple[str, str]:
+    """The page's HTML before and after its cards"""
+    start, end = PAGE.render(stylesheet=stylesheet, cards=Markup("\0")).split("\0")
+    return start, end
+
+
+def render_search_widget(media_list: List[Dict[str, Any]]) -> str:
+    """HTML widget listing search results as cards"""
+    if not media_list:
+        return str(EMPTY)
+    start, end = _page_frame(stylesheet_tag())
+    return "".join([start, *[render_card(media) for media in media_list], end])
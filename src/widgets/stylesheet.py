@@ -0,0 +1,37 @@
+"""
+Shared stylesheet for widgets, served once and referenced by URL
+"""
+
+import hashlib
+
+from src.config.settings import settings
+from src.widgets.template import Markup
+
+STYLESHEET = """\
+.anime-search-results { display: grid; grid-template-columns: repeat(auto-fill, minmax(200px, 1fr)); gap: 16px; }
+.anime-card { border: 1px solid #ddd; border-radius: 8px; overflow: hidden; cursor: pointer; }
+.anime-card img { width: 100%; height: 280px; object-fit: cover; }
+.anime-card .info { padding: 12px; }
+.anime-card h4 { margin: 0 0 8px 0; font-size: 14px; }
+.anime-card .meta { display: flex; justify-content: space-between; font-size: 12px; color: #666; }
+.anime-card .genres { font-size: 11px; color: #999; margin-top: 4px; }
+"""  # noqa: E501
+
+# Changes whenever the stylesheet does, so it can be cached forever
+STYLESHEET_VERSION = hashlib.sha256(STYLESHEET.encode()).hexdigest()[:12]
+
+
+def stylesheet_url() -> str:
+    """URL of the current stylesheet"""
+    return f"{settings.PUBLIC_URL.rstrip('/')}/widgets/styles.{STYLESHEET_VERSION}.css"
+
+
+def stylesheet_tag() -> Markup:
+    """Element that styles a widget: a link to the stylesheet, or the stylesheet inline
+
+    A relative link would resolve against the widget host rather than this
+    server, so without PUBLIC_URL the stylesheet is embedded in the page.
+    """
+    if not settings.PUBLIC_URL:
+        return Markup(f"<style>{STYLESHEET}</style>")
+    return Markup(f'<link rel="stylesheet" href="{stylesheet_url()}" />')
@@ -0,0 +1,36 @@
+"""
+Minimal HTML templates compiled once and rendered with escaping
+"""
+
+from html import escape
+from string import Formatter
+from typing import Any, List, Optional, Tuple
+
+
+class Markup(str):
+    """Text that is already HTML and must not be escaped again"""
+
+
+class Template:
+    """HTML template parsed once into literal text and {name} placeholders
+
+    Indentation and line breaks in the source are dropped, so templates
+    can be written readably without bloating the output. Values are
+    escaped when rendered unless they are Markup.
+    """
+
+    def __init__(self, source: str):
+        compact = "".join(line.strip() for line in source.splitlines())
+        self._parts: List[Tuple[str, Optional[str]]] = [
+            (literal, field) for literal, field, _, _ in Formatter().parse(compact)
+        ]
+
+    def render(self, **values: Any) -> Markup:
+        """Fill in the placeholders"""
+        out = []
+        for literal, field in self._parts:
+            out.append(literal)
+            if field is not None:
+                value = values[field]
+                out.append(value if isinstance(value, Markup) else escape(str(value)))
+        return Markup("".join(out))
@@ -5,7 +5,9 @@ Test fixtures and utilities
 import pytest
 import asyncio
 from unittest.mock import Mock, AsyncMock
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
+from src.models.database import Base
 from src.services.cache.redis_client import RedisClient
 from src.services.anilist.client import AniListClient
 
@@ -18,13 +20,32 @@ def event_loop():
     loop.close()
 
 
+@pytest.fixture
+async def sqlite_db():
+    """Engine and session factory for an in-memory SQLite copy of the schema"""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine, async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
 @pytest.fixture
 def mock_redis():
     """Mock Redis client"""
     redis_mock = Mock(spec=RedisClient)
     redis_mock.get = AsyncMock(return_value=None)
+    redis_mock.get_raw = AsyncMock(return_value=None)
     redis_mock.set = AsyncMock(return_value=True)
     redis_mock.delete = AsyncMock(return_value=True)
+    redis_mock.publish = AsyncMock(return_value=0)
+    redis_mock.exists = AsyncMock(return_value=False)
+    redis_mock.acquire_lock = AsyncMock(return_value=True)
+    redis_mock.release_lock = AsyncMock(return_value=True)
+    redis_mock.hset_many = AsyncMock(return_value=None)
+    redis_mock.hgetall_many = AsyncMock(side_effect=lambda keys: [{} for _ in keys])
+    redis_mock.smembers_many = AsyncMock(side_effect=lambda keys: [[] for _ in keys])
+    redis_mock.unlink = AsyncMock(side_effect=lambda keys: len(keys))
     return redis_mock
 
 
@@ -49,13 +70,28 @@ def sample_anime_response():
                     "title": {
                         "english": "Attack on Titan",
                         "romaji": "Shingeki no Kyojin",
+                        "native": "進撃の巨人",
                     },
-                    "description": "Humans fight against giant humanoid creatures...",
-                    "coverImage": {"large": "https://example.com/cover.jpg"},
+                    "coverImage": {"large": "https://example.com/cover.jpg", "medium": None},
                     "genres": ["Action", "Drama", "Fantasy"],
                     "episodes": 25,
-                    "averageScore": 84,
                     "status": "FINISHED",
+                    "format": "TV",
+                    "season": "SPRING",
+                    "seasonYear": 2013,
+                    "averageScore": 84,
+                    "popularity": 900,
+                    "updatedAt": 1700000000,
+                    "description": "Humans fight against giant humanoid creatures...",
+                    "bannerImage": None,
+                    "tags": [{"name": "Military", "rank": 80}],
+                    "studios": {"nodes": [{"name": "Wit Studio"}]},
+                    "duration": 24,
+                    "trending": 10,
+                    "source": "MANGA",
+                    "startDate": {"year": 2013, "month": 4, "day": 7},
+                    "nextAiringEpisode": None,
+                    "trailer": None,
                 }
             ],
             "pageInfo": {
@@ -66,3 +102,41 @@ def sample_anime_response():
             },
         }
     }
+
+
+@pytest.fixture
+def sample_catalog():
+    """A few anime as the catalog mirror stores them"""
+
+    def media(id, romaji, english, popularity, score, genres, year, **fields):
+        return {
+            "id": id,
+            "title": {"romaji": romaji, "english": english, "native": fields.pop("native", None)},
+            "coverImage": {"large": f"https://example.com/{id}.jpg", "medium": None},
+            "genres": genres,
+            "episodes": 12,
+            "status": "FINISHED",
+            "format": fields.pop("format", "TV"),
+            "season": "SPRING",
+            "seasonYear": year,
+            "averageScore": score,
+            "popularity": popularity,
+            "updatedAt": 1700000000,
+            "synonyms": fields.pop("synonyms", []),
+            "tags": [{"name": name, "rank": 80} for name in fields.pop("tags", [])],
+            "startDate": {"year": year, "month": 4, "day": 1},
+            **fields,
+        }
+
+    return [
+        media(16498, "Shingeki no Kyojin", "Attack on Titan", 900, 84, ["Action", "Drama"], 2013,
+              native="進撃の巨人", tags=["Military"]),
+        media(1535, "Death Note", "Death Note", 800, 86, ["Mystery", "Thriller"], 2006,
+              tags=["Detective"]),
+        media(5114, "Hagane no Renkinjutsushi: FULLMETAL ALCHEMIST",
+              "Fullmetal Alchemist: Brotherhood", 700, 90, ["Action", "Drama", "Fantasy"], 2009,
+              synonyms=["FMA:B"], tags=["Military"]),
+        media(1, "Cowboy Bebop", "Cowboy Bebop", 500, 86, ["Action", "Sci-Fi"], 1998),
+        media(5, "Cowboy Bebop: Tengoku no Tobira", "Cowboy Bebop: The Movie", 100, 82,
+              ["Action", "Sci-Fi"], 2001, format="MOVIE"),
+    ]  # fmt: skip
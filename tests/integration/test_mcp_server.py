@@ -2,10 +2,19 @@
 Integration tests for MCP server
 """
 
+import asyncio
+
+import httpx
+import orjson
 import pytest
-from unittest.mock import Mock
+from fastapi import FastAPI
+from unittest.mock import Mock, patch
 
+from src.api.routes import mcp
 from src.mcp.server import MCPServer
+from src.mcp.transport import PING, sse_stream
+from src.tools.formats import STRUCTURED, SUMMARY, WIDGET, wants
+from src.tools.registry import MCPTool, ToolRegistry, collect
 
 
 class TestMCPServerIntegration:
@@ -38,3 +47,328 @@ class TestMCPServerIntegration:
 
         assert "result" in result
         assert "tools" in result["result"]
+
+    @pytest.fixture
+    def slow_tools(self):
+        """Registry whose tools record how many run at once"""
+        state = {"running": 0, "peak": 0, "calls": []}
+
+        async def handler(**arguments):
+            state["calls"].append(arguments)
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+            await asyncio.sleep(arguments.get("delay", 0.01))
+            state["running"] -= 1
+            return arguments
+
+        tools = ToolRegistry()
+        tools.register(MCPTool(name="echo", description="", parameters={}, handler=handler))
+        return tools, state
+
+    @pytest.mark.asyncio
+    async def test_batch_runs_calls_concurrently_in_order(self, mcp_server, slow_tools):
+        """Test batch entries run in parallel and respond in request order"""
+        mcp_server.tool_registry, state = slow_tools
+        batch = [
+            {
+                "jsonrpc": "2.0",
+                "method": "tools/call",
+                "params": {"name": "echo", "arguments": {"n": i}},
+                "id": i,
+            }
+            for i in range(3)
+        ]
+        batch.append({"jsonrpc": "2.0", "method": "tools/list", "id": "list"})
+
+        result = await mcp_server.handle_request("session-123", batch)
+
+        assert [response["id"] for response in result] == [0, 1, 2, "list"]
+        assert '"n": 1' in result[1]["result"]["content"][0]["text"]
+        assert state["peak"] == 3
+
+    @pytest.mark.asyncio
+    async def test_batch_deduplicates_identical_calls(self, mcp_server, slow_tools):
+        """Test identical tool calls in one batch execute once"""
+        mcp_server.tool_registry, state = slow_tools
+        call = {"name": "echo", "arguments": {"q": "naruto"}}
+        batch = [
+            {"jsonrpc": "2.0", "method": "tools/call", "params": call, "id": 1},
+            {"jsonrpc": "2.0", "method": "tools/call", "params": call, "id": 2},
+        ]
+
+        result = await mcp_server.handle_request("session-123", batch)
+
+        assert len(state["calls"]) == 1
+        assert [response["id"] for response in result] == [1, 2]
+        assert result[0]["result"] == result[1]["result"]
+
+    @pytest.mark.asyncio
+    async def test_batch_concurrency_and_timeout(self, mcp_server, slow_tools):
+        """Test the batch concurrency cap and per-call timeout"""
+        mcp_server.tool_registry, state = slow_tools
+        batch = [
+            {
+                "jsonrpc": "2.0",
+                "method": "tools/call",
+                "params": {"name": "echo", "arguments": {"n": i}},
+                "id": i,
+            }
+            for i in range(4)
+        ]
+        batch.append(
+            {
+                "jsonrpc": "2.0",
+                "method": "tools/call",
+                "params": {"name": "echo", "arguments": {"delay": 1}},
+                "id": "slow",
+            }
+        )
+
+        with (
+            patch("src.mcp.server.settings.MCP_BATCH_CONCURRENCY", 2),
+            patch("src.mcp.server.settings.MCP_TOOL_TIMEOUT", 0.1),
+        ):
+            result = await mcp_server.handle_request("session-123", batch)
+
+        assert state["peak"] == 2
+        assert "timed out" in result[-1]["error"]["message"]
+        assert all("result" in response for response in result[:-1])
+
+    @pytest.mark.asyncio
+    async def test_invalid_batches(self, mcp_server):
+        """Test empty batches and non-object entries are rejected"""
+        assert (await mcp_server.handle_request("session-123", []))[0]["error"]["code"] == -32600
+
+        result = await mcp_server.handle_request("session-123", [1])
+
+        assert result == [
+            {
+                "jsonrpc": "2.0",
+                "error": {"code": -32600, "message": "Batch entries must be objects"},
+                "id": None,
+            }
+        ]
+
+    @pytest.mark.asyncio
+    async def test_batch_entry_with_bad_params_fails_alone(self, mcp_server, slow_tools):
+        """Test null or non-object params get their own error without failing the batch"""
+        batch = [
+            {"jsonrpc": "2.0", "method": "tools/call", "params": None, "id": 1},
+            {"jsonrpc": "2.0", "method": "tools/call", "params": [1], "id": 2},
+            {"jsonrpc": "2.0", "method": "tools/list", "params": "x", "id": 3},
+            {
+                "jsonrpc": "2.0",
+                "method": "tools/call",
+                "params": {"name": "echo", "arguments": {"n": 4}},
+                "id": 4,
+            },
+        ]
+        mcp_server.tool_registry, _ = slow_tools
+
+        result = await mcp_server.handle_request("session-123", batch)
+
+        assert [response["id"] for response in result] == [1, 2, 3, 4]
+        assert [response.get("error", {}).get("code") for response in result] == [
+            -32602,
+            -32602,
+            -32602,
+            None,
+        ]
+
+    @pytest.fixture
+    def streaming_tools(self):
+        """Registry with a tool that yields its result in chunks"""
+
+        async def stream(count: int = 3):
+            yield {"text_summary": f"{count} results"}
+            for i in range(count):
+                await asyncio.sleep(0)
+                yield {"results": [i]}
+
+        async def handler(**arguments):
+            return await collect(stream(**arguments))
+
+        tools = ToolRegistry()
+        tools.register(
+            MCPTool(name="search", description="", parameters={}, handler=handler, stream=stream)
+        )
+        return tools
+
+    @pytest.mark.asyncio
+    async def test_stream_yields_chunks_before_response(self, mcp_server, streaming_tools):
+        """Test streamed calls send each chunk as progress, then the merged result"""
+        mcp_server.tool_registry = streaming_tools
+        request = {
+            "jsonrpc": "2.0",
+            "method": "tools/call",
+            "params": {"name": "search", "arguments": {"count": 2}},
+            "id": 7,
+        }
+
+        messages = [m async for m in mcp_server.stream_request("session-123", request)]
+
+        assert [m.get("method") for m in messages] == ["notifications/progress"] * 3 + [None]
+        assert orjson.loads(messages[0]["params"]["content"][0]["text"]) == {
+            "text_summary": "2 results"
+        }
+        final = orjson.loads(messages[-1]["result"]["content"][0]["text"])
+        assert final == {"text_summary": "2 results", "results": [0, 1]}
+        assert final == orjson.loads(
+            (await mcp_server.handle_request("session-123", request))["result"]["content"][0][
+                "text"
+            ]
+        )
+
+    @pytest.mark.asyncio
+    async def test_stream_with_bad_meta_ends_in_an_error(self, mcp_server, streaming_tools):
+        """Test malformed params or _meta get a JSON-RPC error rather than killing the stream"""
+        mcp_server.tool_registry = streaming_tools
+        request = {
+            "jsonrpc": "2.0",
+            "method": "tools/call",
+            "params": {"name": "search", "_meta": None},
+            "id": 7,
+        }
+
+        messages = [m async for m in mcp_server.stream_request("session-123", request)]
+        assert messages[0]["params"]["progressToken"] == 7
+
+        request["params"]["_meta"] = "token"
+        [message] = [m async for m in mcp_server.stream_request("session-123", request)]
+        assert message["error"]["code"] == -32603 and message["id"] == 7
+
+        request["params"] = None
+        [message] = [m async for m in mcp_server.stream_request("session-123", request)]
+        assert message["error"]["code"] == -32602 and message["id"] == 7
+
+    @pytest.fixture
+    def rendering_tools(self):
+        """Registry with a tool that renders only the formats asked for"""
+        rendered = []
+
+        async def handler():
+            result = {"results": [1]}
+            if wants(SUMMARY):
+                result["text_summary"] = "1 result"
+            if wants(WIDGET):
+                result["widget_html"] = "<div>1</div>"
+            rendered.append(sorted(result))
+            return result
+
+        tools = ToolRegistry()
+        tools.register(
+            MCPTool(
+                name="search",
+                description="",
+                parameters={},
+                handler=handler,
+                formats=(STRUCTURED, SUMMARY, WIDGET),
+            )
+        )
+        return tools, rendered
+
+    @pytest.mark.asyncio
+    async def test_output_formats_negotiated_per_call(self, mcp_server, rendering_tools):
+        """Test calls get, and the tool renders, only the formats they ask for"""
+        mcp_server.tool_registry, rendered = rendering_tools
+
+        async def call(formats):
+            params = {"name": "search", "arguments": {}}
+            if formats is not None:
+                params["_meta"] = {"outputFormats": formats}
+            request = {"jsonrpc": "2.0", "method": "tools/call", "params": params, "id": 1}
+            return await mcp_server.handle_request("session-123", request)
+
+        structured = (await call(["structured"]))["result"]
+        summary = (await call("summary"))["result"]
+        legacy = (await call(None))["result"]
+        unknown = await call(["pdf"])
+
+        assert structured == {"content": [], "structuredContent": {"results": [1]}}
+        assert summary == {"content": [{"type": "text", "text": "1 result"}]}
+        assert "widget_html" in orjson.loads(legacy["content"][0]["text"])
+        assert rendered == [
+            ["results"],
+            ["results", "text_summary"],
+            ["results", "text_summary", "widget_html"],
+        ]
+        assert unknown["error"]["code"] == -32602
+
+    @pytest.mark.asyncio
+    async def test_batch_keeps_calls_with_different_formats_apart(
+        self, mcp_server, rendering_tools
+    ):
+        """Test identical calls asking for different formats aren't deduplicated"""
+        mcp_server.tool_registry, rendered = rendering_tools
+        batch = [
+            {
+                "jsonrpc": "2.0",
+                "method": "tools/call",
+                "params": {"name": "search", "_meta": {"outputFormats": [output_format]}},
+                "id": output_format,
+            }
+            for output_format in ("structured", "widget")
+        ]
+
+        responses = await mcp_server.handle_request("session-123", batch)
+
+        assert len(rendered) == 2
+        assert "structuredContent" in responses[0]["result"]
+        assert responses[1]["result"]["content"][0]["resource"]["mimeType"] == "text/html"
+
+    @pytest.mark.asyncio
+    async def test_sse_stream_pings_while_idle(self):
+        """Test keep-alive pings are sent while waiting for the next message"""
+
+        async def messages():
+            await asyncio.sleep(0.05)
+            yield {"id": 1}
+
+        events = [event async for event in sse_stream(messages(), ping_interval=0.01)]
+
+        assert PING in events
+        assert events[-1] == b'event: message\ndata: {"id":1}\n\n'
+
+    @pytest.mark.asyncio
+    async def test_sse_stream_pulls_on_demand(self):
+        """Test messages are only produced as fast as the client reads them"""
+        produced = []
+
+        async def messages():
+            for i in range(10):
+                produced.append(i)
+                yield {"id": i}
+
+        stream = sse_stream(messages(), ping_interval=1)
+        await stream.__anext__()
+        await stream.__anext__()
+        await stream.aclose()
+
+        assert produced == [0, 1]
+
+    @pytest.mark.asyncio
+    async def test_http_endpoint_streams_events(self, mcp_server, streaming_tools):
+        """Test the /mcp endpoint returns SSE or JSON depending on Accept"""
+        mcp_server.tool_registry = streaming_tools
+        app = FastAPI()
+        app.include_router(mcp.router, prefix="/mcp")
+        app.state.mcp_server = mcp_server
+        request = {
+            "jsonrpc": "2.0",
+            "method": "tools/call",
+            "params": {"name": "search", "arguments": {}},
+            "id": 1,
+        }
+
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            streamed = await client.post(
+                "/mcp", json=request, headers={"Accept": "application/json, text/event-stream"}
+            )
+            plain = await client.post("/mcp", json=request)
+
+        assert streamed.headers["content-type"].startswith("text/event-stream")
+        assert streamed.text.count("event: message") == 5
+        assert "Mcp-Session-Id" in streamed.headers
+        assert plain.json()["id"] == 1
@@ -2,10 +2,45 @@
 Unit tests for services
 """
 
+import asyncio
+
 import pytest
-from unittest.mock import Mock, AsyncMock, patch
+from unittest.mock import MagicMock, Mock, AsyncMock, patch
+from gql.transport.exceptions import TransportServerError
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from prometheus_client import REGISTRY
+from tenacity import wait_none
 
-from src.services.cache.cache_service import CacheService
+from src.models.database import CachedAnime
+from src.models.records import Character, Media, MediaListColumns, MediaListEntry
+from src.observability.metrics import timed_tool_stream
+from src.services.anilist import client as anilist_client
+from src.services.anilist.client import AniListClient, get_anilist_client, load_schema
+from src.services.anilist.loader import DataLoader
+from src.services.anilist.rate_limiter import LocalTokenBucket, Priority, RateLimiter
+from src.services.anilist.operations import (
+    OperationRegistry,
+    Projection,
+    operations,
+    search_media_operation,
+)
+from src.services.cache import redis_client
+from src.services.cache.cache_service import CacheService, LocalCache
+from src.services.cache.codecs import Serializer, get_serializer
+from src.services.cache.entity_store import EntityStore
+from src.services.cache.redis_client import RedisClient, get_redis_pool
+from src.services.cache.single_flight import SingleFlight
+from src.services.cache.swr import cached, wrap
+from src.services.catalog import CatalogIndex, CatalogMirror
+from src.services.catalog.mirror import media_row, row_media
+from src.services.embeddings import EmbeddingStore, HashingEmbedder
+from src.services.recommendations import RecommendationEngine, taste_weights
+from src.services.user_lists.collection import compact, refresh_user_list
+from src.tools.registry import MCPTool, ToolRegistry
+from src.utils.exceptions import RateLimitError
 
 
 class TestCacheService:
@@ -13,7 +48,7 @@ class TestCacheService:
     async def test_cache_get(self, mock_redis):
         """Test cache get operation"""
         expected_value = {"test": "data"}
-        mock_redis.get = AsyncMock(return_value=expected_value)
+        mock_redis.get_raw = AsyncMock(return_value=get_serializer().dumps(expected_value))
 
         with patch(
             "src.services.cache.cache_service.RedisClient", return_value=mock_redis
@@ -23,6 +58,640 @@ class TestCacheService:
 
         assert result == expected_value
 
+    @pytest.mark.asyncio
+    async def test_cache_get_does_not_reconnect(self, mock_redis):
+        """Test cache lookups reuse the pooled connection"""
+        mock_redis.connect = AsyncMock()
+        mock_redis.disconnect = AsyncMock()
+
+        cache = CacheService(redis=mock_redis)
+        await cache.get("test_key")
+        await cache.set("test_key", {"test": "data"})
+
+        mock_redis.connect.assert_not_called()
+        mock_redis.disconnect.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_cache_get_served_from_l1(self, mock_redis):
+        """Test repeated reads only reach Redis once"""
+        mock_redis.get_raw = AsyncMock(return_value=get_serializer().dumps({"test": "data"}))
+
+        cache = CacheService(redis=mock_redis)
+        first = await cache.get("trending:ANIME:1:10")
+        second = await cache.get("trending:ANIME:1:10")
+
+        assert first == second == {"test": "data"}
+        mock_redis.get_raw.assert_called_once()
+        assert cache.stats["l1_hits"] == 1
+        assert cache.stats["l2_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_remote_invalidation_drops_l1(self, mock_redis):
+        """Test invalidations from other workers evict L1 entries"""
+        cache = CacheService(redis=mock_redis)
+        await cache.set("search:abc", {"test": "data"})
+
+        cache._apply_invalidation({"origin": "other-worker", "keys": ["search:abc"]})
+
+        assert cache.local.get("search:abc") == (False, None)
+        mock_redis.publish.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_invalidate_tags_unlinks_members(self, mock_redis):
+        """Test tag invalidation removes every tagged entry in one UNLINK"""
+        mock_redis.smembers_many = AsyncMock(
+            return_value=[["search:a", "search:b"], ["search:b"]]
+        )
+        cache = CacheService(redis=mock_redis)
+        await cache.set("search:a", {"test": "data"}, tags=["tag:media:1"])
+
+        deleted = await cache.invalidate_tags("tag:media:1", "tag:media:2")
+
+        assert deleted == 2
+        assert cache.local.get("search:a") == (False, None)
+        mock_redis.unlink.assert_called_once_with(
+            ["search:a", "search:b", "tag:media:1", "tag:media:2"]
+        )
+        mock_redis.keys.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_invalidate_pattern_scans_incrementally(self, mock_redis):
+        """Test pattern invalidation walks SCAN batches instead of KEYS"""
+
+        async def scan_keys(pattern):
+            yield ["search:a", "search:b"]
+            yield ["search:c"]
+
+        mock_redis.scan_keys = scan_keys
+        cache = CacheService(redis=mock_redis)
+
+        deleted = await cache.invalidate_pattern("search:*")
+
+        assert deleted == 3
+        assert mock_redis.unlink.call_count == 2
+        mock_redis.keys.assert_not_called()
+
+    def test_local_cache_evicts_lru_by_bytes(self):
+        """Test L1 evicts least recently used entries over the byte budget"""
+        local = LocalCache(max_entries=10, max_bytes=100)
+        local.set("a", "a", ttl=60, size=40)
+        local.set("b", "b", ttl=60, size=40)
+        local.get("a")
+        local.set("c", "c", ttl=60, size=40)
+
+        assert local.get("b") == (False, None)
+        assert local.get("a") == (True, "a")
+        assert local.size_bytes == 80
+
+    @pytest.mark.asyncio
+    async def test_clients_share_pool(self):
+        """Test Redis clients draw from the process-wide pool"""
+        with patch.object(redis_client, "_pool", None):
+            pool = get_redis_pool()
+            client = RedisClient()
+            await client.connect()
+
+            assert get_redis_pool() is pool
+            assert client.client.connection_pool is pool
+            assert pool.max_connections == 50
+
+
+class TestSerializer:
+    @pytest.mark.parametrize("codec", ["json", "msgpack"])
+    @pytest.mark.parametrize("compression", ["none", "zlib", "zstd", "lz4"])
+    def test_round_trip(self, codec, compression):
+        """Test every codec and compression reads back what it wrote"""
+        serializer = Serializer(codec=codec, compression=compression, threshold=64)
+        value = {"results": [{"id": 1, "description": "x" * 200}], "page_info": {}}
+
+        data, size = serializer.encode(value)
+
+        assert data[0] == 1
+        if compression != "none":
+            assert len(data) < size
+        assert serializer.decode(data) == (value, size)
+
+    def test_small_values_not_compressed(self):
+        """Test payloads under the threshold skip compression"""
+        serializer = Serializer(codec="json", compression="zlib", threshold=1024)
+
+        assert serializer.dumps({"id": 1}) == b'\x01\x01\x00{"id":1}'
+
+    def test_reads_values_from_other_configurations(self):
+        """Test values stay readable after the codec setting changes"""
+        written = Serializer(codec="msgpack", compression="zlib", threshold=0).dumps([1, 2])
+
+        assert Serializer(codec="json").loads(written) == [1, 2]
+
+    def test_reads_legacy_json(self):
+        """Test values written as plain JSON before framing are still readable"""
+        serializer = Serializer()
+
+        assert serializer.loads(b'{"results": []}') == {"results": []}
+        assert serializer.loads(b"ok") == "ok"
+
+    def test_unavailable_compression_reported_once(self, capsys):
+        """Test the zlib fallback is logged once rather than per serializer"""
+        first = Serializer(compression="brotli")
+        Serializer(compression="brotli")
+
+        assert first.compressor.name == "zlib"
+        assert capsys.readouterr().out.count("brotli unavailable") == 1
+
+
+class TestStaleWhileRevalidate:
+    @pytest.mark.asyncio
+    async def test_stale_value_served_and_refreshed_once(self, mock_redis):
+        """Test stale entries return immediately and refresh in the background"""
+        stale = wrap({"results": ["old"]}, ttl=-1)
+        mock_redis.get_raw = AsyncMock(return_value=get_serializer().dumps(stale))
+        fetch = AsyncMock(return_value={"results": ["new"]})
+        cache = CacheService(redis=mock_redis)
+
+        first = await cached(cache, "trending:ANIME:1:10", fetch, ttl=1800)
+        second = await cached(cache, "trending:ANIME:1:10", fetch, ttl=1800)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        assert first == second == {"results": ["old"]}
+        fetch.assert_called_once()
+        key, serialized = mock_redis.set.call_args.args
+        assert key == "trending:ANIME:1:10"
+        assert mock_redis.set.call_args.kwargs["ttl"] == 3600
+        assert get_serializer().loads(serialized)["value"] == {"results": ["new"]}
+
+    @pytest.mark.asyncio
+    async def test_fresh_value_not_refreshed(self, mock_redis):
+        """Test fresh entries don't trigger upstream calls"""
+        mock_redis.get_raw = AsyncMock(
+            return_value=get_serializer().dumps(wrap({"results": []}, ttl=60))
+        )
+        fetch = AsyncMock()
+
+        result = await cached(CacheService(redis=mock_redis), "search:abc", fetch, ttl=60)
+
+        assert result == {"results": []}
+        fetch.assert_not_called()
+
+
+class TestEntityStore:
+    @pytest.mark.asyncio
+    async def test_pages_store_entities_once(self, mock_redis):
+        """Test overlapping pages share one stored copy of each entity"""
+        store = EntityStore(CacheService(redis=mock_redis))
+
+        first = await store.put_page("media", [{"id": 1}, {"id": 2}], {"total": 2})
+        second = await store.put_page("media", [{"id": 2}], {"total": 1})
+
+        assert first["ids"] == [1, 2]
+        assert second["ids"] == [2]
+        written = [key for call in mock_redis.hset_many.call_args_list for key in call.args[0]]
+        assert written == ["entity:media:1", "entity:media:2", "entity:media:2"]
+
+    @pytest.mark.asyncio
+    async def test_expired_entities_loaded_through_fallback(self, mock_redis):
+        """Test IDs missing from Redis are re-fetched and stored again"""
+        mock_redis.hgetall_many = AsyncMock(return_value=[{"id": b"1"}, {}])
+        fallback = AsyncMock(return_value=[{"id": 2}])
+        store = EntityStore(CacheService(redis=mock_redis))
+
+        results, _ = await store.hydrate_page(
+            {"kind": "media", "ids": [1, 2], "page_info": {}}, fallback=fallback
+        )
+
+        assert results == [{"id": 1}, {"id": 2}]
+        fallback.assert_called_once_with([2])
+        assert list(mock_redis.hset_many.call_args.args[0]) == ["entity:media:2"]
+
+    @pytest.mark.asyncio
+    async def test_card_write_keeps_detail_fields_cached_earlier(self, mock_redis):
+        """Test a smaller projection merges into the L1 copy instead of replacing it"""
+        store = EntityStore(CacheService(redis=mock_redis))
+
+        await store.put_many("media", [{"id": 1, "episodes": 12, "description": "Space"}])
+        await store.put_many("media", [{"id": 1, "episodes": 13}])
+
+        [media] = await store.get_many("media", [1], fields=("id", "episodes", "description"))
+        assert media == {"id": 1, "episodes": 13, "description": "Space"}
+        mock_redis.hgetall_many.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_entities_missing_projection_fields_are_reloaded(self, mock_redis):
+        """Test a hash re-created by a card write doesn't pass for a detail hit"""
+        serializer = get_serializer()
+        mock_redis.hgetall_many = AsyncMock(
+            return_value=[{"id": serializer.dumps(1), "episodes": serializer.dumps(12)}]
+        )
+        fallback = AsyncMock(return_value=[{"id": 1, "episodes": 12, "description": "Space"}])
+        store = EntityStore(CacheService(redis=mock_redis))
+
+        card = await store.get_many("media", [1], fallback=fallback, fields=("id", "episodes"))
+        detail = await store.get_many("media", [1], fallback=fallback, fields=("id", "description"))
+
+        assert card == [{"id": 1, "episodes": 12}]
+        assert detail == [{"id": 1, "description": "Space"}]
+        fallback.assert_called_once_with([1])
+
+
+class TestCatalogIndex:
+    def test_title_search_matches_prefixes_typos_and_native_titles(self, sample_catalog):
+        """Test titles are found by any name, a word prefix or a one-letter typo"""
+        index = CatalogIndex(sample_catalog)
+
+        def ids(query):
+            return [card["id"] for card in index.search(query=query)["results"]]
+
+        assert ids("cowboy bebop") == [1, 5]
+        assert ids("attack on tit") == [16498]
+        assert ids("fullmetal alchemsit") == [5114]
+        assert ids("Fma") == [5114]
+        assert ids("巨人") == [16498]
+        assert ids("pokemon") == []
+
+    def test_facets_sort_and_page(self, sample_catalog):
+        """Test facet filters combine, and results come back sorted and paged"""
+        index = CatalogIndex(sample_catalog)
+
+        page = index.search(genres=["action"], minimum_score=83, sort="SCORE_DESC", per_page=2)
+        movies = index.search(genres=["Action"], format="MOVIE")
+        military = index.search(tags=["Military"], year=2009)
+
+        assert [card["id"] for card in page["results"]] == [5114, 1]
+        assert page["page_info"] == {
+            "total": 3,
+            "currentPage": 1,
+            "lastPage": 2,
+            "hasNextPage": True,
+            "perPage": 2,
+        }
+        assert [card["id"] for card in movies["results"]] == [5]
+        assert [card["id"] for card in military["results"]] == [5114]
+        assert index.search(sort="TRENDING_DESC") is None
+
+    def test_cached_anime_rows_round_trip(self, sample_catalog):
+        """Test media stored in CachedAnime reads back as it was synced"""
+        media = dict(sample_catalog[0], studios={"nodes": [{"name": "Wit"}]})
+
+        restored = row_media(CachedAnime(**media_row(media)))
+
+        assert restored["title"] == media["title"]
+        assert restored["tags"] == media["tags"]
+        assert restored["studios"] == media["studios"]
+        assert restored["startDate"] == {"year": 2013, "month": 4, "day": 1}
+        assert CatalogIndex([restored]).cards == CatalogIndex([media]).cards
+
+
+class TestRecommendationEngine:
+    def test_similar_titles_ranked_by_shared_features(self, sample_catalog):
+        """Test the closest titles come first and excluded ones never appear"""
+        engine = RecommendationEngine(sample_catalog)
+
+        similar = engine.similar(1, count=3)
+        excluding = engine.similar(1, count=3, exclude=[5])
+
+        assert [media_id for media_id, _ in similar][:1] == [5]
+        assert all(0 < score <= 1 for _, score in similar)
+        assert 1 not in dict(similar)
+        assert 5 not in dict(excluding)
+
+    def test_taste_profile_leans_away_from_dropped_titles(self, sample_catalog):
+        """Test a profile favours what the user liked and skips their list"""
+        engine = RecommendationEngine(sample_catalog)
+        entries = [
+            {"media": {"id": 16498}, "status": "COMPLETED", "score": 9},
+            {"media": {"id": 1535}, "status": "DROPPED", "score": 3},
+        ]
+
+        weights = taste_weights(entries)
+        recommended = [media_id for media_id, _ in engine.for_taste(weights, count=5)]
+
+        assert weights[16498] > 0 > weights[1535]
+        assert recommended[0] == 5114
+        assert not {16498, 1535} & set(recommended)
+
+
+class TestEmbeddings:
+    def test_hashing_embedder_puts_related_words_close(self):
+        """Test vectors are unit length, repeatable and share word stems"""
+        embedder = HashingEmbedder(384)
+
+        dark, darker, comedy = embedder.embed(["a dark tragedy", "darker", "light comedy"])
+
+        assert abs(float(dark @ dark) - 1) < 1e-5
+        assert (embedder.embed(["a dark tragedy"])[0] == dark).all()
+        assert dark @ darker > dark @ comedy
+
+    @pytest.mark.asyncio
+    async def test_pending_anime_embedded_and_searched_in_memory(self, sqlite_db, sample_catalog):
+        """Test embedding skips unchanged rows and SQLite falls back to memory search"""
+        engine, session = sqlite_db
+        async with session() as db, db.begin():
+            db.add_all(CachedAnime(**media_row(media)) for media in sample_catalog)
+
+        with (
+            patch("src.services.embeddings.store.async_session", session),
+            patch("src.services.embeddings.store.engine", engine),
+            patch("src.services.embeddings.store.settings.EMBEDDING_BATCH_SIZE", 2),
+        ):
+            store = EmbeddingStore()
+            embedded = await store.embed_pending()
+            again = await store.embed_pending()
+            approximate = store.approximate
+            nearest = await store.nearest(await store.vector(1), count=2, exclude=[1])
+
+        assert (embedded, again) == (5, 0)
+        assert not approximate
+        assert nearest[0][0] == 5
+
+    @pytest.mark.asyncio
+    async def test_ann_search_caps_ef_search_and_rescans_when_short(self):
+        """Test ef_search stays under pgvector's cap and short results rescan the table"""
+        results = iter([[(2, 0.1)], [(2, 0.1), (3, 0.2)]])
+        statements = []
+
+        async def execute(statement):
+            statements.append(str(statement))
+            return Mock(all=Mock(side_effect=lambda: next(results)))
+
+        db = MagicMock()
+        db.__aenter__.return_value = db
+        db.execute = execute
+
+        with (
+            patch.object(EmbeddingStore, "approximate", True),
+            patch("src.services.embeddings.store.async_session", Mock(return_value=db)),
+        ):
+            nearest = await EmbeddingStore().nearest(
+                HashingEmbedder(384).embed(["dark"])[0], count=2, exclude=range(5000)
+            )
+
+        assert nearest == [(2, 0.9), (3, 0.8)]
+        assert statements[0] == "SET LOCAL hnsw.ef_search = 1000"
+        assert statements[2] == "SET LOCAL enable_indexscan = off"
+
+
+def paged_anilist(catalog):
+    """AniList stand-in serving the catalog in ID and in last-updated order"""
+
+    def by_id(variables):
+        media = sorted(
+            (item for item in catalog if item["id"] > variables["after"]),
+            key=lambda item: item["id"],
+        )
+        return {
+            "Page": {
+                "media": media[: variables["perPage"]],
+                "pageInfo": {"hasNextPage": len(media) > variables["perPage"]},
+            }
+        }
+
+    def by_update(variables):
+        media = sorted(catalog, key=lambda item: -item["updatedAt"])
+        start = (variables["page"] - 1) * variables["perPage"]
+        return {
+            "Page": {
+                "media": media[start : start + variables["perPage"]],
+                "pageInfo": {"hasNextPage": start + variables["perPage"] < len(media)},
+            }
+        }
+
+    anilist = Mock()
+    anilist.get_catalog_page = AsyncMock(side_effect=by_id)
+    anilist.get_updated_media = AsyncMock(side_effect=by_update)
+    return anilist
+
+
+class TestCatalogSync:
+    @pytest.fixture
+    def mirror_db(self, sqlite_db):
+        """Point the catalog mirror at SQLite, syncing two anime per page and three per batch"""
+        engine, session = sqlite_db
+        with (
+            patch("src.services.catalog.mirror.async_session", session),
+            patch("src.services.catalog.mirror.engine", engine),
+            patch("src.services.catalog.mirror.settings.CATALOG_SYNC_PAGE_SIZE", 2),
+            patch("src.services.catalog.mirror.settings.CATALOG_SYNC_BATCH_SIZE", 3),
+        ):
+            yield session
+
+    @pytest.mark.asyncio
+    async def test_incremental_sync_stops_at_high_water_mark(self, mirror_db, sample_catalog):
+        """Test a second sync fetches only anime updated since the first"""
+        for number, media in enumerate(sample_catalog):
+            media["updatedAt"] = 1700000000 + number
+        anilist = paged_anilist(sample_catalog)
+        mirror = CatalogMirror()
+
+        with patch("src.services.catalog.mirror.get_anilist_client", return_value=anilist):
+            full = await mirror.sync()
+            sample_catalog[1]["updatedAt"] = 1800000000
+            sample_catalog[1]["title"]["english"] = "Death Note (Remastered)"
+            anilist.get_updated_media.reset_mock()
+            incremental = await mirror.sync()
+            progress = await mirror.progress()
+
+        assert (full, incremental) == (5, 2)
+        # The newest update, then pages until one reaches back past the mark; the
+        # anime updated at the old mark itself is written again rather than missed
+        assert anilist.get_updated_media.await_count == 3
+        assert progress["sync"]["mode"] == "incremental"
+        assert progress["sync"]["high_water_mark"] == 1800000000
+        assert mirror.index.card(1535)["title"]["english"] == "Death Note (Remastered)"
+        assert progress["loaded"] == 5 and progress["fresh"]
+
+    @pytest.mark.asyncio
+    async def test_interrupted_full_sync_resumes_after_last_batch(self, mirror_db, sample_catalog):
+        """Test a failed full sync keeps its written batches and carries on from them"""
+        anilist = paged_anilist(sample_catalog)
+        serve = anilist.get_catalog_page.side_effect
+        anilist.get_catalog_page.side_effect = [
+            serve({"after": 0, "perPage": 2}),
+            serve({"after": 5, "perPage": 2}),
+            TransportServerError("Too Many Requests", 429),
+        ]
+        mirror = CatalogMirror()
+
+        with patch("src.services.catalog.mirror.get_anilist_client", return_value=anilist):
+            with pytest.raises(TransportServerError):
+                await mirror.sync()
+            interrupted = await mirror.progress()
+            anilist.get_catalog_page.side_effect = serve
+            resumed = await mirror.sync()
+
+        # Both pages went out as one batch of four before the failure
+        assert interrupted["sync"]["running"] and interrupted["sync"]["cursor"] == 5114
+        assert anilist.get_catalog_page.await_args_list[3].args[0]["after"] == 5114
+        assert resumed == 1
+        assert len(mirror.index) == 5
+
+    @pytest.mark.asyncio
+    async def test_media_loaded_from_table_before_anilist(self, mirror_db, sample_catalog):
+        """Test handlers' fallback reads finished anime from CachedAnime"""
+        sample_catalog[0]["status"] = "RELEASING"
+        anilist = paged_anilist(sample_catalog)
+        anilist.media_loader.load_many = AsyncMock(
+            side_effect=lambda ids: [{"id": media_id} for media_id in ids]
+        )
+        mirror = CatalogMirror()
+
+        with patch("src.services.catalog.mirror.get_anilist_client", return_value=anilist):
+            await mirror.sync()
+            media = await mirror.load_media([1535, 16498, 99999])
+
+        assert media[0]["title"]["english"] == "Death Note"
+        assert media[0]["tags"] == [{"name": "Detective", "rank": 80}]
+        anilist.media_loader.load_many.assert_awaited_once_with([16498, 99999])
+
+
+class TestUserLists:
+    @staticmethod
+    def entry(media_id, updated_at, status="CURRENT"):
+        return {"media": {"id": media_id}, "status": status, "updatedAt": updated_at}
+
+    @staticmethod
+    def ids(media_ids):
+        """GetUserListIds result listing the given media"""
+        entries = [{"media": {"id": media_id}} for media_id in media_ids]
+        return {"MediaListCollection": {"lists": [{"entries": entries}]}}
+
+    @pytest.mark.asyncio
+    async def test_refresh_fetches_only_entries_past_high_water_mark(self):
+        """Test a refresh merges changed entries without downloading the whole list"""
+        previous = compact(
+            {"id": 1}, [self.entry(media_id, 100 + media_id) for media_id in range(5)]
+        )
+        mock_anilist = Mock()
+        mock_anilist.get_user_list_updates = AsyncMock(
+            return_value={
+                "Page": {
+                    "pageInfo": {"hasNextPage": True},
+                    "mediaList": [
+                        self.entry(9, 500),
+                        self.entry(2, 400, status="COMPLETED"),
+                        self.entry(4, 104),
+                        self.entry(3, 103),
+                    ],
+                }
+            }
+        )
+        mock_anilist.get_user_list_ids = AsyncMock(return_value=self.ids([0, 1, 2, 3, 4, 9]))
+        mock_anilist.get_user_list = AsyncMock()
+
+        with patch(
+            "src.services.user_lists.collection.get_anilist_client", return_value=mock_anilist
+        ):
+            refreshed = await refresh_user_list({"userId": 1, "type": "ANIME"}, previous)
+
+        mock_anilist.get_user_list_updates.assert_awaited_once()
+        mock_anilist.get_user_list.assert_not_awaited()
+        assert [entry["media"]["id"] for entry in refreshed["entries"]] == [9, 2, 4, 3, 1, 0]
+        assert refreshed["entries"][1]["status"] == "COMPLETED"
+        assert refreshed["high_water_mark"] == 500
+
+    @pytest.mark.asyncio
+    async def test_refresh_drops_removed_entries_and_refetches_unknown_ones(self):
+        """Test removals come from the ID list, and only an unexplained ID reloads the list"""
+        previous = compact(
+            {"id": 1}, [self.entry(media_id, 100 + media_id) for media_id in range(5)]
+        )
+        mock_anilist = Mock()
+        mock_anilist.get_user_list_updates = AsyncMock(
+            return_value={
+                "Page": {
+                    "pageInfo": {"hasNextPage": True},
+                    "mediaList": [self.entry(4, 104), self.entry(3, 103)],
+                }
+            }
+        )
+        mock_anilist.get_user_list_ids = AsyncMock(return_value=self.ids([0, 2, 3, 4]))
+        mock_anilist.get_user_list = AsyncMock(
+            return_value={
+                "MediaListCollection": {
+                    "user": {"id": 1},
+                    "lists": [
+                        {"entries": [self.entry(media_id, 100 + media_id) for media_id in range(6)]}
+                    ],
+                }
+            }
+        )
+
+        with patch(
+            "src.services.user_lists.collection.get_anilist_client", return_value=mock_anilist
+        ):
+            refreshed = await refresh_user_list({"userId": 1, "type": "ANIME"}, previous)
+            mock_anilist.get_user_list.assert_not_awaited()
+            mock_anilist.get_user_list_ids.return_value = self.ids(range(6))
+            refetched = await refresh_user_list({"userId": 1, "type": "ANIME"}, previous)
+
+        assert [entry["media"]["id"] for entry in refreshed["entries"]] == [4, 3, 2, 0]
+        mock_anilist.get_user_list.assert_awaited_once()
+        assert len(refetched["entries"]) == 6
+
+
+class TestRecords:
+    def test_records_round_trip_graphql_objects(self):
+        """Test records give back the objects they were made from"""
+        media = {
+            "id": 1,
+            "title": {"romaji": "Cowboy Bebop", "english": "Cowboy Bebop"},
+            "coverImage": {"large": "bebop.jpg"},
+            "genres": ["Action", "Sci-Fi"],
+            "episodes": 26,
+            "description": "Space bounty hunters",
+            "tags": [{"name": "Space", "rank": 94}],
+        }
+        entry = {
+            "id": 10,
+            "updatedAt": 1700000000,
+            "media": {"id": 1, "title": {"english": "Cowboy Bebop", "romaji": "Cowboy Bebop"}},
+            "score": 9.5,
+            "progress": 26,
+            "status": "COMPLETED",
+            "repeat": 1,
+            "startedAt": {"year": 2020, "month": 3, "day": None},
+            "completedAt": {"year": None, "month": None, "day": None},
+        }
+        character = {
+            "id": 1,
+            "name": {"full": "Spike Spiegel", "native": "スパイク・スピーゲル", "alternative": []},
+            "image": {"large": "spike.jpg", "medium": "spike-small.jpg"},
+            "description": "A bounty hunter",
+            "gender": "Male",
+            "dateOfBirth": {"month": 6, "day": 26},
+            "age": "27",
+            "favourites": 40000,
+            "media": {"nodes": [], "edges": []},
+        }
+
+        assert Media.from_graphql(media).to_graphql() == media
+        assert list(Media.from_graphql(media).to_graphql()) == list(media)
+        assert Media(id=1, shape=("id", "description")).to_graphql() == {"id": 1}
+        assert MediaListEntry.from_graphql(entry).to_graphql() == entry
+        assert MediaListEntry.from_graphql(entry).started_at == 20200300
+        assert Character.from_graphql(character).to_graphql() == character
+
+    def test_list_columns_filter_and_sort_like_python(self):
+        """Test vectorized orders match a stable sort of the entries"""
+        entries = [
+            MediaListEntry(
+                id=media_id,
+                media=Media(id=media_id),
+                status=("COMPLETED", "CURRENT", "DROPPED")[media_id % 3],
+                score=media_id % 5,
+                progress=media_id % 4,
+            )
+            for media_id in range(50)
+        ]
+        columns = MediaListColumns(entries)
+
+        for column, status in [("score", "COMPLETED"), ("progress", None), ("score", "PAUSED")]:
+            expected = sorted(
+                (row for row, entry in enumerate(entries) if status in (None, entry.status)),
+                key=lambda row: getattr(entries[row], column),
+                reverse=True,
+            )
+            assert columns.order(column, status).tolist() == expected
+
 
 class TestAniListClient:
     @pytest.mark.asyncio
@@ -30,3 +699,376 @@ class TestAniListClient:
         """Test AniList search media"""
         # This would require mocking the GraphQL client
         pass
+
+    def test_shared_client_is_reused(self):
+        """Test handlers share one process-wide client"""
+        with patch.object(anilist_client, "_client", None):
+            assert get_anilist_client() is get_anilist_client()
+
+    def test_missing_schema_logged_at_startup(self, capsys):
+        """Test creating the client without a schema says validation is skipped"""
+        with (
+            patch.object(anilist_client, "_client", None),
+            patch.object(anilist_client, "load_schema", return_value=None),
+        ):
+            get_anilist_client()
+
+        assert "skipping operation validation" in capsys.readouterr().out
+
+    def test_load_schema_from_sdl(self, tmp_path):
+        """Test bundled schema loading"""
+        schema_file = tmp_path / "schema.graphql"
+        schema_file.write_text("type Query { Media(id: Int): Media }\ntype Media { id: Int }")
+
+        schema = load_schema(str(schema_file))
+
+        assert schema.query_type.fields["Media"] is not None
+        assert load_schema(str(tmp_path / "missing.graphql")) is None
+
+
+class TestDataLoader:
+    @pytest.mark.asyncio
+    async def test_concurrent_loads_are_batched(self):
+        """Test IDs requested together resolve with one upstream call"""
+        batch_fn = AsyncMock(return_value={1: {"id": 1}, 2: {"id": 2}})
+        loader = DataLoader(batch_fn, batch_window=0.001)
+
+        results = await asyncio.gather(loader.load(1), loader.load(2), loader.load(1))
+
+        assert results == [{"id": 1}, {"id": 2}, {"id": 1}]
+        batch_fn.assert_called_once_with([1, 2])
+
+    @pytest.mark.asyncio
+    async def test_loaded_values_are_cached(self):
+        """Test repeat lookups are served without a new batch"""
+        batch_fn = AsyncMock(return_value={7: {"id": 7}})
+        loader = DataLoader(batch_fn, batch_window=0.001)
+
+        await loader.load(7)
+        assert await loader.load(7) == {"id": 7}
+        assert await loader.load_many([7]) == [{"id": 7}]
+        batch_fn.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_full_batch_dispatches_immediately(self):
+        """Test a batch is sent as soon as it reaches the size limit"""
+        batch_fn = AsyncMock(side_effect=lambda ids: {i: {"id": i} for i in ids})
+        loader = DataLoader(batch_fn, max_batch_size=2, batch_window=60)
+
+        await loader.load_many([1, 2, 3, 4])
+
+        assert batch_fn.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_cancelled_batch_cancels_waiters(self):
+        """Test cancelling an in-flight batch doesn't leave its loads hanging"""
+        started = asyncio.Event()
+
+        async def batch_fn(ids):
+            started.set()
+            await asyncio.sleep(60)
+
+        loader = DataLoader(batch_fn, batch_window=0.001)
+        load = asyncio.create_task(loader.load(1))
+        await started.wait()
+
+        for task in list(loader._tasks):
+            task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(load, 1)
+        assert not loader._futures
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_result(self):
+        """Test identical concurrent calls run the function once"""
+        flight = SingleFlight()
+        fn = AsyncMock(return_value={"id": 1})
+
+        results = await asyncio.gather(flight.do("k", fn), flight.do("k", fn))
+
+        assert results == [{"id": 1}, {"id": 1}]
+        fn.assert_called_once()
+        assert len(flight) == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_leader_leaves_followers_waiting(self):
+        """Test a follower still gets the result when the leader is cancelled"""
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def fn():
+            await release.wait()
+            return "done"
+
+        leader = asyncio.create_task(flight.do("k", fn))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("k", fn))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await follower == "done"
+        assert leader.cancelled()
+
+    @pytest.mark.asyncio
+    async def test_call_cancelled_when_every_caller_is(self):
+        """Test the shared call stops once nobody is waiting for it"""
+        flight = SingleFlight()
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def fn():
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        caller = asyncio.create_task(flight.do("k", fn))
+        await started.wait()
+        caller.cancel()
+
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await asyncio.sleep(0)
+        assert len(flight) == 0
+
+
+class TestOperationRegistry:
+    def test_operations_are_parsed_once(self):
+        """Test repeated registrations reuse the parsed document"""
+        registry = OperationRegistry()
+        source = "query GetMedia($id: Int) { Media(id: $id) { id } }"
+
+        first = registry.register(source)
+
+        assert registry.register(source) is first
+        assert registry.resolve("GetMedia") is first
+        assert registry.resolve(source) is first
+
+    def test_prepared_request_payload(self):
+        """Test requests reuse the pre-printed query string"""
+        search = search_media_operation(Projection.DETAIL)
+        request = search.request({"page": 1})
+
+        assert request.payload["query"] is search.query
+        assert request.payload["operationName"] == "SearchMedia"
+        assert request.payload["variables"] == {"page": 1}
+        assert operations.get("SearchMedia") is search
+
+    def test_registered_fragments_are_included(self):
+        """Test operations pull in the fragments they spread, transitively"""
+        registry = OperationRegistry()
+        registry.fragment("fragment Card on Media { id }")
+        registry.fragment("fragment Detail on Media { ...Card description }")
+
+        operation = registry.register("query GetMedia { Media { ...Detail } }")
+
+        assert "fragment Card on Media" in operation.query
+        assert "fragment Detail on Media" in operation.query
+
+    def test_projections_select_fewer_fields(self):
+        """Test card and id projections drop detail-only fields"""
+        card = search_media_operation(Projection.CARD)
+        id_only = search_media_operation(Projection.ID)
+        detail = search_media_operation(Projection.DETAIL)
+
+        assert card.name == "SearchMediaCard"
+        assert "coverImage" in card.query and "description" not in card.query
+        assert "title" not in id_only.query
+        assert search_media_operation(Projection.CARD) is card
+        assert len(id_only.query) < len(card.query) < len(detail.query)
+
+
+class TestRateLimiter:
+    @pytest.mark.asyncio
+    async def test_interactive_calls_served_first(self, mock_redis):
+        """Test queued interactive calls get tokens before background ones"""
+        mock_redis.eval = AsyncMock(return_value=0)
+        limiter = RateLimiter(redis=mock_redis)
+        order = []
+
+        async def call(name, priority):
+            await limiter.acquire(priority)
+            order.append(name)
+
+        await asyncio.gather(
+            call("refresh", Priority.BACKGROUND),
+            call("search", Priority.INTERACTIVE),
+        )
+
+        assert order == ["search", "refresh"]
+
+    @pytest.mark.asyncio
+    async def test_429_blocks_all_workers(self, mock_redis):
+        """Test Retry-After from a 429 is shared through Redis"""
+        mock_redis.eval = AsyncMock(return_value=0)
+        limiter = RateLimiter(redis=mock_redis)
+
+        await limiter.observe(429, {"X-RateLimit-Remaining": "0", "Retry-After": "30"})
+
+        mock_redis.set.assert_called_once_with(limiter.block_key, "1", ttl=30)
+        assert limiter.remaining == 0
+        assert limiter.local.take() > 29
+
+    @pytest.mark.asyncio
+    async def test_redis_outage_backs_off_and_logs_once(self, mock_redis, capsys):
+        """Test a down Redis is tried once per retry interval, not once per request"""
+        mock_redis.eval = AsyncMock(side_effect=ConnectionError("refused"))
+        limiter = RateLimiter(redis=mock_redis)
+
+        for _ in range(3):
+            await limiter.acquire()
+        mock_redis.eval.side_effect = None
+        mock_redis.eval.return_value = 0
+        limiter._redis_retry_at = 0.0
+        await limiter.acquire()
+
+        assert mock_redis.eval.await_count == 2
+        assert capsys.readouterr().out.splitlines() == [
+            "Rate limiter error, using local bucket: refused",
+            "Rate limiter Redis reachable again, using shared bucket",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_rate_limit_timeout_not_retried(self):
+        """Test a timed-out token wait fails the call instead of waiting twice more"""
+        client = AniListClient()
+        client.session = Mock()
+        client.rate_limiter.acquire = AsyncMock(side_effect=RateLimitError("timed out"))
+
+        with pytest.raises(RateLimitError):
+            await client.execute("query Test { Viewer { id } }")
+
+        client.rate_limiter.acquire.assert_awaited_once()
+
+    def test_local_bucket_refills(self):
+        """Test the fallback bucket refuses tokens once drained"""
+        bucket = LocalTokenBucket(capacity=2, refill_per_second=1)
+
+        assert bucket.take() == 0
+        assert bucket.take() == 0
+        assert bucket.take() > 0
+
+
+def sample(name, **labels):
+    """Current value of a Prometheus sample, 0 if never recorded"""
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetrics:
+    @pytest.mark.asyncio
+    async def test_cache_lookups_counted_by_prefix_and_tier(self, mock_redis):
+        """Test hits and misses are recorded per key prefix and tier"""
+        mock_redis.get_raw = AsyncMock(return_value=get_serializer().dumps({"test": "data"}))
+        cache = CacheService(redis=mock_redis)
+        labels = {"prefix": "seasonal"}
+        l1_hits = sample("cache_requests_total", tier="l1", result="hit", **labels)
+        l2_hits = sample("cache_requests_total", tier="l2", result="hit", **labels)
+
+        await cache.get("seasonal:FALL:2026:1")
+        await cache.get("seasonal:FALL:2026:1")
+
+        assert sample("cache_requests_total", tier="l1", result="hit", **labels) == l1_hits + 1
+        assert sample("cache_requests_total", tier="l2", result="hit", **labels) == l2_hits + 1
+
+    @pytest.mark.asyncio
+    async def test_anilist_429_counted_per_operation(self):
+        """Test rate-limited AniList calls are recorded against their operation"""
+        client = AniListClient()
+        client.session = Mock(execute=AsyncMock(side_effect=TransportServerError("busy", 429)))
+        client.rate_limiter = Mock(acquire=AsyncMock())
+        before = sample("anilist_requests_total", operation="SearchMedia", status="rate_limited")
+
+        with pytest.raises(TransportServerError):
+            # Skip the retry decorator so the test doesn't wait out its backoff
+            await AniListClient._execute.__wrapped__(client, operations.get("SearchMedia"), {})
+
+        after = sample("anilist_requests_total", operation="SearchMedia", status="rate_limited")
+        assert after == before + 1
+        assert sample("anilist_request_duration_seconds_count", operation="SearchMedia") > 0
+
+    @pytest.mark.asyncio
+    async def test_registered_tools_are_timed(self):
+        """Test the registry records latency for every tool call"""
+        tools = ToolRegistry()
+        tools.register(
+            MCPTool(name="timed", description="", parameters={}, handler=AsyncMock(return_value=1))
+        )
+
+        await tools.get_tool("timed").handler()
+
+        assert sample("mcp_tool_duration_seconds_count", tool="timed", status="success") == 1
+
+    @pytest.mark.asyncio
+    async def test_streamed_tool_time_excludes_consumer(self):
+        """Test a slow consumer of a tool stream doesn't count as tool latency"""
+
+        async def stream():
+            yield 1
+            yield 2
+
+        async for _ in timed_tool_stream("streamed", stream)():
+            await asyncio.sleep(0.2)
+
+        assert sample("mcp_tool_duration_seconds_count", tool="streamed", status="success") == 1
+        assert sample("mcp_tool_duration_seconds_sum", tool="streamed", status="success") < 0.1
+
+
+_span_exporter = InMemorySpanExporter()
+
+
+@pytest.fixture
+def spans():
+    """Record finished spans in memory"""
+    if not isinstance(trace.get_tracer_provider(), TracerProvider):
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(_span_exporter))
+        trace.set_tracer_provider(provider)
+    _span_exporter.clear()
+    yield _span_exporter
+    _span_exporter.clear()
+
+
+class TestTracing:
+    @pytest.mark.asyncio
+    async def test_cache_lookup_nested_under_tool_span(self, mock_redis, spans):
+        """Test cache spans are children of the tool span that caused them"""
+        cache = CacheService(redis=mock_redis)
+
+        async def handler():
+            return await cache.get("search:abc")
+
+        tools = ToolRegistry()
+        tools.register(MCPTool(name="traced", description="", parameters={}, handler=handler))
+        await tools.get_tool("traced").handler()
+
+        finished = {span.name: span for span in spans.get_finished_spans()}
+        assert finished["cache get"].parent.span_id == finished["tool traced"].context.span_id
+        assert finished["cache get"].attributes["cache.prefix"] == "search"
+        assert finished["cache get"].attributes["cache.hit"] is False
+
+    @pytest.mark.asyncio
+    async def test_anilist_retries_recorded_as_events(self, spans):
+        """Test each AniList attempt gets a span and retries become events"""
+        client = AniListClient()
+        client.session = Mock(
+            execute=AsyncMock(side_effect=[TransportServerError("down", 503), {"Page": {}}])
+        )
+        client.rate_limiter = Mock(acquire=AsyncMock())
+
+        with patch.object(AniListClient._execute.retry, "wait", wait_none()):
+            await client.execute(operations.get("SearchMedia"), {"page": 1})
+
+        finished = spans.get_finished_spans()
+        attempts = [span for span in finished if span.name == "anilist request"]
+        (operation,) = [span for span in finished if span.name == "anilist SearchMedia"]
+        assert [span.attributes["anilist.status"] for span in attempts] == ["error", "success"]
+        assert all(span.parent.span_id == operation.context.span_id for span in attempts)
+        assert [event.name for event in operation.events] == ["retry"]
+        assert operation.events[0].attributes["attempt"] == 1
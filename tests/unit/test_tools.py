@@ -2,42 +2,233 @@
 Unit tests for tools
 """
 
+import asyncio
+from datetime import datetime
+
 import pytest
 from unittest.mock import Mock, AsyncMock, patch
 
+from src.services.anilist.operations import Projection, projection_fields
+from src.services.cache.cache_service import CacheService
+from src.services.cache.codecs import get_serializer
+from src.services.cache.entity_store import EntityStore
+from src.services.catalog import CatalogIndex, CatalogMirror
+from src.services.catalog.mirror import media_row, upsert
+from src.services.embeddings import EmbeddingStore, HashingEmbedder, MemoryIndex, anime_text
+from src.services.recommendations import RecommendationEngine
 from src.tools.anime_tools import search_anime_handler
+from src.tools.discovery_tools import discover_anime_handler, parse_query, tool_description
+from src.tools.user_tools import get_anime_recommendations_handler, get_user_list_handler
+from src.tools.formats import STRUCTURED, output_formats
 from src.utils.validators import SearchParams
+from src.widgets import STYLESHEET, render_card, render_search_widget, stylesheet_url
+
+
+def detail_media(media_id, **fields):
+    """A MediaDetail result, with fields not given left null"""
+    return {field: None for field in projection_fields(Projection.DETAIL)} | {
+        "id": media_id,
+        **fields,
+    }
+
+
+def stored(entity):
+    """An entity as the entity store keeps it in Redis"""
+    return {field: get_serializer().dumps(value) for field, value in entity.items()}
 
 
 class TestSearchAnimeTool:
     @pytest.mark.asyncio
     async def test_search_with_cache_hit(self, mock_redis):
         """Test search returns cached results"""
-        cached_result = {"results": [{"id": 1, "title": "Test"}]}
-        mock_redis.get = AsyncMock(return_value=cached_result)
+        cached_page = {"kind": "media", "ids": [1], "page_info": {"total": 1}}
+        serializer = get_serializer()
+        mock_redis.get_raw = AsyncMock(return_value=serializer.dumps(cached_page))
+        media = detail_media(1, title={"romaji": "Test"})
+        mock_redis.hgetall_many = AsyncMock(return_value=[stored(media)])
+        cache = CacheService(redis=mock_redis)
 
-        with patch("src.tools.anime_tools.CacheService", return_value=mock_redis):
+        with (
+            patch("src.tools.anime_tools.get_cache_service", return_value=cache),
+            patch("src.tools.anime_tools.get_entity_store", return_value=EntityStore(cache)),
+        ):
             result = await search_anime_handler(query="test")
 
-        assert result == cached_result
-        mock_redis.get.assert_called_once()
+        assert result["results"] == [media]
+        assert result["page_info"] == {"total": 1}
+        mock_redis.get_raw.assert_called_once()
+        mock_redis.hgetall_many.assert_called_once_with(["entity:media:1"])
+
+    @pytest.mark.asyncio
+    async def test_search_skips_unrequested_rendering(self, mock_redis):
+        """Test the summary and widget aren't built for structured-only calls"""
+        cached_page = {"kind": "media", "ids": [1], "page_info": {"total": 1}}
+        serializer = get_serializer()
+        mock_redis.get_raw = AsyncMock(return_value=serializer.dumps(cached_page))
+        mock_redis.hgetall_many = AsyncMock(return_value=[stored(detail_media(1))])
+        cache = CacheService(redis=mock_redis)
+
+        with (
+            patch("src.tools.anime_tools.get_cache_service", return_value=cache),
+            patch("src.tools.anime_tools.get_entity_store", return_value=EntityStore(cache)),
+            patch("src.tools.anime_tools.render_search_widget") as render,
+            output_formats([STRUCTURED]),
+        ):
+            result = await search_anime_handler(query="test")
+
+        assert result == {"results": [detail_media(1)], "page_info": {"total": 1}}
+        render.assert_not_called()
+
+    @pytest.fixture
+    async def mirror(self, sqlite_db):
+        """A fresh catalog mirror over SQLite, loaded with the rows written through it"""
+        engine, session = sqlite_db
+        catalog = CatalogMirror()
+
+        async def load(media):
+            rows = [media_row(item) for item in media]
+            async with session() as db, db.begin():
+                await db.execute(upsert(rows), rows)
+            await catalog.load()
+            catalog.synced_at = datetime.utcnow()
+            return catalog
+
+        with (
+            patch("src.services.catalog.mirror.async_session", session),
+            patch("src.services.catalog.mirror.engine", engine),
+        ):
+            yield load
+
+    @pytest.mark.asyncio
+    async def test_search_served_from_catalog_mirror(self, mock_redis, mirror, sample_catalog):
+        """Test searches the mirror can answer never reach the cache or AniList"""
+        catalog = await mirror(sample_catalog)
+        mock_anilist = Mock()
+        mock_anilist.search_media = AsyncMock(return_value={"Page": {"media": []}})
+        cache = CacheService(mock_redis)
+
+        with (
+            patch("src.tools.anime_tools.get_catalog", return_value=catalog),
+            patch("src.tools.anime_tools.get_cache_service", return_value=cache),
+            patch("src.tools.anime_tools.get_entity_store", return_value=EntityStore(cache)),
+            patch("src.tools.anime_tools.get_anilist_client", return_value=mock_anilist),
+        ):
+            local = await search_anime_handler(query="bebop", format="MOVIE")
+            trending = await search_anime_handler(query="bebop", sort="TRENDING_DESC")
+
+        assert [media["id"] for media in local["results"]] == [5]
+        assert local["page_info"]["total"] == 1
+        assert trending["results"] == []
+        mock_anilist.search_media.assert_called_once()
+        assert mock_anilist.search_media.call_args.args[0]["sort"] == "TRENDING_DESC"
+        mock_redis.get_raw.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_catalog_and_upstream_results_share_a_shape(
+        self, mock_redis, mirror, sample_anime_response
+    ):
+        """Test a search gives the same MediaDetail results whichever source answers it"""
+        catalog = await mirror(sample_anime_response["Page"]["media"])
+        mock_anilist = Mock()
+        mock_anilist.search_media = AsyncMock(return_value=sample_anime_response)
+        cache = CacheService(mock_redis)
+
+        with (
+            patch("src.tools.anime_tools.get_catalog", return_value=catalog),
+            patch("src.tools.anime_tools.get_cache_service", return_value=cache),
+            patch("src.tools.anime_tools.get_entity_store", return_value=EntityStore(cache)),
+            patch("src.tools.anime_tools.get_anilist_client", return_value=mock_anilist),
+            output_formats([STRUCTURED]),
+        ):
+            local = await search_anime_handler(query="titan")
+            upstream = await search_anime_handler(query="titan", sort="TRENDING_DESC")
+
+        mock_anilist.search_media.assert_called_once()
+        assert local["results"] == upstream["results"] == sample_anime_response["Page"]["media"]
 
     @pytest.mark.asyncio
     async def test_search_with_cache_miss(self, mock_redis, sample_anime_response):
         """Test search fetches from API when cache misses"""
-        mock_redis.get = AsyncMock(return_value=None)
+        mock_redis.get_raw = AsyncMock(return_value=None)
 
         mock_anilist = Mock()
         mock_anilist.search_media = AsyncMock(return_value=sample_anime_response)
 
+        cache = CacheService(redis=mock_redis)
+
         with (
-            patch("src.tools.anime_tools.CacheService", return_value=mock_redis),
-            patch("src.tools.anime_tools.AniListClient", return_value=mock_anilist),
+            patch("src.tools.anime_tools.get_cache_service", return_value=cache),
+            patch("src.tools.anime_tools.get_entity_store", return_value=EntityStore(cache)),
+            patch("src.tools.anime_tools.get_anilist_client", return_value=mock_anilist),
         ):
             result = await search_anime_handler(query="Attack on Titan")
 
         assert "results" in result
         assert len(result["results"]) == 1
+        stored = mock_redis.hset_many.call_args.args[0]["entity:media:1"]
+        assert get_serializer().loads(stored["episodes"]) == 25
+        _, cached_page = mock_redis.set.call_args.args
+        assert get_serializer().loads(cached_page)["value"]["ids"] == [1]
+        assert mock_redis.set.call_args.kwargs["tags"] == ["tag:media:1"]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_fetch(self, mock_redis, sample_anime_response):
+        """Test identical concurrent searches hit AniList once"""
+        mock_redis.get_raw = AsyncMock(return_value=None)
+
+        mock_anilist = Mock()
+        mock_anilist.search_media = AsyncMock(return_value=sample_anime_response)
+
+        cache = CacheService(redis=mock_redis)
+
+        with (
+            patch("src.tools.anime_tools.get_cache_service", return_value=cache),
+            patch("src.tools.anime_tools.get_entity_store", return_value=EntityStore(cache)),
+            patch("src.tools.anime_tools.get_anilist_client", return_value=mock_anilist),
+        ):
+            results = await asyncio.gather(
+                *[search_anime_handler(season="FALL", year=2026) for _ in range(5)]
+            )
+
+        assert all(r == results[0] for r in results)
+        mock_anilist.search_media.assert_called_once()
+        mock_redis.acquire_lock.assert_called_once()
+
+
+class TestWidgets:
+    def test_card_escapes_media_fields(self):
+        """Test titles from AniList can't inject markup"""
+        card = render_card({"id": 1, "title": {"romaji": '<script>"x"</script>'}})
+
+        assert "<script>" not in card
+        assert "&lt;script&gt;&quot;x&quot;" in card
+
+    def test_card_rerendered_when_media_changes(self):
+        """Test cards are reused until AniList reports an update"""
+        media = {"id": 2, "title": {"romaji": "Old"}, "updatedAt": 100, "averageScore": 80}
+
+        first = render_card(media)
+        assert render_card({**media, "title": {"romaji": "Ignored"}}) is first
+        assert "New" in render_card({**media, "title": {"romaji": "New"}, "updatedAt": 101})
+
+    def test_search_widget_links_shared_stylesheet(self):
+        """Test pages reference the stylesheet instead of embedding it"""
+        with patch("src.widgets.stylesheet.settings.PUBLIC_URL", "https://anime.example"):
+            html = render_search_widget([{"id": 3, "title": {"english": "A"}}])
+            url = stylesheet_url()
+
+        assert url.startswith("https://anime.example/widgets/styles.")
+        assert f'href="{url}"' in html
+        assert "<style>" not in html
+        assert html.count('class="anime-card"') == 1
+
+    def test_search_widget_inlines_stylesheet_without_public_url(self):
+        """Test pages embed the stylesheet when no absolute URL can be linked"""
+        with patch("src.widgets.stylesheet.settings.PUBLIC_URL", ""):
+            html = render_search_widget([{"id": 3, "title": {"english": "A"}}])
+
+        assert f"<style>{STYLESHEET}</style>" in html
+        assert "<link" not in html
 
 
 class TestValidators:
@@ -57,3 +248,156 @@ class TestValidators:
         """Test year validation"""
         with pytest.raises(ValueError):
             SearchParams(year=1800)
+
+
+def list_entry(media_id, status, score, updated_at, completed_year=None):
+    """A MediaList entry as AniList returns it"""
+    return {
+        "id": media_id * 10,
+        "updatedAt": updated_at,
+        "media": {"id": media_id, "title": {"romaji": f"Anime {media_id}"}},
+        "score": score,
+        "progress": 12,
+        "status": status,
+        "startedAt": {"year": None, "month": None, "day": None},
+        "completedAt": {"year": completed_year, "month": 1, "day": 1},
+    }
+
+
+class TestUserListTool:
+    @pytest.mark.asyncio
+    async def test_pages_statuses_and_sorts_served_from_one_fetch(self, mock_redis):
+        """Test the list is downloaded once and paged, filtered and sorted locally"""
+        completed = [list_entry(i, "COMPLETED", i % 7, 1700000000 + i, 2000 + i) for i in range(20)]
+        watching = [list_entry(100, "CURRENT", 0, 1800000000)]
+        mock_anilist = Mock()
+        mock_anilist.get_user_list = AsyncMock(
+            return_value={
+                "MediaListCollection": {
+                    "user": {"id": 1, "name": "someone"},
+                    "lists": [
+                        {"name": "Completed", "status": "COMPLETED", "entries": completed},
+                        {"name": "Watching", "status": "CURRENT", "entries": watching},
+                        {"name": "Favourites", "isCustomList": True, "entries": completed[:3]},
+                    ],
+                }
+            }
+        )
+
+        with (
+            patch(
+                "src.services.user_lists.collection.get_cache_service",
+                return_value=CacheService(mock_redis),
+            ),
+            patch(
+                "src.services.user_lists.collection.get_anilist_client", return_value=mock_anilist
+            ),
+        ):
+            first = await get_user_list_handler(user_name="someone", per_page=5)
+            second = await get_user_list_handler(
+                user_name="someone", status="COMPLETED", sort="SCORE", page=2, per_page=5
+            )
+            finished = await get_user_list_handler(user_name="someone", sort="FINISHED_ON")
+
+        mock_anilist.get_user_list.assert_awaited_once()
+        assert first["total_entries"] == 21
+        assert [group["name"] for group in first["lists"]] == ["Watching", "Completed"]
+        assert first["lists"][0]["entries"][0]["media"]["id"] == 100
+        assert first["page_info"]["hasNextPage"]
+        assert second["total_entries"] == 20
+        [completed_page] = second["lists"]
+        assert [entry["score"] for entry in completed_page["entries"]] == [4, 4, 4, 3, 3]
+        assert finished["lists"][0]["entries"][0]["media"]["id"] == 19
+
+
+class TestRecommendationsTool:
+    @pytest.mark.asyncio
+    async def test_recommendations_scored_locally(self, sample_catalog):
+        """Test a loaded catalog answers recommendations without calling AniList"""
+        catalog = CatalogMirror()
+        catalog.index = CatalogIndex(sample_catalog)
+        catalog.recommender = RecommendationEngine(sample_catalog)
+        mock_anilist = Mock()
+
+        with (
+            patch("src.tools.user_tools.get_catalog", return_value=catalog),
+            patch("src.tools.user_tools.get_anilist_client", return_value=mock_anilist),
+        ):
+            result = await get_anime_recommendations_handler(
+                reference_title="cowboy bebop", recommendation_type="trending_genre", count=2
+            )
+
+        assert result["reference_anime_id"] == 1
+        assert len(result["recommendations"]) == 2
+        assert result["recommendations"][0]["anime"]["id"] == 5
+        assert result["recommendations"][0]["rating"] is None
+        assert "user_rating" in result["recommendations"][0]
+        assert mock_anilist.mock_calls == []
+
+    @pytest.mark.asyncio
+    async def test_similar_counts_community_ratings(self, sample_catalog, mock_redis):
+        """Test community recommendations raise a title and keep their rating fields"""
+        catalog = CatalogMirror()
+        catalog.index = CatalogIndex(sample_catalog)
+        catalog.recommender = RecommendationEngine(sample_catalog)
+        mock_anilist = Mock()
+        node = {"rating": 120, "userRating": "NO_RATING", "mediaRecommendation": {"id": 1535}}
+        mock_anilist.get_recommendations = AsyncMock(
+            return_value={"Media": {"recommendations": {"nodes": [node]}}}
+        )
+
+        with (
+            patch("src.tools.user_tools.get_catalog", return_value=catalog),
+            patch("src.tools.user_tools.get_anilist_client", return_value=mock_anilist),
+            patch("src.tools.user_tools.get_cache_service", return_value=CacheService(mock_redis)),
+        ):
+            result = await get_anime_recommendations_handler(reference_anime_id=1, count=4)
+
+        plain = dict(catalog.recommender.similar(1, count=4))
+        by_id = {item["anime"]["id"]: item for item in result["recommendations"]}
+        assert by_id[1535]["rating"] == 120
+        assert by_id[1535]["user_rating"] == "NO_RATING"
+        assert by_id[1535]["similarity"] > plain[1535] + 0.2
+        assert by_id[5]["rating"] is None
+        mock_anilist.get_recommendations.assert_awaited_once_with(1)
+
+
+class TestDiscoveryTool:
+    def test_like_queries_split_into_title_and_modifier(self):
+        """Test "like X but Y" anchors on X and "without" subtracts"""
+        assert parse_query("anime like Cowboy Bebop but darker") == ("Cowboy Bebop", "darker", 1.0)
+        assert parse_query("like Mushishi without the gore") == ("Mushishi", "the gore", -1.0)
+        assert parse_query("dark military fantasy") == (None, "dark military fantasy", 1.0)
+
+    @pytest.mark.asyncio
+    async def test_discovery_anchors_on_reference_title(self, sample_catalog):
+        """Test the reference is resolved locally, left out, and its neighbours returned"""
+        catalog = CatalogMirror()
+        catalog.index = CatalogIndex(sample_catalog)
+        embedder = HashingEmbedder(384)
+        store = EmbeddingStore()
+        store.memory = MemoryIndex(
+            [media["id"] for media in sample_catalog],
+            embedder.embed([anime_text(media) for media in sample_catalog]),
+        )
+        store.loaded_at = float("inf")
+
+        with (
+            patch("src.tools.discovery_tools.get_catalog", return_value=catalog),
+            patch("src.tools.discovery_tools.get_embedder", return_value=embedder),
+            patch("src.tools.discovery_tools.get_embedding_store", return_value=store),
+            patch.object(EmbeddingStore, "approximate", False),
+        ):
+            result = await discover_anime_handler("like cowboy bebop but with military drama")
+
+        ids = [item["anime"]["id"] for item in result["results"]]
+        assert result["reference_anime_id"] == 1
+        assert 1 not in ids
+        assert {16498, 5114} & set(ids[:2])
+
+    def test_description_says_default_matching_is_lexical(self):
+        """Test the tool doesn't claim semantic matches from the hashing embedder"""
+        with patch("src.tools.discovery_tools.settings.EMBEDDING_MODEL", "hashing"):
+            assert "rather than meaning" in tool_description()
+        with patch("src.tools.discovery_tools.settings.EMBEDDING_MODEL", "all-MiniLM-L6-v2"):
+            assert "rather than meaning" not in tool_description()